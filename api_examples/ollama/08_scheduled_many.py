@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# ↑ Shebang: lets Unix-like systems run this file directly with `./08_scheduled_many.py`.
+#   Harmless on Windows (ignored there).
+
+# ── Imports ─────────────────────────────────────────────────────────────────
+import asyncio  # Event loop + async/await primitives.
+import sys  # Modify Python's import search path at runtime.
+import os  # Filesystem helpers (dirname, abspath, etc.).
+
+# The shared helpers live in the repository root (lib/), two levels above this
+# folder, so go up three times: this file → ollama/ → api_examples/ → root.
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+# Shared client layer:
+#   • AsyncOllamaClient: one httpx client + a RequestScheduler in front of it.
+#   • Priority: INTERACTIVE work is always served before BATCH work.
+#   • run_batch(...): the scheduled version of `asyncio.gather(...)`.
+from lib.client import AsyncOllamaClient
+from lib.scheduler import Priority, RequestScheduler
+from lib.batch import run_batch
+
+
+# ── Prompts & models ────────────────────────────────────────────────────────
+# Hard-code a model you have pulled (`ollama list`), or set OLLAMA_MODEL.
+model = os.environ.get("OLLAMA_MODEL", "llama3.2")
+
+interactive_prompt = "Identify your model and creator in one sentence."
+batch_prompts = [f"Write a haiku about the number {i}." for i in range(20)]
+
+
+# ── Main program: a batch flood plus one interactive chat ───────────────────
+async def main():
+    # Match max_concurrency to the server's OLLAMA_NUM_PARALLEL.
+    #   • tenant_weights: "reports" gets twice the share of "nightly".
+    #   • interactive_ttft_slo: if chat TTFT rises above 2s, batch is throttled
+    #     and running batch requests may be preempted.
+    scheduler = RequestScheduler(
+        max_concurrency=2,
+        tenant_weights={"reports": 2.0, "nightly": 1.0},
+        interactive_ttft_slo=2.0,
+    )
+
+    async with AsyncOllamaClient(scheduler=scheduler) as client:
+        # Two tenants submit a batch each. Without a scheduler, whoever
+        # submitted first would hog the server.
+        jobs = [{"model": model, "prompt": p} for p in batch_prompts]
+        nightly = asyncio.create_task(run_batch(client, jobs, tenant="nightly"))
+        reports = asyncio.create_task(run_batch(client, jobs[:5], tenant="reports"))
+
+        # Let the batches fill the server, then arrive as an interactive user.
+        await asyncio.sleep(0.5)
+        print(f"\n=== {model} (interactive, streaming) ===\n", flush=True)
+        async with client.stream(
+            model, interactive_prompt, priority=Priority.INTERACTIVE
+        ) as tokens:
+            async for text in tokens:
+                print(text, end="", flush=True)
+        print(f"\n\n(time to first token: {tokens.ttft:.2f}s)\n", flush=True)
+
+        results = await asyncio.gather(nightly, reports)
+        print(f"batch done: {sum(len(r) for r in results)} completions")
+        print(scheduler.stats())
+
+
+# ── Launch the event loop ───────────────────────────────────────────────────
+if __name__ == "__main__":
+    asyncio.run(main())
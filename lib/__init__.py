@@ -0,0 +1,6 @@
+"""Shared helpers for the notebooks and the scripts under ``api_examples/``.
+
+Each helper lives in its own module and is imported from there directly
+(``from lib.client import AsyncOllamaClient``), so importing one helper never
+drags in the dependencies of the others.
+"""
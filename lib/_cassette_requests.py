@@ -0,0 +1,131 @@
+# ── Cassette adapters for `requests` ────────────────────────────────────────
+# Kept apart from lib/cassette.py so the httpx paths never import `requests`.
+# Use through `Cassette.requests_adapter(...)`:
+#
+#   session = requests.Session()
+#   session.mount("http://", cassette.requests_adapter(replay=True, speed=0))
+#   session.mount("https://", cassette.requests_adapter(replay=True, speed=0))
+#
+# `requests` hands the adapter a urllib3 response that has already undone any
+# Content-Encoding, so the recording stores the decoded body and drops the
+# encoding headers. Recordings made through httpx keep the raw wire bytes;
+# the replay adapter decodes gzip/deflate for those.
+import time
+import zlib
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from lib.cassette import Cassette, _ChunkLog
+
+_WIRE_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, cassette: Cassette) -> None:
+        super().__init__()
+        self._cassette = cassette
+
+    def send(self, request, stream=False, **kwargs):
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        log = _ChunkLog(self._cassette, request.method, request.url, body)
+        response = super().send(request, stream=True, **kwargs)
+        log.status = response.status_code
+        log.headers = [
+            (k, v)
+            for k, v in response.headers.items()
+            if k.lower() not in _WIRE_HEADERS
+        ]
+        response.raw = _RecordingRaw(response.raw, log)
+        if not stream:
+            response.content  # noqa: B018 — consume now, as requests would
+        return response
+
+
+class _RecordingRaw:
+    def __init__(self, raw, log: _ChunkLog) -> None:
+        self._raw = raw
+        self._log = log
+
+    def stream(self, amt=2**16, decode_content=None):
+        for chunk in self._raw.stream(amt, decode_content=True):
+            self._log.add(chunk)
+            yield chunk
+        self._log.complete = True
+        self._log.save()
+
+    def close(self) -> None:
+        self._log.save()
+        self._raw.close()
+
+    def release_conn(self) -> None:
+        self._log.save()
+        self._raw.release_conn()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, cassette: Cassette, speed: float = 1.0) -> None:
+        super().__init__()
+        self._cassette = cassette
+        self._speed = speed
+
+    def send(self, request, stream=False, **kwargs):
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        recording = self._cassette.find(request.method, request.url, body)
+
+        response = Response()
+        response.status_code = recording.status
+        response.headers = CaseInsensitiveDict(
+            (k, v) for k, v in recording.headers if k.lower() not in _WIRE_HEADERS
+        )
+        encoding = dict((k.lower(), v) for k, v in recording.headers)
+        response.raw = _ReplayRaw(
+            recording, self._speed, encoding.get("content-encoding", "")
+        )
+        response.encoding = None
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.reason = ""
+        if not stream:
+            response.content  # noqa: B018
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class _ReplayRaw:
+    def __init__(self, recording, speed: float, content_encoding: str) -> None:
+        self._recording = recording
+        self._speed = speed
+        self._decoder = None
+        if content_encoding in ("gzip", "deflate"):
+            wbits = (
+                16 + zlib.MAX_WBITS if content_encoding == "gzip" else zlib.MAX_WBITS
+            )
+            self._decoder = zlib.decompressobj(wbits)
+
+    def stream(self, amt=None, decode_content=None):
+        speed, decoder = self._speed, self._decoder
+        for dt, chunk in zip(self._recording.delays, self._recording.chunks):
+            if speed:
+                time.sleep(dt / speed)
+            if decoder is not None:
+                chunk = decoder.decompress(chunk)
+            if chunk:
+                yield chunk
+
+    def close(self) -> None:
+        pass
+
+    def release_conn(self) -> None:
+        pass
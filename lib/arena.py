@@ -0,0 +1,217 @@
+# ── Arena: one prompt set, many providers, one results table ────────────────
+# Each *_interaction_examples notebook asks one provider one prompt and prints
+# the text. The arena sends a whole prompt set to many targets concurrently
+# and stores one row per (target, prompt) — text, latency, TTFT and token
+# usage — in Parquet, ready for pandas:
+#
+#   rows = await run_arena(["groq", "deepseek", "ollama:llama3.2"], prompts,
+#                          out_dir="results/arena")
+#   df = pd.read_parquet("results/arena")
+#   df.groupby("target")[["latency_s", "ttft_s"]].describe()
+#
+# A target is "provider" (its default model) or "provider:model"; provider
+# names are the keys of `lib.openai_compat.PROVIDERS`. "ollama:<model>" goes
+# through the native /api/generate client so Ollama's own counters are kept.
+# A target that cannot be opened (unknown provider, missing API key) gets an
+# error row per prompt instead of aborting the run.
+#
+# Every run writes a new file `<out_dir>/arena-<run_id>.parquet`, flushed a
+# row group at a time, so the directory is one dataset that grows per run.
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Column order of the results table.
+COLUMNS = (
+    "run_id",
+    "started_at",
+    "target",
+    "provider",
+    "model",
+    "prompt_id",
+    "prompt",
+    "text",
+    "error",
+    "latency_s",
+    "ttft_s",
+    "prompt_tokens",
+    "completion_tokens",
+)
+
+
+class ParquetSink:
+    """Buffer result rows and write them to a Parquet file in row groups.
+
+    Writes run in a worker thread so they never stall the event loop.
+    """
+
+    def __init__(self, path: str, row_group_size: int = 1000) -> None:
+        import pyarrow as pa
+
+        self.path = path
+        self.row_group_size = row_group_size
+        self._schema = pa.schema(
+            [
+                ("run_id", pa.string()),
+                ("started_at", pa.timestamp("ms", tz="UTC")),
+                ("target", pa.string()),
+                ("provider", pa.string()),
+                ("model", pa.string()),
+                ("prompt_id", pa.int64()),
+                ("prompt", pa.string()),
+                ("text", pa.string()),
+                ("error", pa.string()),
+                ("latency_s", pa.float64()),
+                ("ttft_s", pa.float64()),
+                ("prompt_tokens", pa.int64()),
+                ("completion_tokens", pa.int64()),
+            ]
+        )
+        self._rows: list[dict] = []
+        self._writer = None
+        self._lock = asyncio.Lock()  # ParquetWriter is not thread-safe
+
+    async def add(self, row: dict) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        rows, self._rows = self._rows, []
+        if rows:
+            async with self._lock:
+                await asyncio.to_thread(self._write, rows)
+
+    async def aclose(self) -> None:
+        await self.flush()
+        async with self._lock:
+            if self._writer is not None:
+                await asyncio.to_thread(self._writer.close)
+
+    def _write(self, rows: list[dict]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        table = pa.Table.from_pylist(rows, schema=self._schema)
+        self._writer.write_table(table, row_group_size=len(rows))
+
+
+async def run_arena(
+    targets: list[str],
+    prompts: list[str],
+    *,
+    out_dir: str | None = "results/arena",
+    concurrency: int = 4,
+    system: str | None = None,
+    row_group_size: int = 1000,
+    transport=None,
+) -> list[dict]:
+    """Send every prompt to every target; return the rows (also written to
+    `out_dir` as Parquet unless it is None).
+
+    `concurrency` is per target: each provider gets its own scheduler, so a
+    slow provider does not hold back the others. `transport` is handed to
+    every client (e.g. a cassette replay transport for offline runs).
+    """
+    run_id = (
+        datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S-") + uuid.uuid4().hex[:6]
+    )
+    sink = None
+    if out_dir:
+        sink = ParquetSink(
+            os.path.join(out_dir, f"arena-{run_id}.parquet"), row_group_size
+        )
+
+    targets = list(dict.fromkeys(targets))
+    clients: dict[str, tuple] = {}  # target → (client, provider, model)
+    failed: dict[str, str] = {}  # target → why it could not be opened
+    rows: list[dict] = []
+
+    async def one(target: str, prompt_id: int, prompt: str) -> None:
+        if target in clients:
+            client, provider, model = clients[target]
+        else:
+            client = None
+            provider, _, model = target.partition(":")
+            model = model or None
+        row = dict.fromkeys(COLUMNS)
+        row.update(
+            run_id=run_id,
+            started_at=datetime.now(timezone.utc),
+            target=target,
+            provider=provider,
+            model=model,
+            prompt_id=prompt_id,
+            prompt=prompt,
+        )
+        if client is None:
+            row["error"] = failed[target]
+        else:
+            started = time.monotonic()
+            try:
+                if provider == "ollama":
+                    fields = {"system": system} if system else {}
+                    async with client.stream(model, prompt, **fields) as tokens:
+                        row["text"] = "".join([t async for t in tokens])
+                    final = tokens.final or {}
+                    row["prompt_tokens"] = final.get("prompt_eval_count")
+                    row["completion_tokens"] = final.get("eval_count")
+                else:
+                    messages = [{"role": "user", "content": prompt}]
+                    if system:
+                        messages.insert(0, {"role": "system", "content": system})
+                    async with client.stream(model, messages) as tokens:
+                        row["text"] = "".join([t async for t in tokens])
+                    usage = (tokens.final or {}).get("usage") or {}
+                    row["prompt_tokens"] = usage.get("prompt_tokens")
+                    row["completion_tokens"] = usage.get("completion_tokens")
+                row["ttft_s"] = tokens.ttft
+            except Exception as exc:  # one failing provider must not sink the run
+                row["error"] = f"{type(exc).__name__}: {exc}"
+            row["latency_s"] = time.monotonic() - started
+        rows.append(row)
+        if sink is not None:
+            await sink.add(row)
+
+    try:
+        for target in targets:
+            try:
+                clients[target] = _open_target(target, concurrency, transport)
+            except Exception as exc:  # e.g. a missing API key: error rows
+                failed[target] = f"{type(exc).__name__}: {exc}"
+        await asyncio.gather(
+            *(
+                one(target, prompt_id, prompt)
+                for prompt_id, prompt in enumerate(prompts)
+                for target in targets
+            )
+        )
+    finally:
+        for client, _, _ in clients.values():
+            await client.aclose()
+        if sink is not None:
+            await sink.aclose()
+    return rows
+
+
+def _open_target(target: str, concurrency: int, transport):
+    """Return (client, provider, model) for a "provider[:model]" target."""
+    from lib.openai_compat import PROVIDERS, AsyncChatClient
+    from lib.scheduler import RequestScheduler
+
+    provider, _, model = target.partition(":")
+    scheduler = RequestScheduler(concurrency)
+    if provider == "ollama":
+        from lib.client import AsyncOllamaClient
+
+        model = model or PROVIDERS["ollama"].default_model
+        client = AsyncOllamaClient(scheduler=scheduler, transport=transport)
+        return client, provider, model
+    model = model or PROVIDERS[provider].default_model
+    client = AsyncChatClient(provider, scheduler=scheduler, transport=transport)
+    return client, provider, model
@@ -0,0 +1,128 @@
+# ── Scheduled batch runner ──────────────────────────────────────────────────
+# The scheduled replacement for `asyncio.gather(*(one(client, m) for m in models))`:
+# every job still runs concurrently, but admission goes through the client's
+# RequestScheduler, so a big batch queues *behind* interactive traffic instead
+# of in front of it.
+#
+# Pass a `lib.pipeline.ProcessStage` as `stage=` to post-process each result
+# on a process pool instead of on the event loop.
+#
+# Jobs are pulled from the iterable lazily: at most `window` are in flight
+# (waiting for a slot, generating, or in the stage) at once. A 100k-line job
+# file therefore never becomes 100k pending tasks, and a stage that is full
+# holds its jobs in the window, which stops new generations from starting.
+import asyncio
+from collections import deque
+from collections.abc import Iterable
+
+from lib.client import AsyncOllamaClient
+from lib.pipeline import _drain
+from lib.scheduler import Preempted, Priority
+
+
+async def run_batch(
+    client: AsyncOllamaClient,
+    jobs: Iterable[dict],
+    *,
+    tenant: str = "batch",
+    priority: Priority = Priority.BATCH,
+    stream: bool = False,
+    stage=None,
+    return_exceptions: bool = False,
+    window: int | None = None,
+) -> list:
+    """Run `jobs` through `client` and return one result per job, in order.
+
+    Each job is a dict with at least ``model`` and ``prompt``; any other keys
+    (``system``, ``options``, ``format``, ...) go into the request body.
+    A result is the final Ollama record with the full text under
+    ``"response"`` (for streams the text is re-assembled from the deltas),
+    or whatever `stage` turns that record into.
+    Preempted streams are restarted from scratch. With `return_exceptions`
+    a failed job's exception takes its place in the results; otherwise the
+    first failure cancels the rest and is raised. `window` is as for
+    `iter_batch`.
+    """
+    return [
+        result
+        async for _, result in iter_batch(
+            client,
+            jobs,
+            tenant=tenant,
+            priority=priority,
+            stream=stream,
+            stage=stage,
+            return_exceptions=return_exceptions,
+            window=window,
+        )
+    ]
+
+
+async def iter_batch(
+    client: AsyncOllamaClient,
+    jobs: Iterable[dict],
+    *,
+    tenant: str = "batch",
+    priority: Priority = Priority.BATCH,
+    stream: bool = False,
+    stage=None,
+    ordered: bool = True,
+    return_exceptions: bool = False,
+    window: int | None = None,
+):
+    """Like `run_batch`, but yield ``(index, result)`` pairs as they become
+    available: in job order, or as each finishes with `ordered=False`.
+
+    `window` bounds the jobs in flight (default four times the scheduler's
+    `max_concurrency`, so the scheduler still has a queue to order). In
+    job order, a slow job at the head of the window holds the next ones back.
+    """
+    if window is None:
+        window = 4 * client.scheduler.max_concurrency
+    if window < 1:
+        raise ValueError("window must be >= 1")
+
+    async def indexed(i: int, job: dict):
+        try:
+            return i, await _run_job(client, job, tenant, priority, stream, stage)
+        except Exception as exc:
+            if not return_exceptions:
+                raise
+            return i, exc
+
+    pending: deque[asyncio.Future] | set[asyncio.Future] = deque() if ordered else set()
+    try:
+        for i, job in enumerate(jobs):
+            task = asyncio.ensure_future(indexed(i, job))
+            pending.append(task) if ordered else pending.add(task)
+            # Make room before pulling the next job from the iterator.
+            if len(pending) >= window:
+                async for pair in _drain(pending, ordered, keep=window - 1):
+                    yield pair
+        async for pair in _drain(pending, ordered, keep=0):
+            yield pair
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _run_job(client, job: dict, tenant, priority, stream: bool, stage):
+    job = dict(job)
+    model, prompt = job.pop("model"), job.pop("prompt")
+    if not stream:
+        result = await client.generate(
+            model, prompt, tenant=tenant, priority=priority, **job
+        )
+    else:
+        while True:
+            try:
+                text, final = await client.stream_text(
+                    model, prompt, tenant=tenant, priority=priority, **job
+                )
+            except Preempted:
+                continue
+            result = {**(final or {}), "response": text}
+            break
+    if stage is not None:
+        result = await stage.submit(result)
+    return result
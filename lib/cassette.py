@@ -0,0 +1,358 @@
+# ── Record / replay cassettes ───────────────────────────────────────────────
+# Every example needs a live Ollama or a cloud API key. A cassette captures
+# real HTTP exchanges once — including streamed NDJSON/SSE bodies and the
+# time between chunks — so they can be replayed later with no GPU, no
+# network and no tokens spent.
+#
+#   cassette = Cassette("cassettes/ollama.jsonl.gz")
+#
+#   # 1) record against the real server
+#   client = AsyncOllamaClient(transport=cassette.recording_transport())
+#
+#   # 2) replay: speed=1 real time, speed=10 ten times faster, speed=0 no delay
+#   client = AsyncOllamaClient(transport=cassette.replay_transport(speed=0))
+#
+# The same cassette plugs into the other call paths:
+#   • httpx.Client / OpenAI(http_client=httpx.Client(transport=cassette.sync_replay_transport()))
+#   • requests:  session.mount("http://", cassette.requests_adapter(replay=True))
+#
+# Only complete exchanges are kept: a streamed body is saved once it was
+# read to the end or to the stream's final record (Ollama's `"done": true`,
+# SSE `[DONE]`). A stream cut short — preempted, or abandoned by its
+# consumer — would replay truncated, so it is dropped and counted in
+# `Cassette.incomplete` instead. Async recording writes the file in a worker
+# thread, off the event loop.
+#
+# File format: gzip-compressed JSON Lines, one interaction per line. Bodies are
+# the raw wire bytes stored as latin-1 strings (a lossless 1:1 byte↔char
+# mapping that keeps uncompressed NDJSON/SSE bodies readable with `zcat`).
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded interaction for a request."""
+
+
+class Cassette:
+    """A set of recorded HTTP interactions backed by a `.jsonl.gz` file.
+
+    Args:
+        path: cassette file; created on the first recorded interaction.
+        match_on: request fields that must match on replay, any of
+            ``"method"``, ``"url"``, ``"path"`` and ``"body"``. Use
+            ``("method", "path")`` to replay one recording for any prompt,
+            e.g. when load-testing the client stack.
+
+    Recorded interactions with the same key are replayed round-robin, so a
+    handful of recordings can serve any number of requests.
+    """
+
+    def __init__(
+        self, path: str | os.PathLike, *, match_on=("method", "url", "body")
+    ) -> None:
+        self.path = os.fspath(path)
+        self.match_on = tuple(match_on)
+        self._by_key: dict[tuple, list[_Recording]] = defaultdict(list)
+        self._cursor: dict[tuple, int] = defaultdict(int)
+        self._lock = threading.Lock()  # async recording appends from threads
+        self.incomplete = 0  # streams not recorded because they were cut short
+        if os.path.exists(self.path):
+            self._load()
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._by_key.values())
+
+    # ── Transports ──────────────────────────────────────────────────────────
+    def recording_transport(
+        self, inner: httpx.AsyncBaseTransport | None = None
+    ) -> httpx.AsyncBaseTransport:
+        return _AsyncRecordingTransport(self, inner or httpx.AsyncHTTPTransport())
+
+    def replay_transport(self, speed: float = 1.0) -> httpx.AsyncBaseTransport:
+        return _AsyncReplayTransport(self, speed)
+
+    def sync_recording_transport(
+        self, inner: httpx.BaseTransport | None = None
+    ) -> httpx.BaseTransport:
+        return _SyncRecordingTransport(self, inner or httpx.HTTPTransport())
+
+    def sync_replay_transport(self, speed: float = 1.0) -> httpx.BaseTransport:
+        return _SyncReplayTransport(self, speed)
+
+    def requests_adapter(self, *, replay: bool, speed: float = 1.0):
+        """A `requests` transport adapter; mount it on a `requests.Session`."""
+        from lib import _cassette_requests  # requests is only needed here
+
+        if replay:
+            return _cassette_requests.ReplayAdapter(self, speed)
+        return _cassette_requests.RecordingAdapter(self)
+
+    # ── Storage ─────────────────────────────────────────────────────────────
+    def record(
+        self,
+        method: str,
+        url: str,
+        body: bytes,
+        status: int,
+        headers: list[tuple[str, str]],
+        chunks: list[tuple[float, bytes]],
+    ) -> None:
+        """Append one interaction. `chunks` is [(seconds since previous, bytes)],
+        where the first delay is measured from sending the request."""
+        line = {
+            "request": {
+                "method": method,
+                "url": url,
+                "body": body.decode("latin-1"),
+            },
+            "response": {
+                "status": status,
+                "headers": headers,
+                "chunks": [[round(dt, 6), c.decode("latin-1")] for dt, c in chunks],
+            },
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            # Each append is its own gzip member; gzip readers concatenate them.
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            self._add(line)
+
+    def find(self, method: str, url: str, body: bytes) -> "_Recording":
+        key = self._key(method, url, body)
+        recordings = self._by_key.get(key)
+        if not recordings:
+            raise CassetteMiss(f"no recording for {method} {url} in {self.path}")
+        i = self._cursor[key]
+        self._cursor[key] = (i + 1) % len(recordings)
+        return recordings[i]
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(json.loads(line))
+
+    def _add(self, line: dict) -> None:
+        req, resp = line["request"], line["response"]
+        key = self._key(req["method"], req["url"], req["body"].encode("latin-1"))
+        self._by_key[key].append(
+            _Recording(
+                resp["status"],
+                [tuple(h) for h in resp["headers"]],
+                [dt for dt, _ in resp["chunks"]],
+                [c.encode("latin-1") for _, c in resp["chunks"]],
+            )
+        )
+
+    def _key(self, method: str, url: str, body: bytes) -> tuple:
+        fields = {
+            "method": method.upper(),
+            "url": url,
+            "path": httpx.URL(url).path,
+            "body": hashlib.sha1(body).hexdigest(),
+        }
+        return tuple(fields[name] for name in self.match_on)
+
+
+class _Recording:
+    __slots__ = ("status", "headers", "delays", "chunks")
+
+    def __init__(self, status, headers, delays, chunks) -> None:
+        self.status = status
+        # Chunks are the raw wire bytes (httpx decodes gzip/br above the
+        # transport), so Content-Encoding is kept; the framing is not.
+        self.headers = [(k, v) for k, v in headers if k.lower() != "transfer-encoding"]
+        self.delays = delays
+        self.chunks = chunks
+
+
+# ── httpx: recording ────────────────────────────────────────────────────────
+class _ChunkLog:
+    """Collects (delay, bytes) pairs and writes the interaction when done.
+
+    `complete` is set when the body was read to EOF; `save` drops the
+    interaction if it was not and the body does not end in a final record.
+    """
+
+    def __init__(self, cassette: Cassette, method: str, url: str, body: bytes):
+        self.cassette = cassette
+        self.method, self.url, self.body = method, url, body
+        self.last = time.monotonic()
+        self.chunks: list[tuple[float, bytes]] = []
+        self.status = 0
+        self.headers: list[tuple[str, str]] = []
+        self.complete = False
+        self.saved = False
+
+    def add(self, chunk: bytes) -> None:
+        now = time.monotonic()
+        self.chunks.append((now - self.last, chunk))
+        self.last = now
+
+    def save(self) -> None:
+        if self.saved:
+            return
+        self.saved = True
+        if not (self.complete or self._ends_with_final_record()):
+            self.cassette.incomplete += 1
+            return
+        self.cassette.record(
+            self.method, self.url, self.body, self.status, self.headers, self.chunks
+        )
+
+    def _ends_with_final_record(self) -> bool:
+        """Consumers often stop at the final record without draining the
+        body; that still counts as a whole response."""
+        tail = b"".join(chunk for _, chunk in self.chunks[-4:]).rstrip()
+        last = tail.rsplit(b"\n", 1)[-1]
+        return last == b"data: [DONE]" or b'"done":true' in last.replace(b" ", b"")
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, log: _ChunkLog) -> None:
+        self._inner = inner
+        self._log = log
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            self._log.add(chunk)
+            yield chunk
+        self._log.complete = True
+        await asyncio.to_thread(self._log.save)
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self._log.save)
+        await self._inner.aclose()
+
+
+class _AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, inner: httpx.AsyncBaseTransport) -> None:
+        self._cassette = cassette
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        log = _ChunkLog(self._cassette, request.method, str(request.url), body)
+        response = await self._inner.handle_async_request(request)
+        log.status = response.status_code
+        log.headers = list(response.headers.multi_items())
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, log),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class _SyncRecordingStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, log: _ChunkLog) -> None:
+        self._inner = inner
+        self._log = log
+
+    def __iter__(self):
+        for chunk in self._inner:
+            self._log.add(chunk)
+            yield chunk
+        self._log.complete = True
+        self._log.save()
+
+    def close(self) -> None:
+        self._log.save()
+        self._inner.close()
+
+
+class _SyncRecordingTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette, inner: httpx.BaseTransport) -> None:
+        self._cassette = cassette
+        self._inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        log = _ChunkLog(self._cassette, request.method, str(request.url), body)
+        response = self._inner.handle_request(request)
+        log.status = response.status_code
+        log.headers = list(response.headers.multi_items())
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_SyncRecordingStream(response.stream, log),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+# ── httpx: replay ───────────────────────────────────────────────────────────
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, recording: _Recording, speed: float) -> None:
+        self._recording = recording
+        self._speed = speed
+
+    async def __aiter__(self):
+        speed = self._speed
+        if not speed:
+            for chunk in self._recording.chunks:
+                yield chunk
+            return
+        for dt, chunk in zip(self._recording.delays, self._recording.chunks):
+            await asyncio.sleep(dt / speed)
+            yield chunk
+
+
+class _AsyncReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, speed: float) -> None:
+        self._cassette = cassette
+        self._speed = speed
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        recording = self._cassette.find(request.method, str(request.url), body)
+        return httpx.Response(
+            recording.status,
+            headers=recording.headers,
+            stream=_AsyncReplayStream(recording, self._speed),
+        )
+
+
+class _SyncReplayStream(httpx.SyncByteStream):
+    def __init__(self, recording: _Recording, speed: float) -> None:
+        self._recording = recording
+        self._speed = speed
+
+    def __iter__(self):
+        speed = self._speed
+        for dt, chunk in zip(self._recording.delays, self._recording.chunks):
+            if speed:
+                time.sleep(dt / speed)
+            yield chunk
+
+
+class _SyncReplayTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette, speed: float) -> None:
+        self._cassette = cassette
+        self._speed = speed
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        recording = self._cassette.find(request.method, str(request.url), body)
+        return httpx.Response(
+            recording.status,
+            headers=recording.headers,
+            stream=_SyncReplayStream(recording, self._speed),
+        )
@@ -0,0 +1,679 @@
+# ── llm-eng: command-line entry point ───────────────────────────────────────
+# Installed as the `llm-eng` console script (see [project.scripts] in
+# pyproject.toml); `python -m lib.cli` works too.
+#
+#   llm-eng generate llama3.2 "Identify your model and creator."
+#   llm-eng stream --provider groq - < prompt.txt
+#   llm-eng batch jobs.jsonl --out results.jsonl --concurrency 4
+#   llm-eng arena groq deepseek ollama:llama3.2 --prompts prompts.txt
+#   llm-eng bench startup --budget-ms 150
+#   llm-eng bench replay cassettes/ollama.jsonl.gz -n 5000
+#   llm-eng bench load llama3.2 --rps 4 --duration 60
+#   llm-eng queue init runs/eval.sqlite jobs.jsonl --shard-size 50
+#   llm-eng queue work runs/eval.sqlite --workers 4     # on each host
+#   llm-eng queue merge runs/eval.sqlite --out results.jsonl
+#   llm-eng tune llama3.2 --num-ctx 2048,8192 --concurrency 1,2,4
+#
+# Startup time matters: cron and CI shell out to this thousands of times a
+# day. Keep module-level imports to cheap standard-library modules
+# (argparse, sys, contextlib); everything else — httpx, provider clients and
+# certainly torch/transformers/langchain — is imported inside the subcommand
+# that needs it. `llm-eng bench startup` keeps an eye on this.
+import argparse
+import sys
+from contextlib import nullcontext
+
+# Modules whose import cost `bench startup` reports, cheapest path first.
+STARTUP_MODULES = ("lib.cli", "lib.client", "lib.openai_compat")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    _check_args(parser, args)
+    try:
+        return args.func(args) or 0
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:  # e.g. `llm-eng stream ... | head`
+        return 0
+
+
+# ── Subcommands ─────────────────────────────────────────────────────────────
+def _cmd_generate(args) -> int:
+    import asyncio
+
+    async def run():
+        async with _client(args) as client:
+            if args.provider:
+                body = await client.complete(args.model, _messages(args))
+                return body["choices"][0]["message"]["content"], body
+            body = await client.generate(args.model, _prompt(args), **_fields(args))
+            return body["response"], body
+
+    text, body = asyncio.run(run())
+    if args.json:
+        _print_json(body)
+    else:
+        print(text.strip())
+    return 0
+
+
+def _cmd_stream(args) -> int:
+    import asyncio
+
+    async def run():
+        async with _client(args) as client:
+            if args.provider:
+                stream = client.stream(args.model, _messages(args))
+            else:
+                stream = client.stream(args.model, _prompt(args), **_fields(args))
+            async with stream as tokens:
+                async for text in tokens:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+            sys.stdout.write("\n")
+            return tokens
+
+    tokens = asyncio.run(run())
+    if args.stats:
+        ttft = f"{tokens.ttft:.3f}s" if tokens.ttft is not None else "n/a"
+        print(f"ttft={ttft} final={tokens.final}", file=sys.stderr)
+    return 0
+
+
+def _cmd_batch(args) -> int:
+    import asyncio
+    import json
+
+    from lib.batch import iter_batch
+    from lib.scheduler import RequestScheduler
+
+    def read_jobs(f):
+        for line in f:
+            if line.strip():
+                job = json.loads(line)
+                job.setdefault("model", args.model)
+                yield job
+
+    concurrency = _concurrency(args)
+
+    async def run(f, out):
+        scheduler = RequestScheduler(concurrency)
+        async with _client(args, scheduler=scheduler) as client:
+            if args.prefix_plan:
+                from lib.prefix_plan import plan_batch, run_planned
+
+                plan = plan_batch(list(read_jobs(f)), slots=concurrency)
+                results, report = await run_planned(client, plan)
+                for i, result in enumerate(results):
+                    out.write(json.dumps({"index": i, "result": result}) + "\n")
+                print(report, file=sys.stderr)
+                return
+            stage = None
+            if args.stage:
+                from lib.pipeline import ProcessStage
+
+                stage = await ProcessStage(*args.stage).__aenter__()
+            try:
+                # Jobs stream from the file; only the window is in memory.
+                async for i, result in iter_batch(
+                    client,
+                    read_jobs(f),
+                    stream=args.stream,
+                    stage=stage,
+                    ordered=args.ordered,
+                    window=args.window,
+                ):
+                    out.write(json.dumps({"index": i, "result": result}) + "\n")
+                    out.flush()
+            finally:
+                if stage is not None:
+                    await stage.__aexit__(None, None, None)
+
+    with _open_in(args.jobs) as f, _open_out(args.out) as out:
+        asyncio.run(run(f, out))
+    return 0
+
+
+def _cmd_arena(args) -> int:
+    import asyncio
+
+    from lib.arena import run_arena
+
+    prompts = list(args.prompt or [])
+    if args.prompts:
+        with _open_in(args.prompts) as f:
+            prompts += [line.strip() for line in f if line.strip()]
+    if not prompts:
+        print("arena: give --prompt and/or --prompts", file=sys.stderr)
+        return 2
+
+    rows = asyncio.run(
+        run_arena(
+            args.targets,
+            prompts,
+            out_dir=args.out_dir,
+            concurrency=args.concurrency,
+            system=args.system,
+        )
+    )
+    failed = sum(1 for row in rows if row["error"])
+    print(f"{len(rows)} rows ({failed} failed) -> {args.out_dir}", file=sys.stderr)
+    return 0
+
+
+def _cmd_bench_startup(args) -> int:
+    """Measure import cost with `python -X importtime` in fresh interpreters."""
+    import subprocess
+
+    cli_ms = 0.0
+    for module in args.modules or STARTUP_MODULES:
+        runs = []
+        for _ in range(args.runs):
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode:
+                print(proc.stderr.strip().splitlines()[-1], file=sys.stderr)
+                return proc.returncode
+            runs.append(_parse_importtime(proc.stderr))
+        best = min(runs, key=lambda r: r[0])  # least noisy run
+        total_ms, top = best
+        if module == "lib.cli":
+            cli_ms = total_ms
+        print(f"{module:<22} {total_ms:8.1f} ms  (best of {args.runs})")
+        for name, ms in top[: args.top]:
+            print(f"    {ms:8.1f} ms  {name}")
+    if args.budget_ms is not None and cli_ms > args.budget_ms:
+        print(
+            f"lib.cli import took {cli_ms:.1f} ms, over the {args.budget_ms} ms budget",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+def _cmd_bench_replay(args) -> int:
+    """Throughput of the client stack against a cassette — no server needed."""
+    import asyncio
+    import time
+
+    from lib.cassette import Cassette
+    from lib.client import AsyncOllamaClient
+    from lib.scheduler import RequestScheduler
+
+    cassette = Cassette(args.cassette, match_on=("method", "path"))
+
+    async def run():
+        scheduler = RequestScheduler(args.concurrency)
+        transport = cassette.replay_transport(speed=args.speed)
+        async with AsyncOllamaClient(
+            scheduler=scheduler, transport=transport
+        ) as client:
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(client.stream_text(args.model, f"p{i}") for i in range(args.n))
+            )
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    print(f"{args.n} streams in {elapsed:.2f}s = {args.n / elapsed:,.0f} req/s")
+    return 0
+
+
+def _cmd_bench_load(args) -> int:
+    """Open-loop load test; see lib.loadgen."""
+    import asyncio
+    import json
+
+    from lib.loadgen import FakeOllamaTransport, ollama_sender, run_load
+    from lib.scheduler import RequestScheduler
+
+    async def run():
+        scheduler = RequestScheduler(args.concurrency)
+        if args.fake:
+            from lib.client import AsyncOllamaClient
+
+            fake = FakeOllamaTransport(args.fake)
+            print(f"fake target: capacity {fake.capacity_rps:.2f} rps", file=sys.stderr)
+            client = AsyncOllamaClient(scheduler=scheduler, transport=fake)
+        else:
+            client = _client(args, scheduler=scheduler)
+        async with client:
+            send = ollama_sender(
+                client, args.model, args.prompt, stream=not args.no_stream
+            )
+            return await run_load(
+                send,
+                rps=args.rps,
+                duration=args.duration,
+                arrivals=args.arrivals,
+                window=args.window,
+                seed=args.seed,
+            )
+
+    report = asyncio.run(run())
+    print(report.table())
+    if args.out:
+        with _open_out(args.out) as out:
+            for row in report.rows():
+                out.write(json.dumps(row) + "\n")
+    return 0
+
+
+def _cmd_tune(args) -> int:
+    """Sweep Ollama options for one model and save a profile."""
+    import asyncio
+
+    from lib.scheduler import RequestScheduler
+    from lib.tuning import choose, pareto_front, save_profile, sweep
+
+    grid = {}
+    for name in ("num_ctx", "num_batch", "num_thread", "num_gpu"):
+        values = getattr(args, name)
+        if values:
+            grid[name] = [int(v) for v in values.split(",")]
+    levels = tuple(int(v) for v in args.concurrency.split(","))
+
+    def progress(point) -> None:
+        print(
+            f"{point.label():<40} {point.throughput_tps:8.1f} tok/s "
+            f"p95 {point.latency_p95:6.2f}s ttft {point.ttft_p50:5.2f}s"
+            + (f" errors={point.errors}" if point.errors else ""),
+            file=sys.stderr,
+        )
+
+    async def run():
+        scheduler = RequestScheduler(max(levels))
+        async with _client(args, scheduler=scheduler, profiles=False) as client:
+            return await sweep(
+                client,
+                args.model,
+                _prompt(args),
+                grid=grid,
+                concurrency=levels,
+                requests=args.n,
+                num_predict=args.num_predict,
+                progress=progress,
+            )
+
+    front = pareto_front(asyncio.run(run()))
+    if not front:
+        print("tune: every point failed", file=sys.stderr)
+        return 1
+    print("Pareto front (throughput vs. p95 latency):")
+    for point in front:
+        print(
+            f"  {point.label():<40} {point.throughput_tps:8.1f} tok/s "
+            f"p95 {point.latency_p95:6.2f}s"
+        )
+    chosen = choose(front, args.goal)
+    print(f"chosen ({args.goal}): {chosen.label()}")
+    if args.save:
+        from lib.client import DEFAULT_BASE_URL
+
+        base_url = args.host or DEFAULT_BASE_URL
+        save_profile(args.model, chosen, front, base_url=base_url, goal=args.goal)
+    return 0
+
+
+def _cmd_queue_init(args) -> int:
+    import json
+
+    from lib.workqueue import WorkQueue
+
+    with _open_in(args.jobs) as f:
+        jobs = [json.loads(line) for line in f if line.strip()]
+    for job in jobs:
+        job.setdefault("model", args.model)
+    shards = WorkQueue(args.queue).enqueue(jobs, shard_size=args.shard_size)
+    print(f"{len(jobs)} jobs in {shards} shards -> {args.queue}", file=sys.stderr)
+    return 0
+
+
+def _cmd_queue_work(args) -> int:
+    from lib.workqueue import run_workers
+
+    done = run_workers(
+        args.queue,
+        args.workers,
+        base_url=args.host,
+        concurrency=args.concurrency,
+        stream=args.stream,
+        lease_seconds=args.lease_seconds,
+    )
+    print(f"{done} shards completed by {args.workers} workers", file=sys.stderr)
+    return 0
+
+
+def _cmd_queue_status(args) -> int:
+    from lib.workqueue import WorkQueue
+
+    _print_json(WorkQueue(args.queue).status())
+    return 0
+
+
+def _cmd_queue_merge(args) -> int:
+    from lib.workqueue import WorkQueue
+
+    queue = WorkQueue(args.queue)
+    with _open_out(args.out) as out:
+        rows = queue.merge(out)
+    status = queue.status()
+    print(f"{rows} results merged; shards: {status}", file=sys.stderr)
+    return 0 if queue.finished() and not status.get("failed") else 1
+
+
+# ── Helpers ─────────────────────────────────────────────────────────────────
+def _client(args, scheduler=None, profiles=True):
+    transport = None
+    if args.replay or args.record:
+        from lib.cassette import Cassette
+
+        # Match on path + body so a cassette recorded on another host replays.
+        cassette = Cassette(
+            args.replay or args.record, match_on=("method", "path", "body")
+        )
+        transport = (
+            cassette.replay_transport(speed=0)
+            if args.replay
+            else cassette.recording_transport()
+        )
+    if getattr(args, "provider", None):
+        from lib.openai_compat import AsyncChatClient
+
+        return AsyncChatClient(args.provider, scheduler=scheduler, transport=transport)
+
+    from lib.client import DEFAULT_BASE_URL, AsyncOllamaClient
+    from lib.tuning import load_profiles
+
+    return AsyncOllamaClient(
+        args.host or DEFAULT_BASE_URL,
+        scheduler=scheduler,
+        transport=transport,
+        profiles=load_profiles() if profiles else None,
+    )
+
+
+def _concurrency(args) -> int:
+    """--concurrency, else the tuned concurrency for the model on --host."""
+    if args.concurrency:
+        return args.concurrency
+    if not getattr(args, "provider", None):
+        from lib.client import DEFAULT_BASE_URL
+        from lib.tuning import load_profiles, profiles_for, tuned_concurrency
+
+        profiles = profiles_for(load_profiles(), args.host or DEFAULT_BASE_URL)
+        level = tuned_concurrency(profiles, getattr(args, "model", None))
+        if level:
+            return level
+    return 4
+
+
+def _prompt(args) -> str:
+    return sys.stdin.read() if args.prompt == "-" else args.prompt
+
+
+def _messages(args) -> list[dict]:
+    messages = [{"role": "user", "content": _prompt(args)}]
+    if args.system:
+        messages.insert(0, {"role": "system", "content": args.system})
+    return messages
+
+
+def _fields(args) -> dict:
+    """Extra /api/generate fields from --system and --option key=value."""
+    fields = {}
+    if args.system:
+        fields["system"] = args.system
+    if args.option:
+        import json
+
+        options = {}
+        for item in args.option:
+            key, _, value = item.partition("=")
+            try:
+                options[key] = json.loads(value)
+            except ValueError:
+                options[key] = value
+        fields["options"] = options
+    return fields
+
+
+def _print_json(obj) -> None:
+    import json
+
+    print(json.dumps(obj, indent=2, ensure_ascii=False))
+
+
+def _open_in(path: str):
+    return nullcontext(sys.stdin) if path == "-" else open(path)
+
+
+def _open_out(path: str | None):
+    return nullcontext(sys.stdout) if path in (None, "-") else open(path, "w")
+
+
+def _parse_importtime(stderr: str) -> tuple[float, list[tuple[str, float]]]:
+    """Sum the cumulative time of top-level imports; return (total ms, top)."""
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.startswith("  "):  # nested import, already in its parent
+            continue
+        top.append((name.strip(), int(cumulative) / 1000))
+    top.sort(key=lambda item: item[1], reverse=True)
+    return sum(ms for _, ms in top), top
+
+
+def _check_args(parser: argparse.ArgumentParser, args) -> None:
+    """Reject option combinations argparse cannot express."""
+    if getattr(args, "prefix_plan", False):
+        # A planned batch runs its own lanes: no streaming, stages or window.
+        clash = [
+            flag
+            for flag, value in (
+                ("--stage", args.stage),
+                ("--stream", args.stream),
+                ("--window", args.window),
+            )
+            if value
+        ]
+        if clash:
+            parser.error(f"--prefix-plan cannot be combined with {', '.join(clash)}")
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="llm-eng", description="Talk to Ollama and OpenAI-compatible providers."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    backend = argparse.ArgumentParser(add_help=False)
+    backend.add_argument("--host", help="Ollama URL (default $OLLAMA_HOST)")
+    backend.add_argument(
+        "--replay", metavar="CASSETTE", help="answer from a recorded cassette"
+    )
+    backend.add_argument(
+        "--record", metavar="CASSETTE", help="record exchanges to a cassette"
+    )
+
+    prompt = argparse.ArgumentParser(add_help=False, parents=[backend])
+    prompt.add_argument(
+        "--provider",
+        help="OpenAI-compatible provider (groq, deepseek, ...) instead of Ollama",
+    )
+    prompt.add_argument("--system", help="system prompt")
+    prompt.add_argument(
+        "-o", "--option", action="append", help="Ollama option, e.g. -o num_ctx=8192"
+    )
+    prompt.add_argument(
+        "model", nargs="?", help="model name (provider default if omitted)"
+    )
+    prompt.add_argument("prompt", help="prompt text, or - to read stdin")
+
+    p = sub.add_parser(
+        "generate", parents=[prompt], help="one non-streaming completion"
+    )
+    p.add_argument("--json", action="store_true", help="print the full JSON response")
+    p.set_defaults(func=_cmd_generate)
+
+    p = sub.add_parser("stream", parents=[prompt], help="stream one completion")
+    p.add_argument(
+        "--stats", action="store_true", help="print TTFT and usage to stderr"
+    )
+    p.set_defaults(func=_cmd_stream)
+
+    p = sub.add_parser("batch", parents=[backend], help="run a JSONL file of jobs")
+    p.add_argument(
+        "jobs", help='JSONL with {"prompt": ..., "model": ...} per line, or -'
+    )
+    p.add_argument("--model", help="model for jobs that do not name one")
+    p.add_argument("--out", help="output JSONL (default stdout)")
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        help="requests in flight (default: tuned profile, else 4)",
+    )
+    p.add_argument("--stream", action="store_true", help="use streaming requests")
+    p.add_argument(
+        "--window",
+        type=int,
+        help="jobs in flight at once (default 4 x --concurrency)",
+    )
+    p.add_argument(
+        "--unordered",
+        dest="ordered",
+        action="store_false",
+        help="write results as they finish",
+    )
+    p.add_argument(
+        "--stage", action="append", help="lib.pipeline handler to run on each result"
+    )
+    p.add_argument(
+        "--prefix-plan",
+        action="store_true",
+        help="order jobs for KV-cache prefix reuse and report the savings "
+        "(not with --stage, --stream or --window)",
+    )
+    p.set_defaults(func=_cmd_batch)
+
+    p = sub.add_parser("arena", help="same prompts to many providers, to Parquet")
+    p.add_argument("targets", nargs="+", help='"provider" or "provider:model"')
+    p.add_argument("--prompt", action="append", help="a prompt (repeatable)")
+    p.add_argument("--prompts", help="file with one prompt per line, or -")
+    p.add_argument("--system", help="system prompt")
+    p.add_argument("--out-dir", default="results/arena", help="Parquet dataset dir")
+    p.add_argument("--concurrency", type=int, default=4, help="per target")
+    p.set_defaults(func=_cmd_arena)
+
+    bench = sub.add_parser("bench", help="benchmarks").add_subparsers(
+        dest="bench", required=True
+    )
+    p = bench.add_parser("startup", help="import time of the CLI and clients")
+    p.add_argument("modules", nargs="*", help=f"default: {' '.join(STARTUP_MODULES)}")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=5, help="slowest imports to list")
+    p.add_argument(
+        "--budget-ms", type=float, help="exit 1 if `import lib.cli` is slower"
+    )
+    p.set_defaults(func=_cmd_bench_startup)
+
+    p = bench.add_parser("replay", help="client-stack throughput from a cassette")
+    p.add_argument("cassette")
+    p.add_argument("-n", type=int, default=1000, help="requests to send")
+    p.add_argument("--model", default="replay")
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--speed", type=float, default=0, help="0 = no chunk delays")
+    p.set_defaults(func=_cmd_bench_replay)
+
+    p = bench.add_parser(
+        "load", parents=[backend], help="open-loop load test at a target rate"
+    )
+    p.add_argument("model", nargs="?", default="llama3.2")
+    p.add_argument("--prompt", default="Say hello.")
+    p.add_argument("--rps", type=float, required=True, help="offered requests/s")
+    p.add_argument("--duration", type=float, default=30.0, help="seconds")
+    p.add_argument("--arrivals", choices=("poisson", "constant"), default="poisson")
+    p.add_argument("--window", type=float, default=1.0, help="report window, s")
+    p.add_argument("--seed", type=int, help="seed for Poisson arrivals")
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=1024,
+        help="client-side cap on requests in flight",
+    )
+    p.add_argument("--no-stream", action="store_true", help="non-streaming requests")
+    p.add_argument(
+        "--fake",
+        type=int,
+        metavar="SLOTS",
+        help="target an in-process fake Ollama with SLOTS slots",
+    )
+    p.add_argument("--out", help="per-window stats as JSONL")
+    p.set_defaults(func=_cmd_bench_load)
+
+    queue = sub.add_parser(
+        "queue", help="sharded batch runs across processes and hosts"
+    ).add_subparsers(dest="queue_command", required=True)
+    p = queue.add_parser("init", help="load a JSONL file of jobs into a queue")
+    p.add_argument("queue", help="SQLite queue file")
+    p.add_argument("jobs", help="JSONL jobs, or -")
+    p.add_argument("--model", help="model for jobs that do not name one")
+    p.add_argument("--shard-size", type=int, default=50)
+    p.set_defaults(func=_cmd_queue_init)
+
+    p = queue.add_parser("work", help="run worker processes until drained")
+    p.add_argument("queue")
+    p.add_argument("--host", help="Ollama URL (default $OLLAMA_HOST)")
+    p.add_argument("--workers", type=int, default=2, help="processes")
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        help="per process (default: tuned profile, else 4)",
+    )
+    p.add_argument("--stream", action="store_true", help="use streaming requests")
+    p.add_argument("--lease-seconds", type=float, default=60.0)
+    p.set_defaults(func=_cmd_queue_work)
+
+    p = queue.add_parser("status", help="shard counts by status")
+    p.add_argument("queue")
+    p.set_defaults(func=_cmd_queue_status)
+
+    p = queue.add_parser("merge", help="write all results, in job order")
+    p.add_argument("queue")
+    p.add_argument("--out", help="output JSONL (default stdout)")
+    p.set_defaults(func=_cmd_queue_merge)
+
+    p = sub.add_parser(
+        "tune", parents=[backend], help="sweep Ollama options, save a profile"
+    )
+    p.add_argument("model")
+    p.add_argument(
+        "prompt", nargs="?", default="Explain how a hash map works.", help="or -"
+    )
+    for name in ("num_ctx", "num_batch", "num_thread", "num_gpu"):
+        p.add_argument(
+            f"--{name.replace('_', '-')}", dest=name, help="comma-separated values"
+        )
+    p.add_argument("--concurrency", default="1,2,4", help="comma-separated levels")
+    p.add_argument("-n", type=int, default=8, help="requests per point")
+    p.add_argument("--num-predict", type=int, default=128, help="tokens per request")
+    p.add_argument(
+        "--goal", choices=("balanced", "throughput", "latency"), default="balanced"
+    )
+    p.add_argument(
+        "--no-save", dest="save", action="store_false", help="only print results"
+    )
+    p.set_defaults(func=_cmd_tune)
+
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+# ── Shared async Ollama client ──────────────────────────────────────────────
+# The scripts in api_examples/ollama each build their own `httpx.AsyncClient`
+# and POST straight to /api/generate. This module is the one place that
+# talks to Ollama for library code, so cross-cutting behaviour (scheduling,
+# and later recording, profiling, routing) is applied to every call path.
+#
+#   async with AsyncOllamaClient() as client:
+#       text = (await client.generate(model, prompt))["response"]
+#
+#       async with client.stream(model, prompt) as tokens:
+#           async for text in tokens:
+#               print(text, end="", flush=True)
+#       print(tokens.final["eval_count"])
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager, suppress
+
+import httpx
+
+from lib.scheduler import Lease, Preempted, Priority, RequestScheduler
+from lib.streams import NDJSONDecoder, SSEDecoder
+
+DEFAULT_BASE_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+
+# Same per-phase limits the streaming examples use: no read timeout, because
+# a slow local model may think for a long time before the next chunk.
+DEFAULT_TIMEOUT = httpx.Timeout(connect=10.0, read=None, write=60.0, pool=15.0)
+
+
+class TokenStream:
+    """Async iterator over the text deltas of one streaming generation.
+
+    After iteration finishes, `final` holds the decoder's final record: for
+    Ollama the last NDJSON record (eval_count, eval_duration,
+    prompt_eval_count, ...), for SSE the model/finish_reason/usage block.
+    """
+
+    def __init__(
+        self,
+        response: httpx.Response,
+        lease: Lease,
+        scheduler: RequestScheduler,
+        started: float,
+        decoder: NDJSONDecoder | SSEDecoder | None = None,
+        probe=None,
+    ) -> None:
+        self._response = response
+        self._lease = lease
+        self._scheduler = scheduler
+        self._started = started
+        self._decoder = decoder or NDJSONDecoder()
+        self._probe = probe  # lib.profiling.RequestProbe, when profiling
+        self.ttft: float | None = None
+
+    @property
+    def final(self) -> dict | None:
+        return self._decoder.final
+
+    async def __aiter__(self):
+        preempted = self._lease.preempted
+        async for text in self._decoder.iter_text(self._response.aiter_bytes()):
+            if self.ttft is None:
+                self.ttft = time.monotonic() - self._started
+                self._scheduler.observe_ttft(self._lease, self.ttft)
+            if preempted.is_set():
+                raise Preempted(self._lease.tenant)
+            if self._probe is None:
+                yield text
+            else:
+                self._probe.token()
+                yield text
+                self._probe.resumed()
+
+
+class AsyncOllamaClient:
+    """Thin async wrapper over Ollama's REST API with request scheduling.
+
+    Args:
+        base_url: Ollama server, default `$OLLAMA_HOST` or localhost:11434.
+        scheduler: shared `RequestScheduler`; one is created if omitted.
+            Share one scheduler between every client pointed at the same server.
+        timeout: httpx timeout, see `DEFAULT_TIMEOUT`.
+        transport: optional httpx transport (e.g. for tests or replay).
+        semantic_cache: optional `lib.semantic_cache.SemanticCache`; only
+            `generate` calls with a `route` enabled on the cache use it.
+        profiles: tuned profiles as returned by `lib.tuning.load_profiles`;
+            only those measured on `base_url` apply. A profile's options are
+            merged under each request's own options, and a scheduler created
+            here is sized to the tuned concurrency.
+        profiler: optional `lib.profiling.Profiler` for per-phase timings.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        *,
+        scheduler: RequestScheduler | None = None,
+        timeout: httpx.Timeout | None = DEFAULT_TIMEOUT,
+        transport: httpx.AsyncBaseTransport | None = None,
+        semantic_cache=None,
+        profiles: dict[str, dict[str, dict]] | None = None,
+        profiler=None,
+    ) -> None:
+        self.base_url = base_url
+        self.profiles: dict[str, dict] = {}  # model → profile, this server only
+        if profiles:
+            from lib.tuning import profiles_for, tuned_concurrency
+
+            self.profiles = profiles_for(profiles, base_url)
+            if scheduler is None and (level := tuned_concurrency(self.profiles)):
+                scheduler = RequestScheduler(level)
+        self.scheduler = scheduler or RequestScheduler()
+        self.semantic_cache = semantic_cache
+        self.profiler = profiler
+        self._http = httpx.AsyncClient(
+            base_url=base_url, timeout=timeout, transport=transport
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    # ── Non-streaming ───────────────────────────────────────────────────────
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        *,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        route: str | None = None,
+        **fields,
+    ) -> dict:
+        """POST /api/generate with `stream: false` and return the JSON body.
+
+        Extra keyword arguments (`system`, `options`, `format`, ...) are passed
+        through in the request body. Batch requests that get preempted are
+        re-queued transparently. With a `route` enabled on the client's
+        semantic cache, a near-duplicate prompt returns the cached record
+        (marked ``cached: True``) without generating.
+        """
+        cache = self.semantic_cache
+        if cache is None or not cache.enabled(route):
+            return await self._generate(model, prompt, tenant, priority, fields)
+        hit, vector = await cache.lookup(route, model, prompt, fields)
+        if hit is not None:
+            return hit
+        result = await self._generate(model, prompt, tenant, priority, fields)
+        cache.store(route, model, prompt, fields, vector, result)
+        return result
+
+    async def _generate(self, model, prompt, tenant, priority, fields) -> dict:
+        fields = self._with_profile(model, fields)
+        payload = {"model": model, "prompt": prompt, "stream": False, **fields}
+        probe = self.profiler.request() if self.profiler is not None else None
+        extensions = {"trace": probe.trace} if probe is not None else None
+        try:
+            while True:
+                async with self.scheduler.slot(
+                    tenant, priority, cost=len(prompt)
+                ) as lease:
+                    if probe is not None:
+                        probe.mark("admitted")
+                    try:
+                        response = await _until_preempted(
+                            self._http.post(
+                                "/api/generate", json=payload, extensions=extensions
+                            ),
+                            lease,
+                        )
+                    except Preempted:
+                        continue
+                response.raise_for_status()
+                return response.json()
+        finally:
+            if probe is not None:
+                probe.finish()
+
+    async def embed(self, model: str, texts: list[str]) -> list[list[float]]:
+        """POST /api/embed; one vector per text.
+
+        Embedding calls are short and do not go through the scheduler, so a
+        cache lookup never queues behind the generation it may save.
+        """
+        response = await self._http.post(
+            "/api/embed", json={"model": model, "input": texts}
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    # ── Streaming ───────────────────────────────────────────────────────────
+    @asynccontextmanager
+    async def stream(
+        self,
+        model: str,
+        prompt: str,
+        *,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        **fields,
+    ):
+        """POST /api/generate with `stream: true`; yields a `TokenStream`.
+
+        A preempted batch stream raises `Preempted` from the iterator; the
+        caller decides whether to retry (see `lib.batch.run_batch`).
+        """
+        fields = self._with_profile(model, fields)
+        payload = {"model": model, "prompt": prompt, "stream": True, **fields}
+        probe = self.profiler.request() if self.profiler is not None else None
+        extensions = {"trace": probe.trace} if probe is not None else None
+        try:
+            async with self.scheduler.slot(tenant, priority, cost=len(prompt)) as lease:
+                started = time.monotonic()
+                if probe is not None:
+                    probe.mark("admitted")
+                async with self._http.stream(
+                    "POST", "/api/generate", json=payload, extensions=extensions
+                ) as response:
+                    if probe is not None and "headers" not in probe.t:
+                        probe.mark("headers")  # transports without tracing
+                    response.raise_for_status()
+                    yield TokenStream(
+                        response, lease, self.scheduler, started, probe=probe
+                    )
+        finally:
+            if probe is not None:
+                probe.finish()
+
+    async def stream_text(self, model: str, prompt: str, **kwargs) -> tuple[str, dict]:
+        """Convenience: run a stream to completion, return (text, final record)."""
+        async with self.stream(model, prompt, **kwargs) as tokens:
+            parts = [text async for text in tokens]
+        return "".join(parts), tokens.final
+
+    def _with_profile(self, model: str, fields: dict) -> dict:
+        profile = self.profiles.get(model)
+        if not profile or not profile.get("options"):
+            return fields
+        options = {**profile["options"], **(fields.get("options") or {})}
+        return {**fields, "options": options}
+
+
+async def _until_preempted(coro, lease: Lease):
+    """Await `coro`, but abandon it (closing the connection, which makes
+    Ollama stop generating) as soon as the lease is preempted."""
+    if lease.priority is Priority.INTERACTIVE:
+        return await coro
+    task = asyncio.ensure_future(coro)
+    waiter = asyncio.ensure_future(lease.preempted.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        task.cancel()
+        raise
+    finally:
+        waiter.cancel()
+    if task.done():
+        return task.result()
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    raise Preempted(lease.tenant)
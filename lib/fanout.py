@@ -0,0 +1,231 @@
+# ── Stream fan-out (tee) ────────────────────────────────────────────────────
+# One generation often has several readers: the UI, a transcript writer, a
+# metrics collector, the incremental JSON parser. Without a tee, each extra
+# reader means either a second generation or ad-hoc string accumulation.
+# StreamTee reads the source once and broadcasts it:
+#
+#   async with client.stream(model, prompt) as tokens, StreamTee(tokens) as tee:
+#       ui = tee.attach()                                  # block (default)
+#       log = tee.attach(policy="spill", maxsize=256)      # never loses data
+#       meter = tee.attach(policy="drop", maxsize=16)      # never slows others
+#       await asyncio.gather(render(ui), write(log), count(meter))
+#       late = tee.attach(replay=True)   # later: everything from the start
+#
+# All consumers read from one shared chunk log, each through its own cursor.
+# A chunk is the same object for every reader; nothing is copied. What a
+# consumer has not read yet counts against its `maxsize`, and the policy
+# decides what happens when it falls further behind:
+#   block  the pump waits for it, so backpressure reaches the HTTP read
+#   drop   it skips the oldest unread chunks; `dropped` counts them
+#   spill  its backlog goes to a temp file and is read back in order
+# `history` sets how many chunks stay in the log for late `replay=True`
+# attachers; None keeps the whole stream. Memory is bounded only with a
+# finite `history` (spilling is what lets the log be trimmed under a slow
+# reader).
+import asyncio
+import pickle
+import tempfile
+
+POLICIES = ("block", "drop", "spill")
+
+
+class TeeConsumer:
+    """One reader of a `StreamTee`; an async iterator over the chunks."""
+
+    def __init__(self, tee: "StreamTee", cursor: int, policy: str, maxsize: int):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}")
+        self._tee = tee
+        self.cursor = cursor  # absolute index of the next chunk in the log
+        self.policy = policy
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.spilled = 0
+        self.closed = False
+        self._spill = None  # temp file of chunks before `cursor`
+        self._spill_read = 0  # read offset into it
+        self._spill_pending = 0
+
+    @property
+    def lag(self) -> int:
+        """Chunks this consumer has not read yet."""
+        return self._spill_pending + self._tee.head - self.cursor
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        tee = self._tee
+        while True:
+            if self.closed:
+                raise StopAsyncIteration
+            if self._spill_pending:
+                return self._unspill()
+            if self.cursor < tee.head:
+                chunk = tee._log[self.cursor - tee._base]
+                self.cursor += 1
+                tee._progress()
+                return chunk
+            if tee.done:
+                if tee.error is not None:
+                    raise tee.error
+                raise StopAsyncIteration
+            await tee._wait_for_data()
+
+    def close(self) -> None:
+        """Detach; a closed consumer no longer holds back the pump or the log."""
+        self.closed = True
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._tee._progress()
+
+    async def aclose(self) -> None:
+        self.close()
+
+    # ── Spilling ────────────────────────────────────────────────────────────
+    def _spill_oldest(self, n: int) -> None:
+        tee = self._tee
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile()
+        self._spill.seek(0, 2)
+        for i in range(self.cursor, self.cursor + n):
+            pickle.dump(tee._log[i - tee._base], self._spill)
+        self.cursor += n
+        self._spill_pending += n
+        self.spilled += n
+
+    def _unspill(self):
+        self._spill.seek(self._spill_read)
+        chunk = pickle.load(self._spill)
+        self._spill_read = self._spill.tell()
+        self._spill_pending -= 1
+        if not self._spill_pending:  # drained: start the file over
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill_read = 0
+        return chunk
+
+
+class StreamTee:
+    """Broadcast an async iterable to any number of `TeeConsumer`s.
+
+    Args:
+        source: async iterable of chunks (e.g. a `TokenStream`).
+        history: chunks kept for `attach(replay=True)`; None keeps all.
+    """
+
+    def __init__(self, source, *, history: int | None = None) -> None:
+        self._source = source
+        self.history = history
+        self._log: list = []
+        self._base = 0  # absolute index of _log[0]
+        self.consumers: list[TeeConsumer] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self._data = asyncio.Event()  # set when a chunk arrives or the end
+        self._space = asyncio.Event()  # set when a consumer reads or leaves
+        self._pump_task: asyncio.Task | None = None
+
+    @property
+    def head(self) -> int:
+        """Absolute index one past the newest chunk."""
+        return self._base + len(self._log)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def start(self) -> None:
+        if self._pump_task is None:
+            self._pump_task = asyncio.ensure_future(self._pump())
+
+    async def wait(self) -> None:
+        """Until the source is exhausted (or failed)."""
+        self.start()
+        await asyncio.shield(self._pump_task)
+
+    async def aclose(self) -> None:
+        if self._pump_task is not None and not self._pump_task.done():
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+        for consumer in self.consumers:
+            consumer.close()
+
+    def attach(
+        self, *, policy: str = "block", maxsize: int = 1024, replay: bool = False
+    ) -> TeeConsumer:
+        """Add a consumer. With `replay` it starts at the oldest chunk still
+        in the log, otherwise at the next new one."""
+        consumer = TeeConsumer(
+            self, self._base if replay else self.head, policy, maxsize
+        )
+        self.consumers.append(consumer)
+        return consumer
+
+    # ── Pump ────────────────────────────────────────────────────────────────
+    async def _pump(self) -> None:
+        try:
+            async for chunk in self._source:
+                await self._make_room()
+                self._log.append(chunk)
+                self._notify_data()
+                self._trim()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self._notify_data()
+
+    async def _make_room(self) -> None:
+        """Apply each consumer's policy before one more chunk is appended."""
+        while True:
+            blocked = False
+            for consumer in self.consumers:
+                behind = self.head - consumer.cursor  # unread chunks in the log
+                if consumer.closed or behind < consumer.maxsize:
+                    continue
+                excess = behind - consumer.maxsize + 1
+                if consumer.policy == "drop":
+                    consumer.cursor += excess
+                    consumer.dropped += excess
+                elif consumer.policy == "spill":
+                    consumer._spill_oldest(excess)
+                else:
+                    blocked = True
+            if not blocked:
+                return
+            self._space.clear()
+            await self._space.wait()
+
+    def _trim(self) -> None:
+        """Drop chunks that no live consumer still needs and that fall outside
+        the replay history."""
+        if self.history is None:
+            return
+        keep_from = self.head - self.history
+        for consumer in self.consumers:
+            if not consumer.closed:
+                keep_from = min(keep_from, consumer.cursor)
+        if keep_from > self._base:
+            del self._log[: keep_from - self._base]
+            self._base = keep_from
+
+    def _notify_data(self) -> None:
+        self._data.set()
+
+    async def _wait_for_data(self) -> None:
+        self._data.clear()
+        await self._data.wait()
+
+    def _progress(self) -> None:
+        self._space.set()
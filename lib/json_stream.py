@@ -0,0 +1,392 @@
+# ── Incremental JSON over token streams ─────────────────────────────────────
+# With `format: "json"` (or a JSON schema as `format`) Ollama streams the
+# document a few characters at a time, and the usual loop only parses it after
+# `done: true`. `JSONStreamParser` consumes the deltas as they arrive and
+# emits each field / array item as soon as it closes, so downstream work can
+# start while the model is still generating — and a document that breaks the
+# schema is rejected at the first bad field instead of at the end.
+#
+#   parser = JSONStreamParser(schema)            # schema optional
+#   async with client.stream(model, prompt, format=schema) as tokens:
+#       async for path, value in parser.iter_values(tokens):
+#           print(path, value)                   # ("items", 0) {...}
+#
+# `stream_json` wraps both for the native Ollama client: leaving the stream
+# on a `SchemaViolation` closes the connection, which stops generation.
+#
+# `depth` picks the granularity: values whose path is at most `depth` long
+# are emitted (depth=1: top-level fields or items; depth=2: also the items
+# of a top-level array field, ...). The root document comes last, with
+# path ().
+#
+# Each emitted value is decoded from its text span with `json.loads` in C.
+# The parser itself only scans structure, and it skips string bodies with
+# `re.search`, so a long string value is not walked one character at a time
+# in Python. Containers shallower than `depth` are assembled from their
+# children, so no text is parsed twice, and the buffer only holds the value
+# currently being read.
+import json
+import re
+
+_STRING_STOP = re.compile(r'["\\]')
+_SCALAR = re.compile(r"[^\s,\]}]*")
+
+# First character of a value → JSON Schema type it can satisfy.
+_KINDS = {"{": ("object",), "[": ("array",), '"': ("string",)}
+_KINDS.update(dict.fromkeys("-0123456789", ("number", "integer")))
+_KINDS.update({"t": ("boolean",), "f": ("boolean",), "n": ("null",)})
+
+_PY_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+class JSONStreamError(ValueError):
+    """The streamed text is not valid JSON."""
+
+
+class SchemaViolation(ValueError):
+    """A streamed value does not match the schema."""
+
+    def __init__(self, path: tuple, message: str) -> None:
+        super().__init__(f"{_format_path(path)}: {message}")
+        self.path = path
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "schema", "container", "key", "expect")
+
+    def __init__(self, kind: str, path: tuple, schema: dict | None) -> None:
+        self.kind = kind  # "{" or "["
+        self.path = path
+        self.schema = schema
+        self.container = {} if kind == "{" else []
+        self.key = None
+        self.expect = "key" if kind == "{" else "value"
+
+
+class JSONStreamParser:
+    """Push parser: `feed` text deltas, get back completed ``(path, value)``.
+
+    Args:
+        schema: optional JSON Schema (the subset Ollama's `format` accepts:
+            type, properties, required, additionalProperties, items, enum,
+            const, minItems, maxItems). Checked as each value starts and closes.
+        depth: emit values whose path length is <= depth.
+    """
+
+    def __init__(self, schema: dict | None = None, *, depth: int = 1) -> None:
+        self.schema = schema
+        self.depth = depth
+        self.value = None  # the whole document, once complete
+        self.done = False
+        self._buf = ""
+        self._pos = 0
+        self._stack: list[_Frame] = []
+        self._mark: int | None = None  # start of the span being read
+        self._mark_path: tuple = ()
+        self._mark_schema: dict | None = None
+        self._mark_is_key = False
+        self._raw_depth = 0  # bracket depth inside a raw (unassembled) value
+        self._in_string = False
+
+    # ── Public API ──────────────────────────────────────────────────────────
+    def feed(self, text: str) -> list[tuple[tuple, object]]:
+        """Consume the next chunk; return the values it completed."""
+        self._buf += text
+        events: list[tuple[tuple, object]] = []
+        self._scan(events, final=False)
+        # Drop text nobody needs any more.
+        cut = self._pos if self._mark is None else self._mark
+        if cut:
+            self._buf = self._buf[cut:]
+            self._pos -= cut
+            if self._mark is not None:
+                self._mark -= cut
+        return events
+
+    def close(self) -> list[tuple[tuple, object]]:
+        """Signal end of input: flush a trailing bare scalar and check that
+        the document is complete."""
+        events: list[tuple[tuple, object]] = []
+        self._scan(events, final=True)
+        if not self.done:
+            raise JSONStreamError("unexpected end of JSON input")
+        return events
+
+    async def iter_values(self, texts):
+        """Async-iterate ``(path, value)`` over an async iterable of deltas
+        (e.g. a `TokenStream`). Stops reading once the document is complete."""
+        async for text in texts:
+            for event in self.feed(text):
+                yield event
+            if self.done:
+                return
+        for event in self.close():
+            yield event
+
+    # ── Scanner ─────────────────────────────────────────────────────────────
+    def _scan(self, events: list, final: bool) -> None:
+        buf, n = self._buf, len(self._buf)
+        while self._pos < n:
+            if self._in_string:
+                if not self._skip_string(buf, n):
+                    return
+                self._string_closed(events)
+                continue
+
+            ch = buf[self._pos]
+            if ch in " \t\r\n":
+                self._pos += 1
+                continue
+            if self.done:
+                raise JSONStreamError(f"trailing data after JSON document: {ch!r}")
+
+            if self._raw_depth:  # inside a value that is decoded as a whole
+                self._pos += 1
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._raw_depth += 1
+                elif ch in "}]":
+                    self._raw_depth -= 1
+                    if not self._raw_depth:
+                        self._value_closed(events, self._pos)
+                continue
+
+            frame = self._stack[-1] if self._stack else None
+            expect = frame.expect if frame else "value"
+            if expect == "value":
+                if frame is not None and frame.kind == "[" and ch == "]":
+                    if frame.container:
+                        raise JSONStreamError("trailing comma in array")
+                    self._pos += 1
+                    self._container_closed(events)
+                    continue
+                if not self._start_value(ch, buf, n, final, events):
+                    return
+            elif expect == "key":
+                if ch == '"':
+                    self._mark, self._mark_is_key = self._pos, True
+                    self._pos += 1
+                    self._in_string = True
+                elif ch == "}" and not frame.container and frame.key is None:
+                    self._pos += 1
+                    self._container_closed(events)
+                else:
+                    raise JSONStreamError(f"expected object key, got {ch!r}")
+            elif expect == "colon":
+                if ch != ":":
+                    raise JSONStreamError(f"expected ':', got {ch!r}")
+                self._pos += 1
+                frame.expect = "value"
+            else:  # "comma"
+                self._pos += 1
+                if ch == ",":
+                    frame.expect = "key" if frame.kind == "{" else "value"
+                    frame.key = None
+                elif ch == ("}" if frame.kind == "{" else "]"):
+                    self._container_closed(events)
+                else:
+                    raise JSONStreamError(f"expected ',' or close, got {ch!r}")
+
+    def _skip_string(self, buf: str, n: int) -> bool:
+        """Advance past the closing quote; False if the chunk ends first."""
+        while True:
+            match = _STRING_STOP.search(buf, self._pos)
+            if match is None:
+                self._pos = max(self._pos, n)
+                return False
+            if match.group() == "\\":
+                self._pos = match.end() + 1  # may point past the chunk; fine
+                continue
+            self._pos = match.end()
+            self._in_string = False
+            return True
+
+    def _start_value(self, ch, buf: str, n: int, final: bool, events) -> bool:
+        frame = self._stack[-1] if self._stack else None
+        if frame is None:
+            path, schema = (), self.schema
+        elif frame.kind == "{":
+            path = (*frame.path, frame.key)
+            schema = _property_schema(frame.schema, frame.key)
+        else:
+            path = (*frame.path, len(frame.container))
+            schema = _items_schema(frame.schema)
+
+        kinds = _KINDS.get(ch)
+        if kinds is None:
+            raise JSONStreamError(f"unexpected character {ch!r}")
+        if schema is not None and "type" in schema:
+            allowed = schema["type"]
+            allowed = (allowed,) if isinstance(allowed, str) else allowed
+            if not any(k in allowed for k in kinds):
+                raise SchemaViolation(path, f"expected {'/'.join(allowed)}")
+
+        if ch in "{[" and len(path) < self.depth:  # assemble from children
+            self._pos += 1
+            self._stack.append(_Frame(ch, path, schema))
+            return True
+
+        self._mark, self._mark_path, self._mark_schema = self._pos, path, schema
+        self._mark_is_key = False
+        if ch in "{[":
+            self._pos += 1
+            self._raw_depth = 1
+        elif ch == '"':
+            self._pos += 1
+            self._in_string = True
+        else:
+            end = _SCALAR.match(buf, self._pos).end()
+            if end == n and not final:
+                return False  # the number may continue in the next chunk
+            self._pos = end
+            self._value_closed(events, end)
+        return True
+
+    # ── Completion ──────────────────────────────────────────────────────────
+    def _string_closed(self, events: list) -> None:
+        if self._raw_depth:
+            return
+        if not self._mark_is_key:
+            self._value_closed(events, self._pos)
+            return
+        frame = self._stack[-1]
+        key = json.loads(self._buf[self._mark : self._pos])
+        self._mark, self._mark_is_key = None, False
+        schema = frame.schema or {}
+        if schema.get("additionalProperties") is False and key not in schema.get(
+            "properties", {}
+        ):
+            raise SchemaViolation(frame.path, f"unexpected property {key!r}")
+        if key in frame.container:
+            raise SchemaViolation(frame.path, f"duplicate property {key!r}")
+        frame.key, frame.expect = key, "colon"
+
+    def _value_closed(self, events: list, end: int) -> None:
+        text = self._buf[self._mark : end]
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise JSONStreamError(f"{_format_path(self._mark_path)}: {exc}") from None
+        path, schema = self._mark_path, self._mark_schema
+        self._mark = None
+        if schema is not None:
+            validate(value, schema, path)
+        self._completed(events, path, value)
+
+    def _container_closed(self, events: list) -> None:
+        frame = self._stack.pop()
+        if frame.kind == "{" and frame.schema:
+            missing = [
+                k for k in frame.schema.get("required", ()) if k not in frame.container
+            ]
+            if missing:
+                raise SchemaViolation(frame.path, f"missing required {missing}")
+        if frame.kind == "[" and frame.schema:
+            _check_length(frame.container, frame.schema, frame.path)
+        self._completed(events, frame.path, frame.container)
+
+    def _completed(self, events: list, path: tuple, value) -> None:
+        if self._stack:
+            parent = self._stack[-1]
+            if parent.kind == "{":
+                parent.container[parent.key] = value
+            else:
+                parent.container.append(value)
+                if parent.schema and len(parent.container) > parent.schema.get(
+                    "maxItems", float("inf")
+                ):
+                    raise SchemaViolation(parent.path, "too many items")
+            parent.expect = "comma"
+        else:
+            self.value, self.done = value, True
+        events.append((path, value))
+
+
+async def stream_json(
+    client,
+    model: str,
+    prompt: str,
+    schema: dict | None = None,
+    *,
+    depth: int = 1,
+    **kwargs,
+):
+    """Stream `prompt` from an `AsyncOllamaClient` as structured output
+    (``format`` = `schema`, or ``"json"``) and yield ``(path, value)``."""
+    parser = JSONStreamParser(schema, depth=depth)
+    async with client.stream(
+        model, prompt, format=schema or "json", **kwargs
+    ) as tokens:
+        async for event in parser.iter_values(tokens):
+            yield event
+
+
+# ── Schema subset ───────────────────────────────────────────────────────────
+def validate(value, schema: dict, path: tuple = ()) -> None:
+    """Check `value` against the supported JSON Schema subset; raise
+    `SchemaViolation` with the offending path."""
+    allowed = schema.get("type")
+    if allowed is not None:
+        allowed = (allowed,) if isinstance(allowed, str) else allowed
+        if not any(_is_type(value, t) for t in allowed):
+            raise SchemaViolation(path, f"expected {'/'.join(allowed)}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise SchemaViolation(path, f"{value!r} not in {schema['enum']}")
+    if "const" in schema and value != schema["const"]:
+        raise SchemaViolation(path, f"expected {schema['const']!r}")
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for key in schema.get("required", ()):
+            if key not in value:
+                raise SchemaViolation(path, f"missing required {key!r}")
+        for key, item in value.items():
+            if key in properties:
+                validate(item, properties[key], (*path, key))
+            elif schema.get("additionalProperties") is False:
+                raise SchemaViolation(path, f"unexpected property {key!r}")
+    elif isinstance(value, list):
+        _check_length(value, schema, path)
+        items = schema.get("items")
+        if isinstance(items, dict):
+            for i, item in enumerate(value):
+                validate(item, items, (*path, i))
+
+
+def _is_type(value, name: str) -> bool:
+    if name == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if name == "number":
+        return isinstance(value, int | float) and not isinstance(value, bool)
+    return isinstance(value, _PY_TYPES.get(name, object))
+
+
+def _check_length(items: list, schema: dict, path: tuple) -> None:
+    if len(items) < schema.get("minItems", 0):
+        raise SchemaViolation(path, f"expected at least {schema['minItems']} items")
+    if len(items) > schema.get("maxItems", float("inf")):
+        raise SchemaViolation(path, f"expected at most {schema['maxItems']} items")
+
+
+def _property_schema(schema: dict | None, key: str) -> dict | None:
+    if not schema:
+        return None
+    sub = schema.get("properties", {}).get(key)
+    if sub is None and isinstance(schema.get("additionalProperties"), dict):
+        return schema["additionalProperties"]
+    return sub
+
+
+def _items_schema(schema: dict | None) -> dict | None:
+    items = (schema or {}).get("items")
+    return items if isinstance(items, dict) else None
+
+
+def _format_path(path: tuple) -> str:
+    return "$" + "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in path)
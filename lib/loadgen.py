@@ -0,0 +1,392 @@
+# ── Open-loop load generator ────────────────────────────────────────────────
+# `asyncio.gather` over a handful of requests (httpx_sdk_many_requests.py) is
+# a closed-loop burst. The next request waits for the previous ones, so a slow
+# server also slows the *offered* load, and the measured latency looks fine
+# right up to the point where the node falls over. That is coordinated
+# omission.
+#
+# This generator is open-loop. Arrivals follow a fixed schedule (Poisson or
+# constant rate) and never wait for responses. Every request keeps both its
+# *intended* start (from the schedule) and its *actual* start (when the
+# event loop got to it):
+#   response time = end - intended start   (what a user would see)
+#   service time  = end - actual start     (what a closed loop would report)
+# When the two diverge, the generator or the client is the bottleneck.
+# When response time climbs window after window, the target is past
+# saturation.
+#
+#   report = await run_load(ollama_sender(client, "llama3.2", "Hi"),
+#                           rps=8, duration=60, arrivals="poisson")
+#   print(report.table())
+#
+# Latencies go into HDR-style log-bucketed histograms (fixed relative error,
+# O(1) record, mergeable), one set per time window plus an overall set.
+# `FakeOllamaTransport` simulates an Ollama node with N slots so the whole
+# pipeline can be exercised (and its saturation point checked) offline:
+#   client = AsyncOllamaClient(transport=FakeOllamaTransport(slots=2))
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+
+# ── Histograms ──────────────────────────────────────────────────────────────
+class LogHistogram:
+    """Latency histogram with log-spaced buckets (HDR-style).
+
+    Every value between `lowest` and `highest` seconds is kept to within
+    `precision` relative error; smaller/larger values are clamped.
+
+    Args:
+        precision: relative bucket width, 0.01 = 1 %.
+        lowest: smallest distinguishable value (seconds).
+        highest: largest trackable value (seconds).
+    """
+
+    __slots__ = ("_log_base", "_lowest", "_counts", "count", "total", "min", "max")
+
+    def __init__(
+        self, precision: float = 0.01, lowest: float = 1e-6, highest: float = 3600.0
+    ) -> None:
+        self._log_base = math.log1p(precision)
+        self._lowest = lowest
+        self._counts = [0] * (self._index(highest) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self._lowest:
+            return 0
+        return int(math.log(value / self._lowest) / self._log_base) + 1
+
+    def record(self, value: float) -> None:
+        i = min(self._index(value), len(self._counts) - 1)
+        self._counts[i] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LogHistogram") -> None:
+        for i, n in enumerate(other._counts):
+            if n:
+                self._counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float | None:
+        """Value at percentile `p` (0–100), as the bucket's upper bound."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for i, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank:
+                upper = self._lowest * math.exp(i * self._log_base)
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)) -> dict:
+        out = {"count": self.count, "mean": self.mean, "max": self.max or None}
+        out.update({f"p{p:g}": self.percentile(p) for p in percentiles})
+        return out
+
+
+# ── Arrival schedules ───────────────────────────────────────────────────────
+def poisson_arrivals(rps: float, seed: int | None = None):
+    """Offsets (seconds) of a Poisson process: exponential gaps, mean 1/rps."""
+    rng = random.Random(seed)
+    t = 0.0
+    while True:
+        t += rng.expovariate(rps)
+        yield t
+
+
+def constant_arrivals(rps: float):
+    """Offsets (seconds) at a fixed 1/rps spacing."""
+    i = 0
+    while True:
+        i += 1
+        yield i / rps
+
+
+ARRIVALS = {"poisson": poisson_arrivals, "constant": constant_arrivals}
+
+
+# ── Runner ──────────────────────────────────────────────────────────────────
+@dataclass
+class Window:
+    start: float  # seconds since the run began (by intended start)
+    sent: int = 0
+    ok: int = 0
+    errors: int = 0
+    dropped: int = 0  # not sent: `max_in_flight` reached
+    max_start_lag: float = 0.0  # actual - intended start
+    response: LogHistogram = field(default_factory=LogHistogram)
+    service: LogHistogram = field(default_factory=LogHistogram)
+    ttft: LogHistogram = field(default_factory=LogHistogram)
+
+
+@dataclass
+class LoadReport:
+    rps: float
+    arrivals: str
+    duration: float
+    window: float
+    windows: list[Window]
+    elapsed: float = 0.0
+
+    def total(self) -> Window:
+        total = Window(0.0)
+        for w in self.windows:
+            total.sent += w.sent
+            total.ok += w.ok
+            total.errors += w.errors
+            total.dropped += w.dropped
+            total.max_start_lag = max(total.max_start_lag, w.max_start_lag)
+            total.response.merge(w.response)
+            total.service.merge(w.service)
+            total.ttft.merge(w.ttft)
+        return total
+
+    def rows(self) -> list[dict]:
+        """One dict per window (e.g. for JSONL or a DataFrame)."""
+        rows = []
+        for w in self.windows:
+            row = {
+                "t": w.start,
+                "sent": w.sent,
+                "ok": w.ok,
+                "errors": w.errors,
+                "dropped": w.dropped,
+                "max_start_lag": w.max_start_lag,
+            }
+            for name in ("response", "service", "ttft"):
+                for key, value in getattr(w, name).summary().items():
+                    row[f"{name}_{key}"] = value
+            rows.append(row)
+        return rows
+
+    def table(self) -> str:
+        """Per-window response-time table plus a total line."""
+        lines = [
+            f"{'t':>6} {'sent':>6} {'ok':>6} {'err':>5} {'drop':>5} "
+            f"{'p50':>8} {'p99':>8} {'max':>8} {'svc p99':>8}"
+        ]
+        total = self.total()
+        for label, w in [
+            *((f"{w.start:g}s", w) for w in self.windows),
+            ("total", total),
+        ]:
+            r = w.response
+            lines.append(
+                f"{label:>6} {w.sent:>6} {w.ok:>6} {w.errors:>5} {w.dropped:>5} "
+                f"{_ms(r.percentile(50))} {_ms(r.percentile(99))} "
+                f"{_ms(r.max or None)} {_ms(w.service.percentile(99))}"
+            )
+        achieved = total.ok / self.elapsed if self.elapsed else 0.0
+        lines.append(
+            f"offered {self.rps:g} rps ({self.arrivals}), completed {achieved:.2f}/s; "
+            f"max start lag {total.max_start_lag * 1000:.1f} ms (ms columns are "
+            "response time from the intended start; svc = from the actual start)"
+        )
+        return "\n".join(lines)
+
+
+async def run_load(
+    send,
+    *,
+    rps: float,
+    duration: float,
+    arrivals: str = "poisson",
+    window: float = 1.0,
+    max_in_flight: int = 10_000,
+    seed: int | None = None,
+) -> LoadReport:
+    """Offer `rps` requests per second for `duration` seconds.
+
+    Args:
+        send: async callable with no arguments that performs one request. It
+            may return a TTFT in seconds (see `ollama_sender`), which is then
+            recorded too; an exception counts as an error.
+        arrivals: "poisson" or "constant".
+        window: width of the reporting windows, in seconds.
+        max_in_flight: beyond this many outstanding requests new arrivals are
+            counted as dropped instead of sent (keeps a dead target from
+            exhausting memory); the schedule itself never slows down.
+    """
+    schedule = (
+        poisson_arrivals(rps, seed)
+        if arrivals == "poisson"
+        else ARRIVALS[arrivals](rps)
+    )
+    windows = [Window(i * window) for i in range(math.ceil(duration / window))]
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+
+    async def one(intended: float, w: Window) -> None:
+        actual = loop.time()
+        w.max_start_lag = max(w.max_start_lag, actual - intended)
+        try:
+            ttft = await send()
+        except Exception:
+            w.errors += 1
+            return
+        end = loop.time()
+        w.ok += 1
+        w.response.record(end - intended)
+        w.service.record(end - actual)
+        if ttft is not None:  # also measured from the intended start
+            w.ttft.record(ttft + (actual - intended))
+
+    started = loop.time()
+    for offset in schedule:
+        if offset >= duration:
+            break
+        intended = started + offset
+        delay = intended - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        w = windows[int(offset / window)]
+        if len(tasks) >= max_in_flight:
+            w.dropped += 1
+            continue
+        w.sent += 1
+        task = asyncio.create_task(one(intended, w))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+    return LoadReport(
+        rps, arrivals, duration, window, windows, elapsed=loop.time() - started
+    )
+
+
+def ollama_sender(client, model: str, prompt: str, *, stream: bool = True, **fields):
+    """A `send` callable for `run_load`: one generation per call, returning
+    the TTFT for streams."""
+
+    async def send():
+        if not stream:
+            await client.generate(model, prompt, **fields)
+            return None
+        async with client.stream(model, prompt, **fields) as tokens:
+            async for _ in tokens:
+                pass
+        return tokens.ttft
+
+    return send
+
+
+def _ms(seconds: float | None) -> str:
+    return f"{'-':>8}" if seconds is None else f"{seconds * 1000:>8.1f}"
+
+
+# ── Fake target ─────────────────────────────────────────────────────────────
+class FakeOllamaTransport(httpx.AsyncBaseTransport):
+    """In-process stand-in for an Ollama node, for offline load tests.
+
+    Serves /api/generate (streaming or not) with `slots` requests running at
+    once; the rest queue, as they would on a real node with
+    OLLAMA_NUM_PARALLEL=slots. Capacity is ``slots / (ttft + tokens /
+    tokens_per_s)`` requests per second.
+
+    Args:
+        slots: concurrent generations.
+        ttft: prompt-eval time before the first token, in seconds.
+        tokens: tokens generated per request.
+        tokens_per_s: decode speed per slot.
+    """
+
+    def __init__(
+        self,
+        slots: int = 1,
+        *,
+        ttft: float = 0.1,
+        tokens: int = 32,
+        tokens_per_s: float = 50.0,
+    ) -> None:
+        self.slots = slots
+        self.ttft = ttft
+        self.tokens = tokens
+        self.tokens_per_s = tokens_per_s
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def capacity_rps(self) -> float:
+        return self.slots / (self.ttft + self.tokens / self.tokens_per_s)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/api/generate":
+            return httpx.Response(404, json={"error": "not found"})
+        if self._semaphore is None:  # created on the loop that uses it
+            self._semaphore = asyncio.Semaphore(self.slots)
+        body = json.loads(await request.aread())
+        queued = time.monotonic()
+        await self._semaphore.acquire()
+        wait = time.monotonic() - queued
+        if body.get("stream", True):
+            return httpx.Response(200, stream=_FakeStream(self, body["model"], wait))
+        try:
+            await asyncio.sleep(self.ttft + self.tokens / self.tokens_per_s)
+        finally:
+            self._semaphore.release()
+        return httpx.Response(
+            200,
+            json={**self._final(body["model"], wait), "response": "x " * self.tokens},
+        )
+
+    def _final(self, model: str, wait: float) -> dict:
+        return {
+            "model": model,
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int(
+                (wait + self.ttft + self.tokens / self.tokens_per_s) * 1e9
+            ),
+            "prompt_eval_duration": int(self.ttft * 1e9),
+            "eval_count": self.tokens,
+            "eval_duration": int(self.tokens / self.tokens_per_s * 1e9),
+        }
+
+
+class _FakeStream(httpx.AsyncByteStream):
+    def __init__(self, fake: FakeOllamaTransport, model: str, wait: float) -> None:
+        self._fake = fake
+        self._model = model
+        self._wait = wait
+        self._released = False
+
+    async def __aiter__(self):
+        fake = self._fake
+        try:
+            await asyncio.sleep(fake.ttft)
+            for _ in range(fake.tokens):
+                yield (
+                    json.dumps(
+                        {"model": self._model, "response": "x ", "done": False}
+                    ).encode()
+                    + b"\n"
+                )
+                await asyncio.sleep(1 / fake.tokens_per_s)
+            yield json.dumps(fake._final(self._model, self._wait)).encode() + b"\n"
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        if not self._released:
+            self._released = True
+            self._fake._semaphore.release()
@@ -0,0 +1,205 @@
+# ── OpenAI-compatible chat completions over plain httpx ─────────────────────
+# The provider notebooks all call `client.chat.completions.create(...)` from
+# the OpenAI SDK without streaming. This client streams `/chat/completions`
+# for any OpenAI-compatible provider with `stream: true`, decodes the SSE
+# with `lib.streams.SSEDecoder`, and goes through the same RequestScheduler
+# and `TokenStream` interface as `AsyncOllamaClient`.
+#
+#   async with AsyncChatClient("groq") as client:
+#       async with client.stream(model, messages) as tokens:
+#           async for text in tokens:
+#               print(text, end="", flush=True)
+#       print(tokens.final["usage"])
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+import httpx
+
+from lib.client import DEFAULT_TIMEOUT, TokenStream, _until_preempted
+from lib.scheduler import Preempted, Priority, RequestScheduler
+from lib.streams import SSEDecoder
+
+
+@dataclass(frozen=True)
+class Provider:
+    base_url: str
+    api_key_env: str | None  # None: no key needed (local Ollama)
+    default_model: str
+    # Whether to ask for a usage block at the end of the stream. Providers
+    # that reject the unknown field, or always send usage anyway, say False.
+    stream_usage: bool = True
+
+
+# Endpoints, key variables and models as used in the *_interaction_examples
+# notebooks.
+PROVIDERS: dict[str, Provider] = {
+    "openai": Provider("https://api.openai.com/v1", "OPENAI_API_KEY", "gpt-4o-mini"),
+    "anthropic": Provider(
+        "https://api.anthropic.com/v1",
+        "ANTHROPIC_API_KEY",
+        "claude-opus-4-1",
+        stream_usage=False,
+    ),
+    "cohere": Provider(
+        "https://api.cohere.ai/compatibility/v1",
+        "COHERE_API_KEY",
+        "command-r",
+        stream_usage=False,
+    ),
+    "deepseek": Provider(
+        "https://api.deepseek.com/v1", "DEEPSEEK_API_KEY", "deepseek-chat"
+    ),
+    "gemini": Provider(
+        "https://generativelanguage.googleapis.com/v1beta/openai",
+        "GOOGLEAI_API_KEY",
+        "gemini-2.5-flash",
+    ),
+    "grok": Provider("https://api.x.ai/v1", "GROK_API_KEY", "grok-4"),
+    "groq": Provider(
+        "https://api.groq.com/openai/v1", "GROQ_API_KEY", "openai/gpt-oss-120b"
+    ),
+    "perplexity": Provider(
+        "https://api.perplexity.ai", "PERPLEXITY_API_KEY", "sonar", stream_usage=False
+    ),
+    "ollama": Provider("http://localhost:11434/v1", None, "llama3.2"),
+}
+
+
+class AsyncChatClient:
+    """Streaming chat-completions client for one OpenAI-compatible provider.
+
+    Args:
+        provider: a key of `PROVIDERS`, or a `Provider` for anything else.
+        api_key: overrides the provider's environment variable.
+        scheduler: shared `RequestScheduler`; one is created if omitted.
+        timeout / transport / profiler: as for `AsyncOllamaClient`.
+    """
+
+    def __init__(
+        self,
+        provider: str | Provider,
+        *,
+        api_key: str | None = None,
+        scheduler: RequestScheduler | None = None,
+        timeout: httpx.Timeout | None = DEFAULT_TIMEOUT,
+        transport: httpx.AsyncBaseTransport | None = None,
+        profiler=None,
+    ) -> None:
+        self.provider = PROVIDERS[provider] if isinstance(provider, str) else provider
+        self.profiler = profiler
+        if api_key is None and self.provider.api_key_env:
+            api_key = os.environ[self.provider.api_key_env]
+        headers = {"Accept": "text/event-stream"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        self.scheduler = scheduler or RequestScheduler()
+        self._http = httpx.AsyncClient(
+            base_url=self.provider.base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        model: str | None,
+        messages: list[dict],
+        *,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        **fields,
+    ):
+        """POST /chat/completions with `stream: true`; yields a `TokenStream`."""
+        payload = {
+            "model": model or self.provider.default_model,
+            "messages": messages,
+            "stream": True,
+            **fields,
+        }
+        if self.provider.stream_usage:
+            payload.setdefault("stream_options", {"include_usage": True})
+        cost = sum(len(m.get("content") or "") for m in messages)
+        probe = self.profiler.request() if self.profiler is not None else None
+        extensions = {"trace": probe.trace} if probe is not None else None
+        try:
+            async with self.scheduler.slot(tenant, priority, cost=cost) as lease:
+                started = time.monotonic()
+                if probe is not None:
+                    probe.mark("admitted")
+                async with self._http.stream(
+                    "POST", "/chat/completions", json=payload, extensions=extensions
+                ) as response:
+                    if probe is not None and "headers" not in probe.t:
+                        probe.mark("headers")  # transports without tracing
+                    if response.is_error:
+                        await response.aread()
+                        response.raise_for_status()
+                    yield TokenStream(
+                        response,
+                        lease,
+                        self.scheduler,
+                        started,
+                        decoder=SSEDecoder(),
+                        probe=probe,
+                    )
+        finally:
+            if probe is not None:
+                probe.finish()
+
+    async def stream_text(self, model, messages, **kwargs) -> tuple[str, dict]:
+        """Run a stream to completion, return (text, final record)."""
+        async with self.stream(model, messages, **kwargs) as tokens:
+            parts = [text async for text in tokens]
+        return "".join(parts), tokens.final
+
+    async def complete(
+        self,
+        model: str | None,
+        messages: list[dict],
+        *,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        **fields,
+    ) -> dict:
+        """Non-streaming POST /chat/completions; returns the JSON body."""
+        payload = {
+            "model": model or self.provider.default_model,
+            "messages": messages,
+            **fields,
+        }
+        cost = sum(len(m.get("content") or "") for m in messages)
+        probe = self.profiler.request() if self.profiler is not None else None
+        extensions = {"trace": probe.trace} if probe is not None else None
+        try:
+            while True:
+                async with self.scheduler.slot(tenant, priority, cost=cost) as lease:
+                    if probe is not None:
+                        probe.mark("admitted")
+                    try:
+                        response = await _until_preempted(
+                            self._http.post(
+                                "/chat/completions",
+                                json=payload,
+                                extensions=extensions,
+                            ),
+                            lease,
+                        )
+                    except Preempted:
+                        continue
+                response.raise_for_status()
+                return response.json()
+        finally:
+            if probe is not None:
+                probe.finish()
@@ -0,0 +1,174 @@
+# ── Process-pool post-processing stage ──────────────────────────────────────
+# After a response arrives, pipelines do CPU work: JSON extraction, HTML
+# cleanup of scraped context, tokenization, scoring. Run on the event loop,
+# that work stalls every other stream (one GIL, one core). A ProcessStage
+# runs registered handlers in a process pool instead:
+#
+#   async with ProcessStage("extract_json", workers=8) as stage:
+#       results = await run_batch(client, jobs, stage=stage)
+#
+#       async for parsed in stage.map(texts, ordered=False):
+#           ...
+#
+# Backpressure: at most `max_pending` items are inside the pool at once;
+# `submit()` waits (and so slows the producer) when the stage is full.
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+from collections import deque
+from collections.abc import AsyncIterable, Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+
+# ── Handler registry ────────────────────────────────────────────────────────
+# Handlers must be module-level functions so worker processes can import
+# them by reference. Register them by name to use them from the CLI or
+# configuration.
+HANDLERS: dict[str, Callable] = {}
+
+
+def register(name: str | None = None):
+    """Decorator: make a module-level function available as a stage handler."""
+
+    def decorator(func: Callable) -> Callable:
+        HANDLERS[name or func.__name__] = func
+        return func
+
+    return decorator
+
+
+def _text(item) -> str:
+    """Handlers accept a generation record (dict with "response") or a str."""
+    return item["response"] if isinstance(item, dict) else item
+
+
+_JSON_START = re.compile(r"[\[{]")
+
+
+@register()
+def extract_json(item):
+    """Parse the first JSON object/array in the text (models like to wrap
+    JSON in prose or ```json fences). Returns None if there is none."""
+    text = _text(item)
+    decoder = json.JSONDecoder()
+    for match in _JSON_START.finditer(text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            continue
+        return value
+    return None
+
+
+@register()
+def html_to_text(item) -> str:
+    """Strip markup from scraped HTML with BeautifulSoup, collapse whitespace."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(_text(item), "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    return " ".join(soup.get_text(" ").split())
+
+
+@register()
+def word_count(item) -> int:
+    return len(_text(item).split())
+
+
+def _run_chain(funcs: tuple[Callable, ...], item):
+    for func in funcs:
+        item = func(item)
+    return item
+
+
+# ── Stage ───────────────────────────────────────────────────────────────────
+class ProcessStage:
+    """Run a chain of CPU-bound handlers on a process pool.
+
+    Args:
+        *handlers: registered handler names or module-level functions,
+            applied in order inside the worker (one round trip per item).
+        workers: pool size, default `os.cpu_count()`.
+        max_pending: items allowed in the pool at once (default 2 × workers).
+        mp_context: multiprocessing start method; "spawn" avoids forking a
+            process that is running an event loop and threads.
+    """
+
+    def __init__(
+        self,
+        *handlers: str | Callable,
+        workers: int | None = None,
+        max_pending: int | None = None,
+        mp_context: str = "spawn",
+    ) -> None:
+        if not handlers:
+            raise ValueError("ProcessStage needs at least one handler")
+        self._funcs = tuple(HANDLERS[h] if isinstance(h, str) else h for h in handlers)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self._mp_context = mp_context
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    async def __aenter__(self):
+        self._pool = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context(self._mp_context)
+        )
+        self._slots = asyncio.Semaphore(self.max_pending)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pool, self._pool = self._pool, None
+        # Joining workers blocks, so do it off the event loop.
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+    async def submit(self, item):
+        """Process one item; waits for room when `max_pending` are in flight."""
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, _run_chain, self._funcs, item
+            )
+
+    async def map(self, items: Iterable | AsyncIterable, *, ordered: bool = True):
+        """Process a (possibly async) iterable; yield results in input order,
+        or as soon as each finishes with `ordered=False`."""
+        pending: deque[asyncio.Future] | set[asyncio.Future] = (
+            deque() if ordered else set()
+        )
+        try:
+            async for item in _aiter(items):
+                if len(pending) >= self.max_pending:
+                    async for result in _drain(
+                        pending, ordered, keep=self.max_pending - 1
+                    ):
+                        yield result
+                future = asyncio.ensure_future(self.submit(item))
+                pending.append(future) if ordered else pending.add(future)
+            async for result in _drain(pending, ordered, keep=0):
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+async def _aiter(items):
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _drain(pending, ordered: bool, keep: int):
+    """Yield finished results until at most `keep` futures remain."""
+    while len(pending) > keep:
+        if ordered:
+            yield await pending.popleft()
+        else:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                yield future.result()
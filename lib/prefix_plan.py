@@ -0,0 +1,173 @@
+# ── Prefix-aware batch planning ─────────────────────────────────────────────
+# Batch jobs often share a long system prompt or few-shot preamble. Ollama
+# keeps the KV cache of the last prompt per slot and only evaluates the part
+# of a new prompt after the longest common prefix — but only if the requests
+# that share a prefix land on the same slot one after another. Sent in
+# arbitrary order and interleaved across models, almost every request pays
+# for its whole preamble again.
+#
+# The planner:
+#   1) groups jobs by model (switching models evicts the cache anyway),
+#   2) sorts each group by (system, prompt) — in sorted order, neighbours
+#      share the longest prefixes, the same adjacency a trie walk gives,
+#   3) cuts each group into `slots` lanes at the weakest-sharing boundaries.
+# `run_planned` then runs each lane sequentially (one lane ≈ one server slot)
+# and measures the savings from Ollama's `prompt_eval_count`.
+#
+#   plan = plan_batch(jobs, slots=4)
+#   results, report = await run_planned(client, plan)
+#   print(report)   # prompt tokens evaluated vs. the cold estimate
+import asyncio
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from lib.scheduler import Priority
+
+
+@dataclass
+class Lane:
+    model: str
+    indexes: list[int] = field(default_factory=list)  # positions in `jobs`
+    shared_chars: list[int] = field(default_factory=list)  # LCP with predecessor
+
+
+@dataclass
+class BatchPlan:
+    jobs: list[dict]
+    lanes_by_model: dict[str, list[Lane]]
+
+    @property
+    def shared_fraction(self) -> float:
+        """Share of prompt characters covered by the predecessor's prefix."""
+        shared = total = 0
+        for lanes in self.lanes_by_model.values():
+            for lane in lanes:
+                shared += sum(lane.shared_chars)
+                total += sum(len(_cache_text(self.jobs[i])) for i in lane.indexes)
+        return shared / total if total else 0.0
+
+
+@dataclass
+class PrefixReport:
+    jobs: int
+    evaluated_tokens: int  # sum of prompt_eval_count
+    cold_estimate_tokens: int  # what the prompts would cost with no cache hits
+    prompt_eval_seconds: float
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.cold_estimate_tokens - self.evaluated_tokens)
+
+    @property
+    def saved_fraction(self) -> float:
+        if not self.cold_estimate_tokens:
+            return 0.0
+        return self.saved_tokens / self.cold_estimate_tokens
+
+    def __str__(self) -> str:
+        return (
+            f"{self.jobs} jobs: evaluated {self.evaluated_tokens:,} prompt tokens "
+            f"of ~{self.cold_estimate_tokens:,} cold "
+            f"({self.saved_fraction:.0%} saved, {self.prompt_eval_seconds:.1f}s prompt eval)"
+        )
+
+
+def plan_batch(jobs: list[dict], slots: int = 1) -> BatchPlan:
+    """Order `jobs` (dicts with ``model``, ``prompt``, optional ``system``)
+    for prefix reuse and split each model's jobs into up to `slots` lanes."""
+    jobs = list(jobs)
+    by_model: dict[str, list[int]] = defaultdict(list)
+    for i, job in enumerate(jobs):
+        by_model[job["model"]].append(i)
+
+    lanes_by_model = {}
+    for model, indexes in by_model.items():
+        indexes.sort(key=lambda i: _cache_text(jobs[i]))
+        texts = [_cache_text(jobs[i]) for i in indexes]
+        lcps = [0] + [_lcp(a, b) for a, b in zip(texts, texts[1:])]
+        lanes = []
+        for start, end in _cut(lcps, min(slots, len(indexes))):
+            lane = Lane(model, indexes[start:end], lcps[start:end])
+            lane.shared_chars[0] = 0  # a lane starts cold
+            lanes.append(lane)
+        lanes_by_model[model] = lanes
+    return BatchPlan(jobs, lanes_by_model)
+
+
+async def run_planned(
+    client,
+    plan: BatchPlan,
+    *,
+    tenant: str = "batch",
+    priority: Priority = Priority.BATCH,
+) -> tuple[list[dict], PrefixReport]:
+    """Run a plan: one model at a time, its lanes in parallel, each lane in
+    order. Returns results in the original job order plus a `PrefixReport`."""
+    results: list[dict | None] = [None] * len(plan.jobs)
+
+    async def run_lane(lane: Lane) -> None:
+        for i in lane.indexes:
+            job = dict(plan.jobs[i])
+            model, prompt = job.pop("model"), job.pop("prompt")
+            results[i] = await client.generate(
+                model, prompt, tenant=tenant, priority=priority, **job
+            )
+
+    for lanes in plan.lanes_by_model.values():
+        await asyncio.gather(*(run_lane(lane) for lane in lanes))
+    return results, prefix_report(plan, results)
+
+
+def prefix_report(plan: BatchPlan, results: list[dict]) -> PrefixReport:
+    """Compare Ollama's `prompt_eval_count` with a no-cache estimate.
+
+    Each lane's first request runs cold, so its tokens-per-character ratio
+    calibrates the estimate of what every prompt would cost uncached.
+    """
+    cold_tokens = cold_chars = 0
+    for lanes in plan.lanes_by_model.values():
+        for lane in lanes:
+            first = results[lane.indexes[0]] or {}
+            if first.get("prompt_eval_count"):
+                cold_tokens += first["prompt_eval_count"]
+                cold_chars += len(_cache_text(plan.jobs[lane.indexes[0]]))
+    ratio = cold_tokens / cold_chars if cold_chars else 0.0
+
+    evaluated = estimate = 0
+    seconds = 0.0
+    for job, result in zip(plan.jobs, results):
+        result = result or {}
+        evaluated += result.get("prompt_eval_count", 0)
+        seconds += result.get("prompt_eval_duration", 0) / 1e9
+        estimate += round(len(_cache_text(job)) * ratio)
+    return PrefixReport(len(plan.jobs), evaluated, estimate, seconds)
+
+
+# ── Helpers ─────────────────────────────────────────────────────────────────
+def _cache_text(job: dict) -> str:
+    """The text whose prefix the server can reuse: system prompt, then prompt."""
+    system = job.get("system")
+    return f"{system}\n{job['prompt']}" if system else job["prompt"]
+
+
+def _lcp(a: str, b: str) -> int:
+    return len(os.path.commonprefix((a, b)))
+
+
+def _cut(lcps: list[int], lanes: int) -> list[tuple[int, int]]:
+    """Split range(len(lcps)) into `lanes` contiguous, roughly equal runs,
+    nudging each cut to the boundary with the smallest shared prefix."""
+    n = len(lcps)
+    if lanes <= 1:
+        return [(0, n)]
+    bounds = [0]
+    for k in range(1, lanes):
+        target = round(k * n / lanes)
+        window = max(1, n // (4 * lanes))
+        lo = max(bounds[-1] + 1, target - window)
+        hi = min(n - (lanes - k), target + window)
+        lo = min(lo, hi)
+        bounds.append(min(range(lo, hi + 1), key=lambda i: (lcps[i], abs(i - target))))
+    bounds.append(n)
+    return list(zip(bounds, bounds[1:]))
@@ -0,0 +1,398 @@
+# ── Profiling hooks for the shared client ───────────────────────────────────
+# When a batch is slow, where does the time go: client CPU (json.loads,
+# print), event-loop stalls, the scheduler queue, or the server? Attach a
+# Profiler to the client and every request is split into phases:
+#
+#   queue    waiting for a scheduler slot
+#   connect  TCP/TLS connect (0 on a reused keep-alive connection)
+#   send     writing the request
+#   server   request sent → response headers
+#   ttft     response headers → first token
+#   decode   first → last token, minus the time the consumer held the stream
+#   sink     time spent in the consumer between tokens (printing, writing)
+#
+#   profiler = Profiler(capture_over=5.0, capture="stacks")
+#   async with profiler, AsyncOllamaClient(profiler=profiler) as client:
+#       ...
+#   print(profiler.table())
+#   profiler.export_collapsed("profiles/slow.collapsed")   # flamegraph.pl/speedscope
+#
+# `AsyncChatClient(profiler=...)` takes the same profiler.
+#
+# While running, the profiler also
+#   - samples event-loop lag (a sleeper that measures how late it wakes up),
+#   - counts slow callbacks: any loop callback over `slow_callback` seconds,
+#     with what it was (the thing blocking the loop). This uses asyncio's
+#     own debug mode on the profiled loop only (`loop.set_debug`,
+#     `slow_callback_duration`), which has its own overhead; asyncio logs
+#     each one as a warning,
+#   - captures a profile of sampled requests with cProfile, tracemalloc or a
+#     stack sampler, keeping it only if the request took longer than
+#     `capture_over` seconds. A capture covers everything the loop thread
+#     does (tracemalloc: the whole process) while the sampled request is in
+#     flight, so concurrent requests show up in it too; run with a
+#     concurrency of 1 to see one request alone.
+#
+# With no profiler attached, the client's hot path costs one `is None` check
+# per request and per token.
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from lib.loadgen import LogHistogram
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("queue", "connect", "send", "server", "ttft", "decode", "sink")
+
+
+class RequestProbe:
+    """Timestamps of one request; created by `Profiler.request`."""
+
+    __slots__ = ("_profiler", "_capture", "t", "sink", "_yielded", "_tokens")
+
+    def __init__(self, profiler: "Profiler", capture) -> None:
+        self._profiler = profiler
+        self._capture = capture
+        self.t = {"start": time.perf_counter()}
+        self.sink = 0.0
+        self._yielded = None
+        self._tokens = 0
+
+    def mark(self, event: str) -> None:
+        self.t[event] = time.perf_counter()
+
+    async def trace(self, event: str, info: dict) -> None:
+        """httpx/httpcore ``trace`` extension callback."""
+        if event == "connection.connect_tcp.started":
+            self.t["connect_start"] = time.perf_counter()
+        elif event in (
+            "connection.connect_tcp.complete",
+            "connection.start_tls.complete",
+        ):
+            self.t["connected"] = time.perf_counter()
+        elif event.endswith("send_request_body.complete"):
+            self.t["sent"] = time.perf_counter()
+        elif event.endswith("receive_response_headers.complete"):
+            self.t["headers"] = time.perf_counter()
+
+    # Called from TokenStream around each `yield`.
+    def token(self) -> None:
+        now = time.perf_counter()
+        if self._tokens == 0:
+            self.t["first_token"] = now
+        self._tokens += 1
+        self._yielded = now
+
+    def resumed(self) -> None:
+        self.sink += time.perf_counter() - self._yielded
+
+    def finish(self) -> None:
+        t = self.t
+        t["end"] = end = time.perf_counter()
+        if self._tokens:
+            t["last_token"] = self._yielded
+        self._profiler._finish(self, end - t["start"])
+
+    def phases(self) -> dict[str, float]:
+        t = self.t
+        admitted = t.get("admitted", t["start"])
+        connect = t["connected"] - t["connect_start"] if "connected" in t else 0.0
+        sent = t.get("sent", admitted + connect)
+        headers = t.get("headers", sent)
+        out = {
+            "queue": admitted - t["start"],
+            "connect": connect,
+            "send": max(0.0, sent - admitted - connect),
+            "server": max(0.0, headers - sent),
+        }
+        if "first_token" in t:
+            out["ttft"] = t["first_token"] - headers
+            out["decode"] = max(0.0, t["last_token"] - t["first_token"] - self.sink)
+            out["sink"] = self.sink
+        return out
+
+
+class Profiler:
+    """Opt-in request/loop profiler for `AsyncOllamaClient(profiler=...)` and
+    `AsyncChatClient(profiler=...)`.
+
+    Args:
+        lag_interval: how often the loop-lag sleeper wakes (seconds).
+        slow_callback: count loop callbacks that run longer than this
+            (seconds); None leaves the loop's debug mode alone.
+        capture_over: keep a capture when a request takes longer than this
+            (seconds); None disables captures.
+        capture: "stacks" (sampling, flamegraph output), "cprofile" (.pstats)
+            or "tracemalloc" (top allocation sites).
+        sample_rate: fraction of requests that are captured (one at a time).
+        out_dir: where captures are written.
+        stack_interval: sampling period of the stack sampler (seconds).
+    """
+
+    def __init__(
+        self,
+        *,
+        lag_interval: float = 0.05,
+        slow_callback: float | None = 0.05,
+        capture_over: float | None = None,
+        capture: str = "stacks",
+        sample_rate: float = 0.1,
+        out_dir: str = "profiles",
+        stack_interval: float = 0.005,
+    ) -> None:
+        if capture not in ("stacks", "cprofile", "tracemalloc"):
+            raise ValueError(f"unknown capture {capture!r}")
+        self.lag_interval = lag_interval
+        self.slow_callback = slow_callback
+        self.capture_over = capture_over
+        self.capture = capture
+        self.sample_rate = sample_rate
+        self.out_dir = out_dir
+        self.stack_interval = stack_interval
+
+        self.phases = {name: LogHistogram() for name in (*PHASES, "total")}
+        self.loop_lag = LogHistogram()
+        self.slow_callbacks: Counter = Counter()  # description → count
+        self.stacks: Counter = Counter()  # collapsed stack → samples (kept)
+        self.captures: list[str] = []  # files written
+        self._capturing = False
+        self._lag_task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._saved_debug: tuple[bool, float] | None = None
+        self._log_filter: _SlowCallbackFilter | None = None
+
+    # ── Lifecycle ───────────────────────────────────────────────────────────
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def start(self) -> None:
+        """Start the loop-lag monitor and the slow-callback timer (call from
+        inside the running loop)."""
+        loop = self._loop = asyncio.get_running_loop()
+        self._lag_task = loop.create_task(self._watch_lag())
+        if self.slow_callback is not None:
+            self._time_callbacks(loop)
+
+    async def stop(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._log_filter is not None:
+            logging.getLogger("asyncio").removeFilter(self._log_filter)
+            self._log_filter = None
+        if self._saved_debug is not None:
+            loop, (debug, duration) = self._loop, self._saved_debug
+            self._saved_debug = None
+            # Only undo our own settings: a profiler started after this one
+            # (and still running) may have changed them since.
+            if loop.slow_callback_duration == self.slow_callback:
+                loop.slow_callback_duration = duration
+                loop.set_debug(debug)
+
+    async def _watch_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag.record(max(0.0, loop.time() - expected))
+
+    def _time_callbacks(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Have this loop time its callbacks (asyncio debug mode) and count
+        the "Executing ... took" warnings it logs from this thread."""
+        self._saved_debug = (loop.get_debug(), loop.slow_callback_duration)
+        loop.slow_callback_duration = self.slow_callback
+        loop.set_debug(True)
+        self._log_filter = _SlowCallbackFilter(self.slow_callbacks)
+        logging.getLogger("asyncio").addFilter(self._log_filter)
+
+    # ── Requests ────────────────────────────────────────────────────────────
+    def request(self) -> RequestProbe:
+        capture = None
+        if (
+            self.capture_over is not None
+            and not self._capturing
+            and random.random() < self.sample_rate
+        ):
+            self._capturing = True
+            capture = _CAPTURES[self.capture](self.stack_interval)
+        return RequestProbe(self, capture)
+
+    def _finish(self, probe: RequestProbe, total: float) -> None:
+        for name, seconds in probe.phases().items():
+            self.phases[name].record(seconds)
+        self.phases["total"].record(total)
+        if probe._capture is None:
+            return
+        result = probe._capture.stop()
+        self._capturing = False
+        if total < self.capture_over:
+            return
+        if self.capture == "stacks":
+            self.stacks.update(result)
+        path = self._capture_path(total)
+        probe._capture.save(result, path)
+        self.captures.append(path)
+        logger.warning("request took %.2fs; capture saved to %s", total, path)
+
+    def _capture_path(self, total: float) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        ext = {"stacks": "collapsed", "cprofile": "pstats", "tracemalloc": "txt"}
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        name = f"{self.capture}-{stamp}-{len(self.captures)}-{total:.1f}s.{ext[self.capture]}"
+        return os.path.join(self.out_dir, name)
+
+    # ── Output ──────────────────────────────────────────────────────────────
+    def report(self) -> dict:
+        return {
+            "phases": {name: h.summary() for name, h in self.phases.items()},
+            "loop_lag": self.loop_lag.summary(),
+            "slow_callbacks": dict(self.slow_callbacks.most_common(20)),
+            "captures": list(self.captures),
+        }
+
+    def table(self) -> str:
+        lines = [
+            f"{'phase':<8} {'count':>6} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}"
+        ]
+        for name, h in [*self.phases.items(), ("loop lag", self.loop_lag)]:
+            if h.count:
+                lines.append(
+                    f"{name:<8} {h.count:>6} {h.mean * 1000:>9.1f} "
+                    f"{h.percentile(50) * 1000:>9.1f} {h.percentile(99) * 1000:>9.1f}"
+                )
+        for what, n in self.slow_callbacks.most_common(5):
+            lines.append(f"slow callback x{n}: {what}")
+        return "\n".join(lines)
+
+    def export_collapsed(self, path: str) -> None:
+        """Write every kept stack sample in collapsed format ("a;b;c N"), the
+        input of flamegraph.pl, speedscope and inferno."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _write_collapsed(self.stacks, path)
+
+
+# ── Captures ────────────────────────────────────────────────────────────────
+class _StackCapture:
+    """Sample the loop thread's Python stack from a helper thread."""
+
+    def __init__(self, interval: float) -> None:
+        self._target = threading.get_ident()
+        self._interval = interval
+        self._samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                frame = frame.f_back
+            if stack:
+                self._samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self._samples
+
+    @staticmethod
+    def save(samples: Counter, path: str) -> None:
+        _write_collapsed(samples, path)
+
+
+class _CProfileCapture:
+    def __init__(self, interval: float) -> None:
+        import cProfile
+
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        return self._profile
+
+    @staticmethod
+    def save(profile, path: str) -> None:
+        profile.dump_stats(path)  # open with pstats or snakeviz
+
+
+class _TracemallocCapture:
+    def __init__(self, interval: float) -> None:
+        import tracemalloc
+
+        self._tracemalloc = tracemalloc
+        self._started_here = not tracemalloc.is_tracing()
+        if self._started_here:
+            tracemalloc.start(25)
+        self._before = tracemalloc.take_snapshot()
+
+    def stop(self):
+        after = self._tracemalloc.take_snapshot()
+        if self._started_here:
+            self._tracemalloc.stop()
+        return after.compare_to(self._before, "traceback")
+
+    @staticmethod
+    def save(diff, path: str) -> None:
+        with open(path, "w") as f:
+            for stat in diff[:25]:
+                f.write(f"{stat}\n")
+                f.writelines(f"    {line}\n" for line in stat.traceback.format())
+
+
+_CAPTURES = {
+    "stacks": _StackCapture,
+    "cprofile": _CProfileCapture,
+    "tracemalloc": _TracemallocCapture,
+}
+
+
+def _write_collapsed(samples: Counter, path: str) -> None:
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class _SlowCallbackFilter(logging.Filter):
+    """Counts asyncio's slow-callback warnings from the creating thread."""
+
+    def __init__(self, counter: Counter) -> None:
+        super().__init__()
+        self._counter = counter
+        self._thread = threading.get_ident()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            record.thread == self._thread
+            and record.msg.startswith("Executing ")
+            and record.args
+        ):
+            self._counter[_describe(str(record.args[0]))] += 1
+        return True
+
+
+_CORO = re.compile(r"coro=<(\S+?)\(\) (?:running at|done, defined at) ([^>]+)>")
+
+
+def _describe(handle: str) -> str:
+    """Shorten asyncio's handle repr to "task name (file:line)"."""
+    match = _CORO.search(handle)
+    if match is None:
+        return handle[:200]
+    name, where = match.groups()
+    return f"task {name} ({os.path.basename(where)})"
@@ -0,0 +1,329 @@
+# ── Hybrid retrieval: BM25 + dense vectors, fused with RRF ──────────────────
+# Dense embeddings find paraphrases but miss exact identifiers ("num_ctx",
+# "gpt-4o-mini", an error code), while BM25 finds exact identifiers but
+# misses paraphrases. This index keeps both over the same documents and merges
+# the two rankings with reciprocal-rank fusion (RRF), all in-process, so a
+# query costs a few array operations rather than a round trip to a vector
+# store:
+#
+#   index = HybridIndex(embed=OllamaEmbedder())      # embed=None: BM25 only
+#   await index.add(texts, metas)                    # incremental
+#   hits = await index.search("what does num_ctx do?", k=5)
+#   prompt = context_prompt(question, hits)          # then ws_minify(prompt)
+#   index.save("indexes/docs"); HybridIndex.load("indexes/docs", embed=...)
+#
+# Postings are compact typed arrays per term (doc ids in insertion order,
+# term frequencies alongside), scored with NumPy. Vectors are a
+# unit-normalised float32 matrix that grows by doubling. On disk an index is
+# a single index.npz: postings in CSR form, the vectors, and the vocabulary
+# and documents as JSON bytes. It is written to a temp file and renamed, so a
+# crash mid-save leaves the previous index whole.
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Identifiers stay whole ("gpt-4o-mini", "lib.client", "num_ctx"); their
+# parts are indexed too, so "gpt" or "client" also match.
+_TOKEN = re.compile(r"\w+(?:[.\-/:]\w+)*")
+_SPLIT = re.compile(r"[.\-/:]")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if len(token) > 2 and _SPLIT.search(token):
+            tokens.extend(part for part in _SPLIT.split(token) if part)
+    return tokens
+
+
+@dataclass
+class Hit:
+    doc_id: int
+    score: float  # fused RRF score (or the single ranking's score)
+    text: str
+    meta: dict = field(default_factory=dict)
+    lexical_rank: int | None = None  # 1-based rank in BM25, if ranked
+    dense_rank: int | None = None  # 1-based rank by cosine, if ranked
+
+
+class HybridIndex:
+    """In-memory BM25 + dense index with reciprocal-rank fusion.
+
+    Args:
+        embed: async callable, list of texts → (n, dim) array (e.g.
+            `lib.semantic_cache.OllamaEmbedder`); None for lexical only.
+        k1, b: BM25 parameters.
+    """
+
+    def __init__(self, embed=None, *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.embed = embed
+        self.k1 = k1
+        self.b = b
+        self.texts: list[str] = []
+        self.metas: list[dict] = []
+        self._vocab: dict[str, int] = {}
+        self._post_ids: list[array] = []  # term id → array('I') of doc ids
+        self._post_tfs: list[array] = []  # term id → array('I') of tf
+        self._doc_len = array("I")
+        self._total_len = 0
+        self._vectors: np.ndarray | None = None  # capacity × dim
+        self._n_vectors = 0
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    # ── Adding ──────────────────────────────────────────────────────────────
+    async def add(self, texts: list[str], metas: list[dict] | None = None) -> range:
+        """Index `texts` (embedding them in one call); return their doc ids."""
+        texts = list(texts)
+        vectors = None
+        if self.embed is not None and texts:
+            vectors = np.asarray(await self.embed(texts), dtype=np.float32)
+        return self.add_embedded(texts, vectors, metas)
+
+    def add_embedded(
+        self,
+        texts: list[str],
+        vectors: np.ndarray | None = None,
+        metas: list[dict] | None = None,
+    ) -> range:
+        """Index `texts` with precomputed `vectors` (or none: lexical only)."""
+        start = len(self.texts)
+        for offset, text in enumerate(texts):
+            doc_id = start + offset
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                term_id = self._vocab.get(term)
+                if term_id is None:
+                    term_id = self._vocab[term] = len(self._post_ids)
+                    self._post_ids.append(array("I"))
+                    self._post_tfs.append(array("I"))
+                self._post_ids[term_id].append(doc_id)
+                self._post_tfs[term_id].append(tf)
+            length = sum(counts.values())
+            self._doc_len.append(length)
+            self._total_len += length
+        self.texts.extend(texts)
+        self.metas.extend(metas or [{} for _ in texts])
+        if vectors is not None:
+            self._append_vectors(vectors)
+        return range(start, len(self.texts))
+
+    def _append_vectors(self, vectors: np.ndarray) -> None:
+        if self._n_vectors != len(self.texts) - len(vectors):
+            raise ValueError("every document needs a vector once any has one")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        needed = self._n_vectors + len(vectors)
+        if self._vectors is None or needed > len(self._vectors):
+            grown = np.zeros(
+                (max(needed, 2 * self._n_vectors, 64), vectors.shape[1]), np.float32
+            )
+            if self._vectors is not None:
+                grown[: self._n_vectors] = self._vectors[: self._n_vectors]
+            self._vectors = grown
+        self._vectors[self._n_vectors : needed] = vectors
+        self._n_vectors = needed
+
+    # ── Searching ───────────────────────────────────────────────────────────
+    def lexical_scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for `query`."""
+        n = len(self.texts)
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        doc_len = np.frombuffer(self._doc_len, dtype=np.uint32).astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / (self._total_len / n))
+        for term in set(tokenize(query)):
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                continue
+            ids = np.frombuffer(self._post_ids[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint32).astype(
+                np.float32
+            )
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm[ids])
+        return scores
+
+    def dense_scores(self, vector) -> np.ndarray:
+        """Cosine similarity of every document to a query vector."""
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        return self._vectors[: self._n_vectors] @ vector
+
+    async def search(
+        self,
+        query: str,
+        k: int = 5,
+        *,
+        mode: str = "hybrid",
+        candidates: int = 50,
+        rrf_k: int = 60,
+    ) -> list[Hit]:
+        """Top `k` documents for `query`.
+
+        Args:
+            mode: "hybrid" (RRF of both rankings), "lexical" or "dense".
+            candidates: how deep each ranking goes into the fusion.
+            rrf_k: RRF damping constant; 60 is the usual choice.
+        """
+        vector = None
+        if mode != "lexical" and self.embed is not None and self._n_vectors:
+            vector = (await self.embed([query]))[0]
+        return self.search_embedded(
+            query, vector, k, mode=mode, candidates=candidates, rrf_k=rrf_k
+        )
+
+    def search_embedded(
+        self,
+        query: str,
+        vector=None,
+        k: int = 5,
+        *,
+        mode: str = "hybrid",
+        candidates: int = 50,
+        rrf_k: int = 60,
+    ) -> list[Hit]:
+        """`search` with a precomputed query vector (None: lexical only)."""
+        if mode not in ("hybrid", "lexical", "dense"):
+            raise ValueError(f"unknown mode {mode!r}")
+        rankings = {}
+        if mode in ("hybrid", "lexical"):
+            scores = self.lexical_scores(query)
+            rankings["lexical"] = _top(scores, candidates, positive=True)
+        if mode in ("hybrid", "dense") and vector is not None:
+            rankings["dense"] = _top(self.dense_scores(vector), candidates)
+
+        if len(rankings) == 1:  # no fusion: keep the ranking's own scores
+            ((name, (ids, scores)),) = rankings.items()
+            return [
+                self._hit(int(i), float(s), **{f"{name}_rank": r})
+                for r, (i, s) in enumerate(zip(ids[:k], scores[:k]), 1)
+            ]
+        fused: dict[int, float] = {}
+        ranks: dict[int, dict] = {}
+        for name, (ids, _) in rankings.items():
+            for rank, doc_id in enumerate(ids.tolist(), 1):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+                ranks.setdefault(doc_id, {})[f"{name}_rank"] = rank
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [self._hit(doc_id, score, **ranks[doc_id]) for doc_id, score in best]
+
+    def _hit(self, doc_id: int, score: float, **ranks) -> Hit:
+        return Hit(doc_id, score, self.texts[doc_id], self.metas[doc_id], **ranks)
+
+    # ── Persistence ─────────────────────────────────────────────────────────
+    def save(self, directory: str) -> None:
+        """Write the index to `directory`/index.npz in one atomic replace."""
+        os.makedirs(directory, exist_ok=True)
+        lengths = [len(ids) for ids in self._post_ids]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        arrays = {
+            "offsets": offsets,
+            "ids": _concat(self._post_ids),
+            "tfs": _concat(self._post_tfs),
+            "doc_len": np.frombuffer(self._doc_len, dtype=np.uint32),
+            "params": np.array([self.k1, self.b]),
+            "vocab": _bytes_array(json.dumps(list(self._vocab)).encode()),
+            "docs": _bytes_array(
+                b"".join(
+                    json.dumps({"text": t, "meta": m}, ensure_ascii=False).encode()
+                    + b"\n"
+                    for t, m in zip(self.texts, self.metas)
+                )
+            ),
+        }
+        if self._vectors is not None:
+            arrays["vectors"] = self._vectors[: self._n_vectors]
+        _write_atomic(
+            os.path.join(directory, "index.npz"), lambda f: np.savez(f, **arrays)
+        )
+
+    @classmethod
+    def load(cls, directory: str, embed=None) -> "HybridIndex":
+        """Read an index written by `save`; it stays open for `add`."""
+        with np.load(os.path.join(directory, "index.npz")) as data:
+            arrays = {name: data[name] for name in data.files}
+        k1, b = arrays["params"].tolist()
+        index = cls(embed, k1=k1, b=b)
+        terms = json.loads(arrays["vocab"].tobytes())
+        for line in arrays["docs"].tobytes().splitlines():
+            doc = json.loads(line)
+            index.texts.append(doc["text"])
+            index.metas.append(doc["meta"])
+        offsets, ids, tfs = arrays["offsets"], arrays["ids"], arrays["tfs"]
+        index._vocab = {term: i for i, term in enumerate(terms)}
+        for i in range(len(terms)):
+            lo, hi = offsets[i], offsets[i + 1]
+            index._post_ids.append(array("I", ids[lo:hi].tobytes()))
+            index._post_tfs.append(array("I", tfs[lo:hi].tobytes()))
+        index._doc_len = array("I", arrays["doc_len"].tobytes())
+        index._total_len = int(arrays["doc_len"].sum())
+        if "vectors" in arrays:
+            index._vectors = np.ascontiguousarray(arrays["vectors"], dtype=np.float32)
+            index._n_vectors = len(index._vectors)
+        return index
+
+
+# ── Prompt assembly ─────────────────────────────────────────────────────────
+def context_prompt(
+    question: str,
+    hits: list[Hit],
+    *,
+    max_chars: int = 6000,
+    template: str = (
+        "Answer using only the context below. Cite sources as [n].\n\n"
+        "Context:\n{context}\n\nQuestion: {question}"
+    ),
+) -> str:
+    """Fill `template` with numbered hits, best first, up to `max_chars` of
+    context. Whitespace is left alone; run the result through ws_minify."""
+    parts, used = [], 0
+    for n, hit in enumerate(hits, 1):
+        source = hit.meta.get("source")
+        block = f"[{n}]{f' ({source})' if source else ''} {hit.text}"
+        if used + len(block) > max_chars and parts:
+            break
+        parts.append(block[: max_chars - used])
+        used += len(parts[-1])
+    return template.format(context="\n\n".join(parts), question=question)
+
+
+def _top(scores: np.ndarray, n: int, positive: bool = False):
+    """(ids, scores) of the `n` highest scores, best first."""
+    if positive:
+        candidates = np.flatnonzero(scores > 0)
+        scores_c = scores[candidates]
+    else:
+        candidates, scores_c = np.arange(len(scores)), scores
+    if len(candidates) > n:
+        part = np.argpartition(-scores_c, n)[:n]
+        candidates, scores_c = candidates[part], scores_c[part]
+    order = np.argsort(-scores_c, kind="stable")
+    return candidates[order], scores_c[order]
+
+
+def _concat(arrays: list[array]) -> np.ndarray:
+    if not arrays:
+        return np.zeros(0, dtype=np.uint32)
+    return np.frombuffer(b"".join(a.tobytes() for a in arrays), dtype=np.uint32)
+
+
+def _bytes_array(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
@@ -0,0 +1,553 @@
+# ── Cost- and latency-aware backend router ──────────────────────────────────
+# The provider notebooks hard-code their target (`current_model = "sonar"`,
+# "grok-4", a random Ollama model). Router keeps rolling stats for several
+# backends and picks one for each request according to a policy:
+#
+#   local = Backend("local", AsyncChatClient("ollama"), "llama3.2", local=True)
+#   groq = Backend("groq", AsyncChatClient("groq"), price_in=0.15, price_out=0.75)
+#   mini = Backend("openai", AsyncChatClient("openai"), price_in=0.15, price_out=0.6)
+#   router = Router([local, groq, mini], policy=LocalFirst(max_queue=4, slo=2.0))
+#
+#   body = await router.complete(messages)          # body["backend"] == "local"
+#   async with router.stream(messages) as tokens:   # tokens.backend, too
+#       async for text in tokens: ...
+#   router.stats()                                  # {name: ttft_p95, ...}
+#
+# A backend is any client with the `AsyncChatClient` interface; local Ollama
+# goes through its OpenAI-compatible endpoint (PROVIDERS["ollama"]). Prices
+# are USD per million tokens, taken from each provider's price page.
+#
+# Per backend the router tracks, over the last `window` seconds: percentiles
+# of time to first token (streams) and of whole-request latency (streams and
+# `complete`) in separate windows, error and overload rates, output tokens/s
+# and the requests it has in flight. Latency targets are checked against the
+# window that matches the request: TTFT for `stream`, total latency for
+# `complete`.
+# Overload replies (429/503/529) and refused connections put a backend in
+# cooldown; the request moves on to the next-ranked backend. `pick` only
+# reads cached numbers (percentiles are re-sorted at most every `refresh`
+# seconds), so a decision costs a few microseconds. A backend whose samples
+# have all aged out counts as unknown and is tried again — that is how a
+# backend avoided for being slow gets re-measured.
+import math
+import time
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+
+import httpx
+
+from lib.scheduler import Priority
+
+OVERLOAD_STATUS = frozenset({429, 503, 529})
+METRICS = ("ttft", "latency")
+
+
+class NoBackendAvailable(RuntimeError):
+    """Every backend tried for a request failed over."""
+
+
+class BackendStats:
+    """Rolling per-backend statistics.
+
+    Args:
+        window: seconds of history that count.
+        samples: at most this many recent requests are kept.
+        refresh: seconds between recomputations of the derived numbers.
+    """
+
+    __slots__ = (
+        "window",
+        "refresh",
+        "_ttft",
+        "_latency",
+        "_outcomes",
+        "_dirty",
+        "_next",
+        "ttft_p50",
+        "ttft_p95",
+        "latency_p50",
+        "latency_p95",
+        "error_rate",
+        "overload_rate",
+        "tokens_per_s",
+        "output_tokens",
+        "in_flight",
+        "requests",
+    )
+
+    def __init__(
+        self, window: float = 60.0, samples: int = 512, refresh: float = 0.05
+    ) -> None:
+        self.window = window
+        self.refresh = refresh
+        self._ttft: deque = deque(maxlen=samples)  # (t, seconds), streams only
+        self._latency: deque = deque(maxlen=samples)  # (t, seconds)
+        self._outcomes: deque = deque(maxlen=samples)  # (t, 0 ok/1 error/2 overload)
+        self._dirty = False
+        self._next = 0.0
+        self.ttft_p50: float | None = None
+        self.ttft_p95: float | None = None
+        self.latency_p50: float | None = None
+        self.latency_p95: float | None = None
+        self.error_rate = 0.0
+        self.overload_rate = 0.0
+        self.tokens_per_s: float | None = None  # EWMA
+        self.output_tokens: float | None = None  # EWMA, for cost estimates
+        self.in_flight = 0
+        self.requests = 0  # in the window
+
+    def observe(
+        self,
+        now: float,
+        latency: float,
+        output_tokens: int | None = None,
+        tokens_per_s: float | None = None,
+        *,
+        ttft: float | None = None,
+    ) -> None:
+        """Record a success: whole-request `latency` and, for a stream, its
+        `ttft` (both in seconds)."""
+        self._latency.append((now, latency))
+        if ttft is not None:
+            self._ttft.append((now, ttft))
+        self._outcomes.append((now, 0))
+        if output_tokens:
+            self.output_tokens = _ewma(self.output_tokens, output_tokens)
+        if tokens_per_s:
+            self.tokens_per_s = _ewma(self.tokens_per_s, tokens_per_s)
+        self._dirty = True
+
+    def fail(self, now: float, overloaded: bool = False) -> None:
+        self._outcomes.append((now, 2 if overloaded else 1))
+        self._dirty = True
+
+    def update(self, now: float) -> None:
+        """Recompute percentiles and rates if anything changed or expired
+        (and the last recomputation is at least `refresh` seconds old)."""
+        if now < self._next:
+            return
+        horizon = now - self.window
+        windows = (self._ttft, self._latency, self._outcomes)
+        expired = any(w and w[0][0] < horizon for w in windows)
+        if not (self._dirty or expired):
+            return
+        for w in windows:
+            while w and w[0][0] < horizon:
+                w.popleft()
+        values = sorted(v for _, v in self._ttft)
+        self.ttft_p50 = _percentile(values, 50)
+        self.ttft_p95 = _percentile(values, 95)
+        values = sorted(v for _, v in self._latency)
+        self.latency_p50 = _percentile(values, 50)
+        self.latency_p95 = _percentile(values, 95)
+        outcomes = self._outcomes
+        n = len(outcomes)
+        errors = sum(1 for _, kind in outcomes if kind)
+        overloads = sum(1 for _, kind in outcomes if kind == 2)
+        self.error_rate = errors / n if n else 0.0
+        self.overload_rate = overloads / n if n else 0.0
+        self.requests = n
+        self._dirty = False
+        self._next = now + self.refresh
+
+    def p95(self, metric: str) -> float | None:
+        """p95 of "ttft" or "latency"; None without samples."""
+        return self.ttft_p95 if metric == "ttft" else self.latency_p95
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "ttft_p50": self.ttft_p50,
+            "ttft_p95": self.ttft_p95,
+            "latency_p50": self.latency_p50,
+            "latency_p95": self.latency_p95,
+            "error_rate": self.error_rate,
+            "overload_rate": self.overload_rate,
+            "tokens_per_s": self.tokens_per_s,
+        }
+
+
+def _ewma(old: float | None, value: float, alpha: float = 0.2) -> float:
+    return value if old is None else (1 - alpha) * old + alpha * value
+
+
+def _percentile(values: list[float], p: float) -> float | None:
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return None
+    return values[max(1, math.ceil(p / 100 * len(values))) - 1]
+
+
+@dataclass(eq=False)
+class Backend:
+    """One routable target: a client plus the model to ask for.
+
+    Args:
+        name: label in stats and in the `backend` key of results.
+        client: `AsyncChatClient` (or anything with its `complete`/`stream`).
+        model: None uses the provider's default model.
+        local: counts as local for `LocalFirst`.
+        price_in / price_out: USD per million input / output tokens.
+        capacity: requests before further ones count as queued; defaults to
+            the client scheduler's `max_concurrency`.
+        stats: `BackendStats`, e.g. to change the window.
+    """
+
+    name: str
+    client: object
+    model: str | None = None
+    local: bool = False
+    price_in: float = 0.0
+    price_out: float = 0.0
+    capacity: int | None = None
+    stats: BackendStats = field(default_factory=BackendStats)
+    cooldown_until: float = field(default=0.0, init=False)
+
+    def __post_init__(self) -> None:
+        if self.capacity is None:
+            scheduler = getattr(self.client, "scheduler", None)
+            self.capacity = scheduler.max_concurrency if scheduler else 1
+
+    @property
+    def queued(self) -> int:
+        """Router requests waiting beyond the backend's capacity."""
+        return max(0, self.stats.in_flight - self.capacity)
+
+    def cost(self, input_tokens: float, output_tokens: float) -> float:
+        """Estimated USD for one request."""
+        return (input_tokens * self.price_in + output_tokens * self.price_out) / 1e6
+
+
+# ── Policies ────────────────────────────────────────────────────────────────
+# A policy ranks the backends for one request; the router tries them in that
+# order. `metric` names the latency window that matters for the request
+# ("ttft" for streams, "latency" for `complete`). Backends in cooldown, or
+# with an error rate above `max_error_rate` (once `min_samples` outcomes are
+# in), go last, soonest-available first.
+class Policy:
+    """Base policy: health filtering plus cost estimates.
+
+    Args:
+        max_error_rate: above this a backend counts as unhealthy.
+        min_samples: outcomes needed before the error rate is trusted.
+        expected_output: output tokens assumed until a backend has measured
+            its own average.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_error_rate: float = 0.5,
+        min_samples: int = 5,
+        expected_output: int = 256,
+    ) -> None:
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.expected_output = expected_output
+
+    def __call__(
+        self,
+        backends: list[Backend],
+        now: float,
+        input_tokens: float,
+        metric: str = "ttft",
+    ):
+        healthy, sick = [], []
+        for b in backends:
+            ok = now >= b.cooldown_until and (
+                b.stats.requests < self.min_samples
+                or b.stats.error_rate <= self.max_error_rate
+            )
+            (healthy if ok else sick).append(b)
+        sick.sort(key=lambda b: b.cooldown_until)
+        return self.rank(healthy, input_tokens, metric) + sick
+
+    def rank(
+        self, backends: list[Backend], input_tokens: float, metric: str = "ttft"
+    ) -> list[Backend]:
+        return backends
+
+    def estimate(self, backend: Backend, input_tokens: float) -> float:
+        output = backend.stats.output_tokens or self.expected_output
+        return backend.cost(input_tokens, output)
+
+
+class CheapestWithinSLO(Policy):
+    """Cheapest backend whose p95 meets `slo` seconds in the request's
+    latency window; backends without samples there count as meeting it. The
+    rest follow, fastest first.
+
+    Args:
+        slo: p95 target in seconds (TTFT for streams, total for `complete`).
+        max_queue: rank last backends with this many requests queued.
+    """
+
+    def __init__(self, slo: float, *, max_queue: int | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.slo = slo
+        self.max_queue = max_queue
+
+    def rank(self, backends, input_tokens, metric="ttft"):
+        meets, misses = [], []
+        for b in backends:
+            p95 = b.stats.p95(metric)
+            fits = (
+                self.max_queue is None
+                or b.stats.in_flight < b.capacity + self.max_queue
+            )
+            if fits and (p95 is None or p95 <= self.slo):
+                meets.append(b)
+            else:
+                misses.append(b)
+        meets.sort(
+            key=lambda b: (self.estimate(b, input_tokens), b.stats.p95(metric) or 0.0)
+        )
+        misses.sort(key=lambda b: (b.queued, b.stats.p95(metric) or math.inf))
+        return meets + misses
+
+
+class LocalFirst(Policy):
+    """Local backends until their queue is `max_queue` deep, then spill to
+    the remote ones — cheapest within `slo` if given, else cheapest.
+    Saturated local backends stay at the end as a last resort.
+
+    Args:
+        max_queue: queued requests at which a local backend spills; 0 spills
+            as soon as every slot is busy.
+        slo: p95 target in seconds for choosing among remote backends.
+    """
+
+    def __init__(
+        self, max_queue: int = 0, *, slo: float | None = None, **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.max_queue = max_queue
+        self._remote = CheapestWithinSLO(
+            slo if slo is not None else math.inf, expected_output=self.expected_output
+        )
+
+    def rank(self, backends, input_tokens, metric="ttft"):
+        local, saturated, remote = [], [], []
+        for b in backends:
+            if not b.local:
+                remote.append(b)
+            elif b.stats.in_flight < b.capacity + self.max_queue:
+                local.append(b)
+            else:
+                saturated.append(b)
+        local.sort(key=lambda b: b.stats.in_flight / b.capacity)
+        saturated.sort(key=lambda b: b.stats.in_flight / b.capacity)
+        return local + self._remote.rank(remote, input_tokens, metric) + saturated
+
+
+class Fastest(Policy):
+    """Lowest p95 first (unmeasured backends first, so they get measured)."""
+
+    def rank(self, backends, input_tokens, metric="ttft"):
+        return sorted(backends, key=lambda b: (b.stats.p95(metric) or 0.0, b.queued))
+
+
+# ── Router ──────────────────────────────────────────────────────────────────
+class Router:
+    """Route chat requests across backends by policy, with failover.
+
+    Args:
+        backends: the candidates; names must be unique.
+        policy: a `Policy`; default `CheapestWithinSLO(slo=2.0)`.
+        max_attempts: backends tried per request before raising
+            `NoBackendAvailable`; at least 1.
+        cooldown: seconds a backend is skipped after an overload reply or a
+            refused connection (a longer Retry-After wins).
+    """
+
+    def __init__(
+        self,
+        backends: list[Backend],
+        *,
+        policy: Policy | None = None,
+        max_attempts: int = 2,
+        cooldown: float = 10.0,
+    ) -> None:
+        if not backends:
+            raise ValueError("at least one backend is required")
+        names = [b.name for b in backends]
+        if len(set(names)) != len(names):
+            raise ValueError(f"duplicate backend names: {names}")
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+        self.backends = list(backends)
+        self.policy = policy or CheapestWithinSLO(2.0)
+        self.max_attempts = max_attempts
+        self.cooldown = cooldown
+
+    def __getitem__(self, name: str) -> Backend:
+        for b in self.backends:
+            if b.name == name:
+                return b
+        raise KeyError(name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        for b in self.backends:
+            await b.client.aclose()
+
+    def pick(
+        self, messages: list[dict] | None = None, metric: str = "ttft"
+    ) -> list[Backend]:
+        """Backends ranked for a request, best first; `metric` is the latency
+        window its SLO applies to ("ttft" or "latency")."""
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric {metric!r}")
+        now = time.monotonic()
+        for b in self.backends:
+            b.stats.update(now)
+        return self.policy(self.backends, now, _input_tokens(messages), metric)
+
+    def stats(self) -> dict[str, dict]:
+        now = time.monotonic()
+        out = {}
+        for b in self.backends:
+            b.stats.update(now)
+            out[b.name] = {
+                **b.stats.summary(),
+                "cooldown": max(0.0, b.cooldown_until - now),
+            }
+        return out
+
+    # ── Requests ────────────────────────────────────────────────────────────
+    async def complete(
+        self,
+        messages: list[dict],
+        *,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        **fields,
+    ) -> dict:
+        """Non-streaming chat completion on the best available backend; the
+        body gets a `backend` key naming the one that answered. Raises
+        `NoBackendAvailable` once `max_attempts` backends have failed over."""
+        tried, last = [], None
+        for backend in self.pick(messages, "latency")[: self.max_attempts]:
+            tried.append(backend.name)
+            stats = backend.stats
+            stats.in_flight += 1
+            started = time.monotonic()
+            try:
+                body = await backend.client.complete(
+                    backend.model, messages, tenant=tenant, priority=priority, **fields
+                )
+            except (httpx.HTTPStatusError, httpx.TransportError) as exc:
+                if not self._failed(backend, exc):
+                    raise
+                last = exc
+                continue
+            finally:
+                stats.in_flight -= 1
+            now = time.monotonic()
+            elapsed = now - started
+            tokens = (body.get("usage") or {}).get("completion_tokens")
+            stats.observe(now, elapsed, tokens, tokens / elapsed if tokens else None)
+            body["backend"] = backend.name
+            return body
+        raise _exhausted(tried) from last
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        messages: list[dict],
+        *,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        **fields,
+    ):
+        """Streaming chat completion; yields the chosen client's `TokenStream`
+        with a `backend` attribute. Failover happens only before the first
+        token — once text has been yielded, errors propagate."""
+        tried, last = [], None
+        for backend in self.pick(messages, "ttft")[: self.max_attempts]:
+            tried.append(backend.name)
+            stats = backend.stats
+            stats.in_flight += 1
+            try:
+                async with AsyncExitStack() as stack:
+                    started = time.monotonic()
+                    try:
+                        tokens = await stack.enter_async_context(
+                            backend.client.stream(
+                                backend.model,
+                                messages,
+                                tenant=tenant,
+                                priority=priority,
+                                **fields,
+                            )
+                        )
+                    except (httpx.HTTPStatusError, httpx.TransportError) as exc:
+                        if not self._failed(backend, exc):
+                            raise
+                        last = exc
+                        continue
+                    tokens.backend = backend.name
+                    try:
+                        yield tokens
+                    except httpx.HTTPError:
+                        stats.fail(time.monotonic())
+                        raise
+                    self._observe_stream(stats, tokens, started)
+                    return
+            finally:
+                stats.in_flight -= 1
+        raise _exhausted(tried) from last
+
+    def _observe_stream(self, stats: BackendStats, tokens, started: float) -> None:
+        now = time.monotonic()
+        elapsed = now - started
+        ttft = tokens.ttft  # None if the consumer left before the first token
+        usage = (tokens.final or {}).get("usage") or {}
+        count = usage.get("completion_tokens")
+        rate = None
+        if count and ttft is not None and elapsed > ttft:
+            rate = count / (elapsed - ttft)
+        stats.observe(now, elapsed, count, rate, ttft=ttft)
+
+    def _failed(self, backend: Backend, exc: Exception) -> bool:
+        """Record a failed attempt; False if the error is the caller's (a
+        4xx other than 429) and should not fail over."""
+        now = time.monotonic()
+        if isinstance(exc, httpx.HTTPStatusError):
+            status = exc.response.status_code
+            if status in OVERLOAD_STATUS:
+                backend.stats.fail(now, overloaded=True)
+                wait = _retry_after(exc.response)
+                backend.cooldown_until = now + max(self.cooldown, wait)
+                return True
+            if status < 500:
+                return False
+        elif isinstance(exc, httpx.ConnectError):
+            backend.cooldown_until = now + self.cooldown
+        backend.stats.fail(now)
+        return True
+
+
+def _exhausted(tried: list[str]) -> NoBackendAvailable:
+    return NoBackendAvailable(f"no backend available (tried {', '.join(tried)})")
+
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except ValueError:  # an HTTP date; the default cooldown will do
+        return 0.0
+
+
+def _input_tokens(messages: list[dict] | None) -> float:
+    """Rough prompt size: ~4 characters per token."""
+    if not messages:
+        return 0.0
+    return sum(len(m.get("content") or "") for m in messages) / 4
@@ -0,0 +1,231 @@
+# ── Priority + fair-share request scheduler ─────────────────────────────────
+# One Ollama server is shared by interactive chat and big batch jobs. With the
+# plain `asyncio.gather(...)` pattern whoever submits first wins, so a batch
+# flood of 500 prompts pushes a chat user's first token back by minutes.
+#
+# RequestScheduler hands out a fixed number of "slots" (in-flight requests):
+#   • Priority classes  – INTERACTIVE requests are always dispatched before
+#                         BATCH requests.
+#   • Fair queuing      – inside a class, tenants share slots by weight
+#                         (start-time weighted fair queuing), so one tenant's
+#                         flood cannot starve another tenant.
+#   • Pressure throttle – while interactive TTFT (measured on streams) is
+#                         above the SLO, batch work may only use
+#                         `batch_floor` slots.
+#   • Preemption        – an interactive request that finds every slot busy
+#                         preempts the youngest batch request; the client
+#                         aborts that HTTP call and re-queues it.
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """Lower value = dispatched first."""
+
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class Preempted(Exception):
+    """Raised inside a batch request whose slot was taken by interactive work."""
+
+
+class Lease:
+    """One granted slot. Hand it back with `RequestScheduler.release`."""
+
+    __slots__ = ("tenant", "priority", "started_at", "preempted")
+
+    def __init__(self, tenant: str, priority: Priority) -> None:
+        self.tenant = tenant
+        self.priority = priority
+        self.started_at = time.monotonic()
+        # Set by the scheduler when this (batch) lease must give its slot back.
+        self.preempted = asyncio.Event()
+
+
+class RequestScheduler:
+    """Admission control in front of one backend.
+
+    Args:
+        max_concurrency: slots, i.e. requests allowed in flight at once.
+            Match it to the server's `OLLAMA_NUM_PARALLEL`.
+        tenant_weights: relative share per tenant (default weight 1.0).
+        interactive_ttft_slo: seconds; above this EWMA of interactive TTFT
+            the scheduler throttles batch admissions.
+        batch_floor: slots batch work keeps while throttled.
+        preempt: allow interactive requests to preempt running batch work.
+        pressure_window: seconds; interactive latency older than this no
+            longer counts as pressure (so batch recovers once chat goes quiet).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        *,
+        tenant_weights: dict[str, float] | None = None,
+        interactive_ttft_slo: float = 2.0,
+        batch_floor: int = 1,
+        preempt: bool = True,
+        pressure_window: float = 30.0,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.max_concurrency = max_concurrency
+        self.tenant_weights = dict(tenant_weights or {})
+        self.interactive_ttft_slo = interactive_ttft_slo
+        self.batch_floor = batch_floor
+        self.preempt = preempt
+        self.pressure_window = pressure_window
+
+        self._waiting: list[
+            tuple
+        ] = []  # heap of (priority, finish, seq, start, tenant, future)
+        self._seq = itertools.count()
+        self._vtime = [0.0, 0.0]  # virtual clock per priority class
+        # Finish tag of each tenant's last granted request, and the tags of
+        # its requests still waiting (in order). A waiter that is cancelled
+        # drops out of the chain instead of pushing later requests back.
+        self._last_finish: dict[tuple[Priority, str], float] = {}
+        self._queued_finish: dict[tuple[Priority, str], deque] = {}
+        self._running: set[Lease] = set()
+        self._running_batch = 0
+        self._ttft_ewma = 0.0
+        self._last_interactive = float("-inf")
+
+    # ── Public API ──────────────────────────────────────────────────────────
+    async def acquire(
+        self,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        cost: float = 1.0,
+    ) -> Lease:
+        """Wait for a slot. `cost` is the request's relative size (e.g. prompt
+        length) used for fair sharing between tenants."""
+        priority = Priority(priority)
+        weight = self.tenant_weights.get(tenant, 1.0)
+        key = (priority, tenant)
+        queued = self._queued_finish.setdefault(key, deque())
+        start = max(
+            self._vtime[priority],
+            self._last_finish.get(key, 0.0),
+            queued[-1] if queued else 0.0,
+        )
+        finish = start + cost / weight
+        queued.append(finish)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiting, (priority, finish, next(self._seq), start, tenant, future)
+        )
+        self._dispatch()
+        if not future.done() and priority is Priority.INTERACTIVE:
+            self._maybe_preempt()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Cancelled while waiting. If the slot was granted in the same
+            # tick, give it straight back.
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            else:
+                self._dequeue(key, finish)
+            raise
+
+    def release(self, lease: Lease) -> None:
+        if lease not in self._running:
+            return
+        self._running.discard(lease)
+        if lease.priority is Priority.BATCH:
+            self._running_batch -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        tenant: str = "default",
+        priority: Priority = Priority.INTERACTIVE,
+        cost: float = 1.0,
+    ):
+        lease = await self.acquire(tenant, priority, cost)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def observe_ttft(self, lease: Lease, seconds: float) -> None:
+        """Report an interactive stream's time to first token. Non-streaming
+        calls do not report: their latency includes the whole generation."""
+        if lease.priority is not Priority.INTERACTIVE:
+            return
+        self._ttft_ewma = 0.8 * self._ttft_ewma + 0.2 * seconds
+        self._last_interactive = time.monotonic()
+
+    @property
+    def under_pressure(self) -> bool:
+        recent = time.monotonic() - self._last_interactive < self.pressure_window
+        return recent and self._ttft_ewma > self.interactive_ttft_slo
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "running_batch": self._running_batch,
+            "waiting": sum(1 for *_, f in self._waiting if not f.done()),
+            "interactive_ttft_ewma": self._ttft_ewma,
+            "under_pressure": self.under_pressure,
+        }
+
+    # ── Internals ───────────────────────────────────────────────────────────
+    def _batch_limit(self) -> int:
+        return self.batch_floor if self.under_pressure else self.max_concurrency
+
+    def _dispatch(self) -> None:
+        waiting = self._waiting
+        while waiting and len(self._running) < self.max_concurrency:
+            priority, finish, _, start, tenant, future = waiting[0]
+            if future.done():  # waiter was cancelled
+                heapq.heappop(waiting)
+                continue
+            # Interactive entries sort first, so a batch entry at the top means
+            # only batch work is waiting. An idle server always admits one.
+            if (
+                priority is Priority.BATCH
+                and self._running
+                and self._running_batch >= self._batch_limit()
+            ):
+                break
+            heapq.heappop(waiting)
+            # Advance the class's virtual clock to the dispatched start tag.
+            self._vtime[priority] = max(self._vtime[priority], start)
+            key = (priority, tenant)
+            self._last_finish[key] = max(self._last_finish.get(key, 0.0), finish)
+            self._dequeue(key, finish)
+            lease = Lease(tenant, priority)
+            self._running.add(lease)
+            if priority is Priority.BATCH:
+                self._running_batch += 1
+            future.set_result(lease)
+
+    def _dequeue(self, key: tuple[Priority, str], finish: float) -> None:
+        queued = self._queued_finish.get(key)
+        if queued is None:
+            return
+        queued.remove(finish)  # usually the leftmost
+        if not queued:
+            del self._queued_finish[key]
+
+    def _maybe_preempt(self) -> None:
+        if not self.preempt or len(self._running) < self.max_concurrency:
+            return
+        victims = [
+            lease
+            for lease in self._running
+            if lease.priority is Priority.BATCH and not lease.preempted.is_set()
+        ]
+        if victims:
+            # Youngest first: it has the least sunk work to throw away.
+            max(victims, key=lambda lease: lease.started_at).preempted.set()
@@ -0,0 +1,242 @@
+# ── Semantic cache for near-duplicate prompts ───────────────────────────────
+# Many prompts are paraphrases of each other — this repo's own two variants
+# ("Identify your model and creator..." vs. "State your model and the company
+# or lab that created you...") ask the same thing. An exact-match cache misses
+# those; a semantic cache embeds each prompt with a local model, finds the
+# most similar cached prompt, and returns its completion when the cosine
+# similarity clears a threshold.
+#
+#   cache = SemanticCache(OllamaEmbedder(), threshold=0.92)
+#   cache.enable("faq")                  # opt-in, per route
+#   client = AsyncOllamaClient(semantic_cache=cache)
+#   await client.generate(model, prompt, route="faq")   # may skip generation
+#   cache.metrics()
+#
+# The index is a NumPy matrix of unit vectors searched exactly with one
+# matrix-vector product — at ≤100k entries that is ~1 ms and needs no ANN
+# library. Hits are only served within the same (route, model, request
+# fields) namespace, and the least recently used entry is evicted when full.
+# Records are copied in and out, so callers may mutate what they get back.
+# Close the cache (`await cache.aclose()`) to close its embedder's client.
+import copy
+import hashlib
+import json
+import time
+
+import numpy as np
+
+
+class OllamaEmbedder:
+    """Embed texts with Ollama's /api/embed (e.g. `nomic-embed-text`)."""
+
+    def __init__(self, model: str = "nomic-embed-text", client=None) -> None:
+        self.model = model
+        self._client = client  # AsyncOllamaClient; one on $OLLAMA_HOST if None
+        self._owns_client = False
+
+    async def __call__(self, texts: list[str]) -> np.ndarray:
+        if self._client is None:
+            from lib.client import AsyncOllamaClient
+
+            self._client = AsyncOllamaClient()
+            self._owns_client = True
+        return np.asarray(await self._client.embed(self.model, texts), dtype=np.float32)
+
+    async def aclose(self) -> None:
+        """Close the client this embedder created (a passed-in one is left
+        to its owner)."""
+        if self._owns_client:
+            client, self._client = self._client, None
+            self._owns_client = False
+            await client.aclose()
+
+
+class SemanticCache:
+    """Similarity-keyed completion cache.
+
+    Args:
+        embed: async callable, list of texts → (n, dim) array.
+        threshold: default minimum cosine similarity for a hit.
+        near_margin: a miss within this much of the threshold counts as a
+            near miss in `metrics()` (a hint that the threshold is too high).
+        capacity: entries kept before LRU eviction.
+        ttl: seconds an entry stays valid (None: forever).
+    """
+
+    def __init__(
+        self,
+        embed,
+        *,
+        threshold: float = 0.92,
+        near_margin: float = 0.05,
+        capacity: int = 10_000,
+        ttl: float | None = None,
+    ) -> None:
+        self.embed = embed
+        self.threshold = threshold
+        self.near_margin = near_margin
+        self.capacity = capacity
+        self.ttl = ttl
+        self._routes: dict[str, float] = {}  # enabled route → threshold
+
+        self._vectors: np.ndarray | None = None  # (capacity, dim), unit rows
+        self._namespace = np.full(capacity, -1, dtype=np.int64)  # -1 = free row
+        self._last_used = np.zeros(capacity)
+        self._created = np.zeros(capacity)
+        self._values: list[dict | None] = [None] * capacity
+        self._prompts: list[str | None] = [None] * capacity
+        self._namespace_ids: dict[str, int] = {}
+        self._stats: dict[str, dict] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        aclose = getattr(self.embed, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    # ── Routes ──────────────────────────────────────────────────────────────
+    def enable(self, route: str, threshold: float | None = None) -> None:
+        """Serve cached answers for `route` (optionally with its own threshold)."""
+        self._routes[route] = self.threshold if threshold is None else threshold
+
+    def disable(self, route: str) -> None:
+        self._routes.pop(route, None)
+
+    def enabled(self, route: str | None) -> bool:
+        return route in self._routes
+
+    # ── Lookup / store ──────────────────────────────────────────────────────
+    async def lookup(self, route: str, model: str, prompt: str, fields: dict):
+        """Return ``(hit, vector)``: the cached record (or None) and the
+        prompt's embedding, to pass on to `store` after a miss."""
+        vector = _unit((await self.embed([prompt]))[0])
+        stats = self._route_stats(route)
+        stats["lookups"] += 1
+        ns = self._namespace_ids.get(_namespace_key(route, model, fields))
+        if ns is None or self._vectors is None:
+            stats["misses"] += 1
+            return None, vector
+
+        now = time.monotonic()
+        live = self._namespace == ns
+        if self.ttl is not None:
+            live &= now - self._created < self.ttl
+        if not live.any():
+            stats["misses"] += 1
+            return None, vector
+        scores = np.where(live, self._vectors @ vector, -np.inf)
+        row = int(scores.argmax())
+        similarity = float(scores[row])
+
+        threshold = self._routes.get(route, self.threshold)
+        if similarity < threshold:
+            stats["misses"] += 1
+            if similarity >= threshold - self.near_margin:
+                stats["near_misses"] += 1
+            return None, vector
+        self._last_used[row] = now
+        stats["hits"] += 1
+        stats["hit_similarity_sum"] += similarity
+        stats["hit_similarity_min"] = min(stats["hit_similarity_min"], similarity)
+        hit = copy.deepcopy(self._values[row])
+        hit.update(cached=True, similarity=similarity, cached_prompt=self._prompts[row])
+        return hit, vector
+
+    def store(
+        self,
+        route: str,
+        model: str,
+        prompt: str,
+        fields: dict,
+        vector: np.ndarray,
+        value: dict,
+    ) -> None:
+        if self._vectors is None:
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        key = _namespace_key(route, model, fields)
+        ns = self._namespace_ids.setdefault(key, len(self._namespace_ids))
+        now = time.monotonic()
+        self._expire(now)
+        free = np.flatnonzero(self._namespace < 0)
+        row = int(free[0]) if free.size else int(self._last_used.argmin())  # LRU
+        if not free.size:
+            self._route_stats(route)["evictions"] += 1
+        self._vectors[row] = vector
+        self._namespace[row] = ns
+        self._last_used[row] = self._created[row] = now
+        self._values[row] = copy.deepcopy(value)
+        self._prompts[row] = prompt
+
+    def _expire(self, now: float) -> None:
+        """Free the rows whose TTL has run out."""
+        if self.ttl is None:
+            return
+        expired = np.flatnonzero(
+            (self._namespace >= 0) & (now - self._created >= self.ttl)
+        )
+        self._namespace[expired] = -1
+        for row in expired:
+            self._values[row] = self._prompts[row] = None
+
+    # ── Quality ─────────────────────────────────────────────────────────────
+    def feedback(self, route: str, good: bool) -> None:
+        """Record whether a served hit was actually acceptable (e.g. from a
+        thumbs-up/down or an offline judge); feeds `hit_precision`."""
+        stats = self._route_stats(route)
+        stats["feedback_good" if good else "feedback_bad"] += 1
+
+    def metrics(self) -> dict[str, dict]:
+        out = {}
+        for route, s in self._stats.items():
+            judged = s["feedback_good"] + s["feedback_bad"]
+            out[route] = {
+                "lookups": s["lookups"],
+                "hits": s["hits"],
+                "misses": s["misses"],
+                "hit_rate": s["hits"] / s["lookups"] if s["lookups"] else 0.0,
+                "near_misses": s["near_misses"],
+                "evictions": s["evictions"],
+                "mean_hit_similarity": (
+                    s["hit_similarity_sum"] / s["hits"] if s["hits"] else None
+                ),
+                "min_hit_similarity": s["hit_similarity_min"] if s["hits"] else None,
+                "hit_precision": s["feedback_good"] / judged if judged else None,
+            }
+        return out
+
+    def __len__(self) -> int:
+        self._expire(time.monotonic())
+        return int((self._namespace >= 0).sum())
+
+    def _route_stats(self, route: str) -> dict:
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = self._stats[route] = {
+                "lookups": 0,
+                "hits": 0,
+                "misses": 0,
+                "near_misses": 0,
+                "evictions": 0,
+                "hit_similarity_sum": 0.0,
+                "hit_similarity_min": 1.0,
+                "feedback_good": 0,
+                "feedback_bad": 0,
+            }
+        return stats
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def _namespace_key(route: str, model: str, fields: dict) -> str:
+    """Hits must come from the same route, model and request options."""
+    blob = json.dumps([route, model, fields], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
@@ -0,0 +1,159 @@
+# ── Streaming response decoders ─────────────────────────────────────────────
+# Both decoders share one interface so callers don't care which wire format
+# a backend speaks:
+#
+#   async for text in decoder.iter_text(response.aiter_bytes()): ...
+#   decoder.final   # usage / timing record once the stream has ended
+#
+# Ollama streams **NDJSON**: one JSON object per line, e.g.
+#   {"response":"Hello", "done":false, ...}
+#   {"response":" world!", "done":false, ...}
+#   {"done":true, "eval_count":42, "eval_duration":..., ...}
+#
+# The example scripts decode this with `response.aiter_lines()` + `json.loads`.
+# The decoder below does the same job over raw bytes: it splits lines itself,
+# yields only the text deltas as plain `str`, and keeps the final record
+# (the one with the timing/usage counters) on `decoder.final`.
+#
+# OpenAI-compatible `/chat/completions` endpoints (OpenAI, Groq, DeepSeek,
+# Grok, Perplexity, Cohere, Gemini, Ollama's /v1) stream **Server-Sent
+# Events** instead:
+#   data: {"choices":[{"delta":{"content":"Hello"}}], ...}
+#
+#   data: {"choices":[], "usage":{"prompt_tokens":12, ...}}
+#
+#   data: [DONE]
+# SSEDecoder reads those with plain dict lookups — no per-chunk pydantic
+# models as in the OpenAI SDK's streaming path.
+import json
+from collections.abc import AsyncIterable, AsyncIterator
+
+
+class StreamError(RuntimeError):
+    """The server reported an error in the middle of a stream."""
+
+
+class NDJSONDecoder:
+    """Decode an Ollama NDJSON byte stream into text deltas.
+
+    Works for both ``/api/generate`` (text under ``"response"``) and
+    ``/api/chat`` (text under ``"message"."content"``).
+
+    Usage::
+
+        decoder = NDJSONDecoder()
+        async for text in decoder.iter_text(response.aiter_bytes()):
+            print(text, end="", flush=True)
+        print(decoder.final["eval_count"])
+    """
+
+    __slots__ = ("final",)
+
+    def __init__(self) -> None:
+        # The last record (``"done": true``), or None until the stream ends.
+        self.final: dict | None = None
+
+    async def iter_text(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+        loads = json.loads
+        buf = b""
+        async for chunk in chunks:
+            buf = buf + chunk if buf else chunk
+            start = 0
+            while (end := buf.find(b"\n", start)) >= 0:
+                line = buf[start:end]
+                start = end + 1
+                if not line.strip():
+                    continue  # keep-alive / blank line
+                data = loads(line)
+                text = _text_of(data)
+                if text:
+                    yield text
+                if data.get("done"):
+                    self.final = data
+                    return
+            buf = buf[start:]
+
+        # Some proxies drop the trailing newline on the last record.
+        if buf.strip():
+            data = loads(buf)
+            text = _text_of(data)
+            if text:
+                yield text
+            if data.get("done"):
+                self.final = data
+
+
+def _text_of(data: dict) -> str | None:
+    if "error" in data:
+        raise StreamError(data["error"])
+    text = data.get("response")
+    if text is None and (message := data.get("message")):
+        text = message.get("content")
+    return text
+
+
+class SSEDecoder:
+    """Decode an OpenAI-compatible chat-completions SSE byte stream.
+
+    `final` collects ``model``, ``finish_reason`` and the ``usage`` block
+    (send ``stream_options: {"include_usage": true}`` to get usage from
+    providers that only report it on request).
+    """
+
+    __slots__ = ("final",)
+
+    def __init__(self) -> None:
+        self.final: dict | None = None
+
+    async def iter_text(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+        loads = json.loads
+        final = {"model": None, "finish_reason": None, "usage": None}
+        data: list[bytes] = []  # data lines of the event being read
+        buf = b""
+        try:
+            async for chunk in chunks:
+                buf = buf + chunk if buf else chunk
+                start = 0
+                while (end := buf.find(b"\n", start)) >= 0:
+                    line = buf[start:end].rstrip(b"\r")
+                    start = end + 1
+                    if line.startswith(b"data:"):
+                        data.append(line[6:] if line[5:6] == b" " else line[5:])
+                        continue
+                    if line or not data:
+                        continue  # comment, event:/id: field, or stray blank
+                    # Blank line: dispatch the event.
+                    payload = data[0] if len(data) == 1 else b"\n".join(data)
+                    data.clear()
+                    if payload == b"[DONE]":
+                        return
+                    text = _delta_of(loads(payload), final)
+                    if text:
+                        yield text
+                buf = buf[start:]
+            if data and data[0] != b"[DONE]":
+                text = _delta_of(loads(b"\n".join(data)), final)
+                if text:
+                    yield text
+        finally:
+            self.final = final
+
+
+def _delta_of(event: dict, final: dict) -> str | None:
+    if "error" in event:
+        error = event["error"]
+        raise StreamError(
+            error.get("message", error) if isinstance(error, dict) else error
+        )
+    if event.get("usage"):
+        final["usage"] = event["usage"]
+    if event.get("model"):
+        final["model"] = event["model"]
+    choices = event.get("choices")
+    if not choices:
+        return None
+    choice = choices[0]
+    if choice.get("finish_reason"):
+        final["finish_reason"] = choice["finish_reason"]
+    delta = choice.get("delta")
+    return delta.get("content") if delta else None
@@ -0,0 +1,496 @@
+# ── Transcript store: compressed, append-only, indexed ──────────────────────
+# Batch and arena runs produce millions of prompt/response pairs. As raw
+# JSONL they cost disk, and finding one means a linear scan. This store
+# appends records into compressed blocks and finds any of them by request
+# hash in one index probe plus one block decompression:
+#
+#   store = TranscriptStore("transcripts")
+#   key = await store.append({"model": m, "prompt": p, "response": text, ...})
+#   store.get(key)                     # or store.lookup(m, p) by request
+#   await store.aclose()
+#
+# Layout of the directory:
+#   seg-000001.log ...  segments: a run of blocks, each block a header
+#                       (codec, sizes, record count) and a compressed batch
+#                       of JSON lines; zstd (`zstandard`, a project
+#                       dependency), or zlib where it is missing (the codec
+#                       is stored per block, so either way stays readable)
+#   index.log           append-only 40-byte entries (key, segment, block
+#                       offset, record number, timestamp) for recent records
+#   index-<gen>.sorted  the same entries sorted by key, written by
+#                       compaction and binary-searched through mmap, so the
+#                       in-memory index holds only what was added since
+#   MANIFEST.json       current generation, sealed segments, next segment id
+#   LOCK                held (flock) by the one store that has the directory
+#                       open; a second open, in any process, fails at once
+#
+# Each open appends to a fresh segment; on open, the segments earlier runs
+# left active are sealed, so compaction and retention cover them.
+# Segments are read through mmap. Writes queue in memory and go to disk
+# on one writer thread, so `append` never blocks the event loop. Compaction
+# runs on its own thread. It rewrites sealed segments keeping only the
+# newest record per key that passes retention (`max_age` seconds), then
+# swaps in the new generation; appends continue meanwhile.
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # optional: zlib is always there
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CODEC_ZLIB, CODEC_ZSTD = 1, 2
+_BLOCK = struct.Struct("<4sBIII")  # magic, codec, raw len, packed len, records
+_MAGIC = b"TRB1"
+_ENTRY = struct.Struct("<16sIQId")  # key, segment, block offset, record, ts
+KEY_FIELDS = ("model", "system", "prompt", "messages", "options", "format")
+
+
+def request_key(model: str, prompt=None, **fields) -> bytes:
+    """16-byte hash identifying a request (model, prompt and the request
+    fields in KEY_FIELDS); equal requests share a key."""
+    parts = {"model": model, "prompt": prompt, **fields}
+    parts = {k: parts[k] for k in KEY_FIELDS if parts.get(k) is not None}
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=16).digest()
+
+
+class TranscriptStore:
+    """Append-only compressed record store with a hash index.
+
+    Args:
+        directory: store directory; created if missing.
+        block_records: records per compressed block.
+        segment_bytes: a segment is sealed (and later compacted) past this.
+        max_age: retention in seconds, applied at compaction; None keeps all.
+        compact_after: start a background compaction once this many sealed
+            segments have not been compacted yet.
+        codec: "zstd" or "zlib"; default zstd if available.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        block_records: int = 512,
+        segment_bytes: int = 64 << 20,
+        max_age: float | None = None,
+        compact_after: int = 4,
+        codec: str | None = None,
+    ) -> None:
+        self.directory = directory
+        self.block_records = block_records
+        self.segment_bytes = segment_bytes
+        self.max_age = max_age
+        self.compact_after = compact_after
+        if codec is None:
+            codec = "zstd" if zstandard is not None else "zlib"
+        if codec == "zstd" and zstandard is None:
+            raise RuntimeError("codec='zstd' needs the zstandard package")
+        self._codec = CODEC_ZSTD if codec == "zstd" else CODEC_ZLIB
+        os.makedirs(directory, exist_ok=True)
+        self._dir_lock = _lock_file(self._path("LOCK"))
+
+        self._lock = threading.Lock()  # index, manifest and segment map
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="transcripts")
+        self._compactor: threading.Thread | None = None
+        self._pending: dict[bytes, dict] = {}  # appended, not yet on disk
+        self._batch: list[tuple[bytes, dict]] = []
+        self._maps: dict[int, mmap.mmap] = {}
+        self._blocks: OrderedDict = OrderedDict()  # (seg, off) → JSON lines, LRU
+        self._load()
+
+    # ── Opening ─────────────────────────────────────────────────────────────
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        try:
+            with open(self._path("MANIFEST.json")) as f:
+                self._manifest = json.load(f)
+        except FileNotFoundError:
+            self._manifest = {"generation": 0, "sealed": [], "next_segment": 1}
+        self._sorted = None  # (mmap, entry count) of the sorted index
+        if self._manifest["generation"]:
+            self._sorted = _map_file(
+                self._path(f"index-{self._manifest['generation']}.sorted")
+            )
+        self._recent: dict[bytes, tuple] = {}
+        try:
+            with open(self._path("index.log"), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        usable = len(data) - len(data) % _ENTRY.size  # ignore a torn tail
+        for key, *where in _ENTRY.iter_unpack(data[:usable]):
+            self._recent[key] = tuple(where)
+        self._index_log = open(self._path("index.log"), "ab")
+        self._index_log.truncate(usable)
+        self._seal_leftovers()
+        # A fresh segment per process: never append after a possibly torn tail.
+        self._active = self._new_segment_id()
+        self._active_file = open(self._path(_segment_name(self._active)), "ab")
+        self._save_manifest()
+        if len(self._manifest["sealed"]) >= self.compact_after:
+            self.compact()  # short runs may never fill a segment to seal it
+
+    def _seal_leftovers(self) -> None:
+        """Seal the segments earlier runs were still writing (or a crashed
+        compaction left behind), so compaction and `max_age` reach them; drop
+        the empty ones. Safe because LOCK shuts out any live writer."""
+        known = set(self._manifest["sealed"])
+        if self._sorted is not None:
+            known |= _segments_of(self._sorted)
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("seg-") and name.endswith(".log")):
+                continue
+            segment = int(name[4:-4])
+            if segment in known:
+                continue
+            if os.path.getsize(self._path(name)):
+                self._manifest["sealed"].append(segment)
+            else:
+                _remove(self._path(name))
+
+    # ── Writing ─────────────────────────────────────────────────────────────
+    async def append(self, record: dict, key: bytes | None = None) -> bytes:
+        """Queue `record`; return its key (by default `request_key` of the
+        record's own fields). The newest record for a key wins."""
+        if key is None:
+            key = request_key(**{k: record.get(k) for k in KEY_FIELDS})
+        record = {"ts": time.time(), **record}
+        self._pending[key] = record
+        self._batch.append((key, record))
+        if len(self._batch) >= self.block_records:
+            batch, self._batch = self._batch, []
+            await asyncio.wrap_future(self._writer.submit(self._write_block, batch))
+        return key
+
+    async def flush(self) -> None:
+        """Write any partially filled block."""
+        batch, self._batch = self._batch, []
+        if batch:
+            await asyncio.wrap_future(self._writer.submit(self._write_block, batch))
+
+    async def aclose(self) -> None:
+        await self.flush()
+        await asyncio.to_thread(self.close)
+
+    def close(self) -> None:
+        if self._batch:
+            batch, self._batch = self._batch, []
+            self._writer.submit(self._write_block, batch).result()
+        self._writer.shutdown(wait=True)
+        if self._compactor is not None:
+            self._compactor.join()
+        self._active_file.close()
+        active = self._path(_segment_name(self._active))
+        if not os.path.getsize(active):
+            _remove(active)
+        self._index_log.close()
+        for m in self._maps.values():
+            m.close()
+        if self._sorted is not None:
+            self._sorted[0].close()
+        self._dir_lock.close()  # releases LOCK
+
+    def _write_block(self, batch: list[tuple[bytes, dict]]) -> None:
+        """Writer thread: compress one block, append it, index it."""
+        raw = "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            for _, record in batch
+        ).encode()
+        packed = _compress(self._codec, raw)
+        offset = self._active_file.tell()
+        self._active_file.write(
+            _BLOCK.pack(_MAGIC, self._codec, len(raw), len(packed), len(batch))
+        )
+        self._active_file.write(packed)
+        self._active_file.flush()
+        entries = b"".join(
+            _ENTRY.pack(key, self._active, offset, i, record["ts"])
+            for i, (key, record) in enumerate(batch)
+        )
+        with self._lock:  # compaction may be swapping index.log
+            self._index_log.write(entries)
+            self._index_log.flush()
+            for i, (key, record) in enumerate(batch):
+                self._recent[key] = (self._active, offset, i, record["ts"])
+                if self._pending.get(key) is record:
+                    del self._pending[key]
+            self._maps.pop(self._active, None)  # re-map to see the new block
+        if offset + _BLOCK.size + len(packed) >= self.segment_bytes:
+            self._seal()
+
+    def _seal(self) -> None:
+        # Under the lock: `get` flushes `_active_file` when reading `_active`.
+        with self._lock:
+            self._active_file.close()
+            self._manifest["sealed"].append(self._active)
+            self._active = self._new_segment_id()
+            self._save_manifest()
+            self._active_file = open(self._path(_segment_name(self._active)), "ab")
+            uncompacted = len(self._manifest["sealed"])
+        if uncompacted >= self.compact_after:
+            self.compact()
+
+    def _new_segment_id(self) -> int:
+        segment = self._manifest["next_segment"]
+        self._manifest["next_segment"] = segment + 1
+        return segment
+
+    def _save_manifest(self) -> None:
+        tmp = self._path("MANIFEST.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp, self._path("MANIFEST.json"))
+
+    # ── Reading ─────────────────────────────────────────────────────────────
+    def lookup(self, model: str, prompt=None, **fields) -> dict | None:
+        return self.get(request_key(model, prompt, **fields))
+
+    def get(self, key: bytes) -> dict | None:
+        """The newest record stored under `key`, or None. Sub-millisecond:
+        one index probe, one (cached) block decompression."""
+        with self._lock:
+            record = self._pending.get(key)
+            if record is not None:
+                return record
+            where = self._recent.get(key)
+            if where is None and self._sorted is not None:
+                where = _search(self._sorted, key)
+            if where is None:
+                return None
+            segment, offset, number, _ = where
+            return json.loads(self._read_block(segment, offset)[number])
+
+    async def aget(self, key: bytes) -> dict | None:
+        return await asyncio.to_thread(self.get, key)
+
+    def __len__(self) -> int:
+        """Distinct keys (pending, recent and compacted; may overcount a key
+        present in both the recent and the compacted index)."""
+        sorted_count = self._sorted[1] if self._sorted is not None else 0
+        return (
+            len(self._pending.keys() - self._recent.keys())
+            + len(self._recent)
+            + sorted_count
+        )
+
+    def _read_block(self, segment: int, offset: int) -> list[bytes]:
+        """The block's JSON lines, undecoded (only the wanted one is parsed)."""
+        cached = self._blocks.get((segment, offset))
+        if cached is not None:
+            self._blocks.move_to_end((segment, offset))
+            return cached
+        m = self._maps.get(segment)
+        if m is None:
+            if segment == self._active:
+                self._active_file.flush()
+            m = self._maps[segment] = _map_file(self._path(_segment_name(segment)))[0]
+        magic, codec, raw_len, packed_len, _ = _BLOCK.unpack_from(m, offset)
+        if magic != _MAGIC:
+            raise ValueError(f"corrupt block at segment {segment} offset {offset}")
+        start = offset + _BLOCK.size
+        raw = _decompress(codec, m[start : start + packed_len], raw_len)
+        lines = raw.splitlines()
+        self._blocks[(segment, offset)] = lines
+        if len(self._blocks) > 64:
+            self._blocks.popitem(last=False)
+        return lines
+
+    # ── Compaction ──────────────────────────────────────────────────────────
+    def compact(self) -> threading.Thread:
+        """Start a background compaction (no-op if one is running)."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return self._compactor
+            self._compactor = threading.Thread(
+                target=self._compact, name="transcripts-compact", daemon=True
+            )
+            self._compactor.start()
+            return self._compactor
+
+    async def acompact(self) -> None:
+        await asyncio.to_thread(self.compact().join)
+
+    def _compact(self) -> None:
+        with self._lock:
+            sealed = set(self._manifest["sealed"])
+            old_sorted = self._sorted
+            live = {k: w for k, w in self._recent.items() if w[0] in sealed}
+            generation = self._manifest["generation"] + 1
+        entries: dict[bytes, tuple] = {}
+        if old_sorted is not None:
+            m, count = old_sorted
+            for i in range(count):
+                key, *where = _ENTRY.unpack_from(m, i * _ENTRY.size)
+                entries[key] = tuple(where)
+        entries.update(live)  # newer than anything compacted before
+        cutoff = time.time() - self.max_age if self.max_age is not None else None
+
+        # Rewrite surviving records into fresh segments, block by block.
+        out_entries = []
+        out_file = out_id = None
+        batch: list[tuple[bytes, bytes, float]] = []  # key, JSON line, ts
+
+        def write_batch() -> None:
+            nonlocal out_file, out_id
+            if out_file is None or out_file.tell() >= self.segment_bytes:
+                if out_file is not None:
+                    out_file.close()
+                with self._lock:
+                    out_id = self._new_segment_id()
+                    self._save_manifest()  # never hand this id out twice
+                    new_segments.append(out_id)
+                out_file = open(self._path(_segment_name(out_id)), "wb")
+            raw = b"".join(line + b"\n" for _, line, _ in batch)
+            packed = _compress(self._codec, raw)
+            offset = out_file.tell()
+            out_file.write(
+                _BLOCK.pack(_MAGIC, self._codec, len(raw), len(packed), len(batch))
+            )
+            out_file.write(packed)
+            for i, (key, _, ts) in enumerate(batch):
+                out_entries.append((key, out_id, offset, i, ts))
+            batch.clear()
+
+        new_segments: list[int] = []
+        ordered = sorted(entries.items(), key=lambda item: (item[1][0], item[1][1]))
+        for key, (segment, offset, number, ts) in ordered:
+            if cutoff is not None and ts < cutoff:
+                continue
+            with self._lock:
+                line = self._read_block(segment, offset)[number]
+            batch.append((key, line, ts))
+            if len(batch) >= self.block_records:
+                write_batch()
+        if batch:
+            write_batch()
+        if out_file is not None:
+            out_file.close()
+
+        out_entries.sort(key=lambda e: e[0])
+        sorted_path = self._path(f"index-{generation}.sorted")
+        with open(sorted_path, "wb") as f:
+            f.writelines(_ENTRY.pack(*e) for e in out_entries)
+        new_sorted = _map_file(sorted_path) if out_entries else None
+
+        with self._lock:
+            old_segments = set(sealed)
+            if old_sorted is not None:
+                old_segments |= _segments_of(old_sorted)
+            self._manifest["generation"] = generation
+            self._manifest["sealed"] = [
+                s for s in self._manifest["sealed"] if s not in sealed
+            ]
+            self._sorted = new_sorted
+            self._recent = {k: w for k, w in self._recent.items() if w[0] not in sealed}
+            # index.log keeps only what the sorted index does not cover.
+            self._index_log.close()
+            with open(self._path("index.log.tmp"), "wb") as f:
+                f.writelines(_ENTRY.pack(k, *w) for k, w in self._recent.items())
+            os.replace(self._path("index.log.tmp"), self._path("index.log"))
+            self._index_log = open(self._path("index.log"), "ab")
+            self._save_manifest()
+            for segment in old_segments - set(new_segments):
+                m = self._maps.pop(segment, None)
+                if m is not None:
+                    m.close()
+                self._blocks = OrderedDict(
+                    (k, v) for k, v in self._blocks.items() if k[0] != segment
+                )
+                _remove(self._path(_segment_name(segment)))
+            if old_sorted is not None:
+                old_sorted[0].close()
+                _remove(self._path(f"index-{generation - 1}.sorted"))
+
+
+# ── Helpers ─────────────────────────────────────────────────────────────────
+def _segment_name(segment: int) -> str:
+    return f"seg-{segment:06d}.log"
+
+
+def _compress(codec: int, raw: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def _decompress(codec: int, packed: bytes, raw_len: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("this store has zstd blocks; install zstandard")
+        return zstandard.ZstdDecompressor().decompress(packed, max_output_size=raw_len)
+    return zlib.decompress(packed)
+
+
+def _map_file(path: str):
+    """(read-only mmap, entry count) — the count is only meaningful for
+    index files."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return None
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return m, size // _ENTRY.size
+
+
+def _search(sorted_index, key: bytes):
+    """Binary search of a sorted entry file for `key`."""
+    m, count = sorted_index
+    lo, hi = 0, count
+    size = _ENTRY.size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if m[mid * size : mid * size + 16] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < count and m[lo * size : lo * size + 16] == key:
+        return _ENTRY.unpack_from(m, lo * size)[1:]
+    return None
+
+
+def _segments_of(sorted_index) -> set[int]:
+    m, count = sorted_index
+    return {_ENTRY.unpack_from(m, i * _ENTRY.size)[1] for i in range(count)}
+
+
+def _lock_file(path: str):
+    """Open `path` holding an exclusive lock on it, or raise RuntimeError if
+    another open file (in this process or any other) holds it."""
+    f = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        raise RuntimeError(
+            f"{os.path.dirname(path)} is open in another TranscriptStore"
+        ) from None
+    return f
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
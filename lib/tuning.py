@@ -0,0 +1,261 @@
+# ── Ollama runtime-options sweeper ──────────────────────────────────────────
+# Throughput on a given box depends on per-request runtime options (num_ctx,
+# num_batch, num_thread, num_gpu) and on how many requests run at once. The
+# server's OLLAMA_NUM_PARALLEL is fixed when it starts; the client only
+# chooses how many requests it sends in parallel. The best setting differs
+# per model and per machine. This module measures the grid instead of
+# guessing:
+#
+#   points = await sweep(client, "llama3.2", "Summarise: ...",
+#                        grid={"num_ctx": [2048, 8192], "num_batch": [256, 512]},
+#                        concurrency=(1, 2, 4))
+#   front = pareto_front(points)          # throughput vs. p95 latency
+#   save_profile("llama3.2", choose(front, "balanced"), front,
+#                base_url=client.base_url)
+#
+# Every point streams `requests` generations through the normal client path
+# and reads Ollama's own counters from the final NDJSON record:
+# eval_count / eval_duration gives per-request decode speed, and total
+# eval tokens / wall time gives aggregate throughput.
+#
+# Saved profiles live in one JSON file keyed by server, then model: a result
+# measured on this box says nothing about another one. A client built with
+# `profiles=load_profiles()` picks its own server's profiles and merges a
+# profile's options into every request for that model; options passed
+# explicitly on a call still win. A client that creates its own scheduler
+# sizes it to the tuned concurrency (the smallest over the server's models,
+# so none is pushed past its tuned point).
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from urllib.parse import urlsplit
+
+DEFAULT_PROFILE_PATH = os.environ.get(
+    "LLM_ENG_PROFILES", os.path.expanduser("~/.cache/llm-eng/ollama-profiles.json")
+)
+
+
+@dataclass
+class SweepPoint:
+    options: dict
+    concurrency: int
+    requests: int
+    errors: int
+    throughput_tps: float  # eval tokens per wall-clock second, all requests
+    decode_tps: float  # median per-request eval_count / eval_duration
+    latency_p50: float
+    latency_p95: float
+    ttft_p50: float
+
+    def label(self) -> str:
+        opts = " ".join(f"{k}={v}" for k, v in self.options.items()) or "defaults"
+        return f"{opts} c={self.concurrency}"
+
+
+async def measure(
+    client,
+    model: str,
+    prompt: str,
+    options: dict,
+    concurrency: int,
+    requests: int,
+    *,
+    num_predict: int | None = 128,
+) -> SweepPoint:
+    """Run `requests` streams, `concurrency` at a time, with `options`."""
+    options = dict(options)
+    if num_predict is not None:
+        options.setdefault("num_predict", num_predict)  # comparable lengths
+    latencies, ttfts, decode, tokens = [], [], [], 0
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal tokens, errors
+        for _ in pending:
+            started = time.monotonic()
+            try:
+                async with client.stream(
+                    model, prompt, tenant="tune", options=options
+                ) as stream:
+                    async for _ in stream:
+                        pass
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.monotonic() - started)
+            final = stream.final or {}
+            if stream.ttft is not None:
+                ttfts.append(stream.ttft)
+            if final.get("eval_duration"):
+                decode.append(final["eval_count"] / (final["eval_duration"] / 1e9))
+            tokens += final.get("eval_count", 0)
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.monotonic() - started
+    return SweepPoint(
+        options={k: v for k, v in options.items() if k != "num_predict"},
+        concurrency=concurrency,
+        requests=requests,
+        errors=errors,
+        throughput_tps=tokens / wall if wall else 0.0,
+        decode_tps=statistics.median(decode) if decode else 0.0,
+        latency_p50=_quantile(latencies, 0.50),
+        latency_p95=_quantile(latencies, 0.95),
+        ttft_p50=_quantile(ttfts, 0.50),
+    )
+
+
+async def sweep(
+    client,
+    model: str,
+    prompt: str,
+    *,
+    grid: dict[str, list] | None = None,
+    concurrency: tuple[int, ...] = (1, 2, 4),
+    requests: int = 8,
+    num_predict: int | None = 128,
+    progress=None,
+) -> list[SweepPoint]:
+    """Measure every combination of `grid` options × `concurrency` level.
+
+    Each options combination starts with one unmeasured warm-up request,
+    because changing num_ctx/num_gpu makes Ollama reload the model. The
+    client's scheduler must admit at least ``max(concurrency)`` requests.
+
+    Args:
+        grid: option name → values, e.g. ``{"num_ctx": [2048, 4096]}``.
+        requests: measured requests per point.
+        num_predict: cap on generated tokens so points are comparable.
+        progress: optional callable, called with each finished `SweepPoint`.
+    """
+    grid = grid or {}
+    points = []
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        options = dict(zip(names, values))
+        await measure(client, model, prompt, options, 1, 1, num_predict=8)
+        for level in concurrency:
+            point = await measure(
+                client, model, prompt, options, level, requests, num_predict=num_predict
+            )
+            points.append(point)
+            if progress is not None:
+                progress(point)
+    return points
+
+
+def pareto_front(points: list[SweepPoint]) -> list[SweepPoint]:
+    """Points no other point beats on both throughput (higher) and p95
+    latency (lower), sorted by latency. Points with errors are skipped."""
+    ok = [p for p in points if not p.errors and p.throughput_tps > 0]
+    ok.sort(key=lambda p: (p.latency_p95, -p.throughput_tps))
+    front, best = [], -1.0
+    for point in ok:
+        if point.throughput_tps > best:
+            front.append(point)
+            best = point.throughput_tps
+    return front
+
+
+def choose(
+    front: list[SweepPoint], goal: str = "balanced", *, slack: float = 1.5
+) -> SweepPoint:
+    """Pick one point: "throughput" (highest), "latency" (lowest p95) or
+    "balanced" (highest throughput within `slack` × the lowest p95)."""
+    if not front:
+        raise ValueError("no successful sweep points")
+    if goal == "throughput":
+        return max(front, key=lambda p: p.throughput_tps)
+    if goal == "latency":
+        return front[0]
+    if goal != "balanced":
+        raise ValueError(f"unknown goal {goal!r}")
+    limit = front[0].latency_p95 * slack
+    return max(
+        (p for p in front if p.latency_p95 <= limit), key=lambda p: p.throughput_tps
+    )
+
+
+# ── Profiles ────────────────────────────────────────────────────────────────
+def host_key(base_url: str) -> str:
+    """A server URL normalised for profile lookup: ``scheme://host:port``."""
+    if "://" not in base_url:  # OLLAMA_HOST is often just host:port
+        base_url = f"http://{base_url}"
+    parts = urlsplit(base_url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+def load_profiles(path: str = DEFAULT_PROFILE_PATH) -> dict[str, dict[str, dict]]:
+    """Server → model → profile, or {} if nothing has been tuned yet.
+
+    Entries from the older model-keyed format carry no server, so they are
+    skipped rather than applied to whichever server a client points at.
+    """
+    try:
+        with open(path) as f:
+            profiles = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {
+        host: models
+        for host, models in profiles.items()
+        if "://" in host and isinstance(models, dict)
+    }
+
+
+def profiles_for(profiles: dict[str, dict[str, dict]], base_url: str) -> dict:
+    """Model → profile for one server, from a `load_profiles()` result."""
+    return profiles.get(host_key(base_url), {})
+
+
+def tuned_concurrency(profiles: dict[str, dict], model: str | None = None):
+    """Tuned request concurrency from one server's profiles: `model`'s, or
+    the smallest over all models when `model` is None or untuned. None if
+    the server has no profiles."""
+    if model in profiles:
+        return profiles[model]["concurrency"]
+    levels = [p["concurrency"] for p in profiles.values() if p.get("concurrency")]
+    return min(levels) if levels else None
+
+
+def save_profile(
+    model: str,
+    chosen: SweepPoint,
+    front: list[SweepPoint] = (),
+    *,
+    base_url: str,
+    goal: str = "balanced",
+    path: str = DEFAULT_PROFILE_PATH,
+) -> dict:
+    """Store `chosen` as `model`'s profile on the server at `base_url`
+    (replacing any previous one)."""
+    profiles = load_profiles(path)
+    models = profiles.setdefault(host_key(base_url), {})
+    models[model] = {
+        "options": chosen.options,
+        "concurrency": chosen.concurrency,
+        "goal": goal,
+        "measured": asdict(chosen),
+        "pareto": [asdict(p) for p in front],
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, path)
+    return models[model]
+
+
+def _quantile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))]
@@ -0,0 +1,347 @@
+# ── Lease-based work queue for multi-process batch runs ─────────────────────
+# One asyncio loop tops out on one core (JSON parsing, bookkeeping). For big
+# evaluation runs, split the jobs into shards in a SQLite queue and point N
+# worker processes — on this host or on others sharing the file — at it:
+#
+#   queue = WorkQueue("runs/eval.sqlite")
+#   queue.enqueue(jobs, shard_size=50)
+#   run_workers("runs/eval.sqlite", processes=4, concurrency=4)
+#   queue.merge("results.jsonl")          # one output, in job order
+#
+# A worker *leases* a shard and bumps the shard's heartbeat counter every
+# `lease_seconds / 3` while it works. If the worker dies, the counter stops
+# moving; a worker that has watched it stand still for `lease_seconds` (on
+# its own monotonic clock) takes the shard over. No wall-clock timestamps
+# are compared, so clock skew between hosts can neither re-issue a live
+# lease nor keep a dead one. (SQLite's `julianday('now')` would not help:
+# SQLite runs inside each worker process and reads that host's clock.) A
+# fresh worker has watched nothing yet, so it waits one lease period before
+# taking over a dead worker's shard. Once `max_attempts` leases have expired
+# on a shard, it is marked failed instead. A late result from a worker whose
+# lease was re-issued is rejected, so each shard is stored exactly once.
+#
+# SQLite runs in WAL mode and every state change is one short IMMEDIATE
+# transaction. Across machines the file must live on a filesystem with
+# working POSIX locks; NFS and SMB often lack them.
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id          INTEGER PRIMARY KEY,
+    jobs        TEXT NOT NULL,              -- JSON [[index, job], ...]
+    status      TEXT NOT NULL DEFAULT 'pending',
+    worker      TEXT,
+    beat        INTEGER NOT NULL DEFAULT 0, -- bumped by lease and heartbeats
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    results     TEXT,                       -- JSON [[index, result], ...]
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS shards_by_status ON shards (status);
+"""
+
+
+@dataclass
+class Shard:
+    id: int
+    jobs: list[tuple[int, dict]]  # (global job index, job)
+    attempt: int
+
+
+class WorkQueue:
+    """SQLite-backed shard queue with leases.
+
+    Args:
+        path: database file; created on first use.
+        lease_seconds: how long a lease survives without a heartbeat.
+        max_attempts: leases a shard may expire through before it is failed.
+    """
+
+    def __init__(
+        self, path: str, *, lease_seconds: float = 60.0, max_attempts: int = 3
+    ) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # shard id → (heartbeat counter, monotonic time it was first seen)
+        self._seen: dict[int, tuple[int, float]] = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(shards)")}
+            if "beat" not in columns:  # queue created by an older version
+                db.execute(
+                    "ALTER TABLE shards ADD COLUMN beat INTEGER NOT NULL DEFAULT 0"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _transaction(self, fn):
+        """Run `fn(db)` in one IMMEDIATE transaction (takes the write lock
+        up front, so two workers never lease the same shard)."""
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return result
+
+    # ── Producer ────────────────────────────────────────────────────────────
+    def enqueue(self, jobs, shard_size: int = 50) -> int:
+        """Append `jobs` in shards of `shard_size`; return the shard count.
+        Job indexes continue from any jobs already in the queue."""
+
+        def insert(db):
+            (start,) = db.execute(
+                "SELECT COALESCE(SUM(json_array_length(jobs)), 0) FROM shards"
+            ).fetchone()
+            indexed = list(enumerate(jobs, start))
+            rows = [
+                (json.dumps(indexed[i : i + shard_size]),)
+                for i in range(0, len(indexed), shard_size)
+            ]
+            db.executemany("INSERT INTO shards (jobs) VALUES (?)", rows)
+            return len(rows)
+
+        return self._transaction(insert)
+
+    # ── Worker side ─────────────────────────────────────────────────────────
+    def lease(self, worker: str) -> Shard | None:
+        """Take the next pending (or expired) shard, or None if none is left."""
+
+        def take(db):
+            expired = self._expired(db)
+            dead = [i for i, attempts in expired if attempts >= self.max_attempts]
+            db.executemany(
+                "UPDATE shards SET status = 'failed', error = 'lease expired "
+                "too often', worker = NULL WHERE id = ?",
+                [(i,) for i in dead],
+            )
+            row = db.execute(
+                "SELECT id FROM shards WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            candidates = [i for i, a in expired if a < self.max_attempts]
+            if row is not None:
+                candidates.append(row[0])
+            if not candidates:
+                return None
+            shard_id = min(candidates)
+            (jobs, attempts) = db.execute(
+                "UPDATE shards SET status = 'leased', worker = ?, beat = beat + 1, "
+                "attempts = attempts + 1 WHERE id = ? RETURNING jobs, attempts",
+                (worker, shard_id),
+            ).fetchone()
+            self._seen.pop(shard_id, None)
+            return Shard(shard_id, [tuple(j) for j in json.loads(jobs)], attempts)
+
+        return self._transaction(take)
+
+    def _expired(self, db) -> list[tuple[int, int]]:
+        """(id, attempts) of leased shards whose heartbeat counter this
+        queue object has seen stand still for `lease_seconds`."""
+        now = time.monotonic()
+        seen, expired, leased = self._seen, [], set()
+        for shard_id, beat, attempts in db.execute(
+            "SELECT id, beat, attempts FROM shards WHERE status = 'leased'"
+        ):
+            leased.add(shard_id)
+            last = seen.get(shard_id)
+            if last is None or last[0] != beat:
+                seen[shard_id] = (beat, now)
+            elif now - last[1] >= self.lease_seconds:
+                expired.append((shard_id, attempts))
+        for shard_id in seen.keys() - leased:
+            del seen[shard_id]
+        return expired
+
+    def heartbeat(self, shard_id: int, worker: str) -> bool:
+        """Extend the lease; False if `worker` no longer holds it."""
+        with closing(self._connect()) as db:
+            cur = db.execute(
+                "UPDATE shards SET beat = beat + 1 WHERE id = ? AND worker = ? "
+                "AND status = 'leased'",
+                (shard_id, worker),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, shard_id: int, worker: str, results: list) -> bool:
+        """Store a shard's results; False (and nothing stored) if the lease
+        was lost to another worker in the meantime."""
+        with closing(self._connect()) as db:
+            cur = db.execute(
+                "UPDATE shards SET status = 'done', results = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (json.dumps(results), shard_id, worker),
+            )
+            return cur.rowcount == 1
+
+    def release(self, shard_id: int, worker: str, error: str) -> None:
+        """Give a shard back after an error (failed after `max_attempts`)."""
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' "
+                "ELSE 'pending' END, error = ?, worker = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, shard_id, worker),
+            )
+
+    # ── Progress and output ─────────────────────────────────────────────────
+    def status(self) -> dict[str, int]:
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT status, COUNT(*) FROM shards GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def finished(self) -> bool:
+        counts = self.status()
+        return not counts.get("pending") and not counts.get("leased")
+
+    def results(self):
+        """Yield ``(index, result)`` for every finished job, in job order."""
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT results FROM shards WHERE status = 'done' ORDER BY id"
+            ).fetchall()
+        pairs = [tuple(pair) for (results,) in rows for pair in json.loads(results)]
+        pairs.sort(key=lambda pair: pair[0])
+        yield from pairs
+
+    def merge(self, out) -> int:
+        """Write all results as JSONL (`out` is a path or a text file);
+        return the number of rows written."""
+        if isinstance(out, str):
+            with open(out, "w") as f:
+                return self.merge(f)
+        n = 0
+        for index, result in self.results():
+            out.write(json.dumps({"index": index, "result": result}) + "\n")
+            n += 1
+        return n
+
+
+# ── Workers ─────────────────────────────────────────────────────────────────
+async def work(
+    queue: WorkQueue,
+    client,
+    *,
+    worker: str | None = None,
+    stream: bool = False,
+    idle_exit: bool = True,
+    poll_seconds: float = 2.0,
+) -> int:
+    """Lease shards and run them through `client` until the queue is drained;
+    return the number of shards completed.
+
+    With `idle_exit=False` the worker keeps polling for new shards (and for
+    leases expiring from dead workers) instead of exiting.
+    """
+    from lib.batch import run_batch
+
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    done = 0
+    while True:
+        shard = await asyncio.to_thread(queue.lease, worker)
+        if shard is None:
+            if idle_exit and await asyncio.to_thread(queue.finished):
+                return done
+            await asyncio.sleep(poll_seconds)
+            continue
+
+        batch = asyncio.ensure_future(
+            run_batch(
+                client,
+                [job for _, job in shard.jobs],
+                stream=stream,
+                return_exceptions=True,
+            )
+        )
+        beat = asyncio.ensure_future(_heartbeat(queue, shard.id, worker, batch))
+        try:
+            results = await batch
+        except asyncio.CancelledError:
+            if beat.done():  # the lease was lost; someone else has the shard
+                continue
+            raise
+        except Exception as exc:
+            await asyncio.to_thread(
+                queue.release, shard.id, worker, f"{type(exc).__name__}: {exc}"
+            )
+            continue
+        finally:
+            beat.cancel()
+
+        rows = [
+            (index, _jsonable(result))
+            for (index, _), result in zip(shard.jobs, results)
+        ]
+        if await asyncio.to_thread(queue.complete, shard.id, worker, rows):
+            done += 1
+
+
+async def _heartbeat(queue: WorkQueue, shard_id: int, worker: str, batch) -> None:
+    """Extend the lease every third of its length; cancel `batch` if lost."""
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not await asyncio.to_thread(queue.heartbeat, shard_id, worker):
+            batch.cancel()
+            return
+
+
+def _jsonable(result):
+    if isinstance(result, BaseException):
+        return {"error": f"{type(result).__name__}: {result}"}
+    return result
+
+
+def run_workers(
+    path: str,
+    processes: int = 2,
+    *,
+    base_url: str | None = None,
+    concurrency: int | None = None,
+    stream: bool = False,
+    lease_seconds: float = 60.0,
+) -> int:
+    """Start `processes` worker processes on this host and wait for them;
+    return the number of shards they completed. `concurrency` is per
+    process; None takes the tuned profile's (see `lib.tuning`), else 4."""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes) as pool:
+        counts = pool.starmap(
+            _worker_main,
+            [(path, base_url, concurrency, stream, lease_seconds)] * processes,
+        )
+    return sum(counts)
+
+
+def _worker_main(path, base_url, concurrency, stream, lease_seconds) -> int:
+    from lib.client import DEFAULT_BASE_URL, AsyncOllamaClient
+    from lib.scheduler import RequestScheduler
+    from lib.tuning import load_profiles
+
+    async def main() -> int:
+        queue = WorkQueue(path, lease_seconds=lease_seconds)
+        async with AsyncOllamaClient(
+            base_url or DEFAULT_BASE_URL,
+            scheduler=RequestScheduler(concurrency) if concurrency else None,
+            profiles=load_profiles(),
+        ) as client:
+            return await work(queue, client, stream=stream)
+
+    return asyncio.run(main())
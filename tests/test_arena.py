@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from lib.arena import run_arena
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    if request.url.path == "/api/generate":
+        lines = [
+            {"response": body["prompt"].upper(), "done": False},
+            {"done": True, "prompt_eval_count": 3, "eval_count": 1},
+        ]
+        content = b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+        return httpx.Response(200, content=content)
+    text = body["messages"][-1]["content"]
+    events = [
+        {"choices": [{"delta": {"content": text}}]},
+        {"choices": [], "usage": {"prompt_tokens": 4, "completion_tokens": 1}},
+    ]
+    content = b"".join(b"data: " + json.dumps(e).encode() + b"\n\n" for e in events)
+    return httpx.Response(200, content=content + b"data: [DONE]\n\n")
+
+
+def test_rows_for_every_target_and_prompt(tmp_path):
+    rows = asyncio.run(
+        run_arena(
+            ["ollama:m", "ollama"],
+            ["a", "b"],
+            out_dir=str(tmp_path),
+            transport=httpx.MockTransport(_handler),
+        )
+    )
+    by_key = {(r["target"], r["prompt_id"]): r for r in rows}
+    assert len(by_key) == 4
+    assert by_key[("ollama:m", 1)]["text"] == "B"
+    assert by_key[("ollama:m", 1)]["completion_tokens"] == 1
+    assert by_key[("ollama", 0)]["model"] == "llama3.2"
+    assert all(r["error"] is None and r["ttft_s"] is not None for r in rows)
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    (path,) = tmp_path.glob("arena-*.parquet")
+    table = pq.read_table(path)
+    assert table.num_rows == 4
+    assert sorted(table.column("text").to_pylist()) == ["A", "A", "B", "B"]
+
+
+def test_broken_targets_become_error_rows(monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    closed = []
+    original = httpx.AsyncClient.aclose
+
+    async def aclose(self):
+        closed.append(self)
+        await original(self)
+
+    monkeypatch.setattr(httpx.AsyncClient, "aclose", aclose)
+    rows = asyncio.run(
+        run_arena(
+            ["groq", "nosuch:model", "ollama:m"],
+            ["hi"],
+            out_dir=None,
+            transport=httpx.MockTransport(_handler),
+        )
+    )
+    by_target = {r["target"]: r for r in rows}
+    assert "GROQ_API_KEY" in by_target["groq"]["error"]
+    assert by_target["nosuch:model"]["error"].startswith("KeyError")
+    assert by_target["nosuch:model"]["model"] == "model"
+    assert by_target["ollama:m"]["text"] == "HI"
+    assert len(closed) == 1  # the one client that opened
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from lib.batch import iter_batch, run_batch
+from lib.client import AsyncOllamaClient
+from lib.loadgen import FakeOllamaTransport
+from lib.scheduler import RequestScheduler
+
+
+def _client(slots=2):
+    fake = FakeOllamaTransport(slots, ttft=0.001, tokens=2, tokens_per_s=1000.0)
+    return AsyncOllamaClient(
+        "http://fake", scheduler=RequestScheduler(slots), transport=fake
+    )
+
+
+class _Jobs:
+    """Job iterator that counts how many jobs were pulled."""
+
+    def __init__(self, n):
+        self.n = n
+        self.pulled = 0
+
+    def __iter__(self):
+        for i in range(self.n):
+            self.pulled += 1
+            yield {"model": "m", "prompt": f"job {i}"}
+
+
+def test_run_batch_keeps_job_order():
+    async def main():
+        async with _client() as client:
+            return await run_batch(client, _Jobs(10), stream=True, window=3)
+
+    results = asyncio.run(main())
+    assert len(results) == 10
+    assert all(r["done"] and r["response"] == "x x " for r in results)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_window_bounds_jobs_in_flight(ordered):
+    async def main():
+        jobs = _Jobs(50)
+        seen, worst = set(), 0
+        async with _client() as client:
+            async for i, _ in iter_batch(client, jobs, window=4, ordered=ordered):
+                seen.add(i)
+                worst = max(worst, jobs.pulled - len(seen))
+        return seen, worst
+
+    seen, worst = asyncio.run(main())
+    assert seen == set(range(50))
+    assert worst <= 4
+
+
+def test_full_stage_stops_generation():
+    class StuckStage:
+        def __init__(self):
+            self.gate = asyncio.Event()
+            self.entered = 0
+
+        async def submit(self, item):
+            self.entered += 1
+            await self.gate.wait()
+            return item["response"]
+
+    async def main():
+        jobs, stage = _Jobs(100), StuckStage()
+        async with _client() as client:
+            results = asyncio.ensure_future(
+                run_batch(client, jobs, stage=stage, window=8)
+            )
+            await asyncio.sleep(0.2)
+            pulled = jobs.pulled
+            stage.gate.set()
+            return pulled, await results
+
+    pulled, results = asyncio.run(main())
+    assert pulled == 8
+    assert len(results) == 100
+
+
+def test_return_exceptions():
+    async def main():
+        jobs = [{"model": "m", "prompt": "ok"}, {"prompt": "no model"}]
+        async with _client() as client:
+            results = await run_batch(client, jobs, return_exceptions=True)
+            with pytest.raises(KeyError):
+                await run_batch(client, jobs)
+        return results
+
+    ok, failed = asyncio.run(main())
+    assert ok["done"] and isinstance(failed, KeyError)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from lib.cassette import Cassette, CassetteMiss
+
+LINES = [
+    {"response": "Hello", "done": False},
+    {"response": " world", "done": False},
+    {"done": True, "eval_count": 2},
+]
+
+
+def _ollama(request: httpx.Request) -> httpx.Response:
+    async def body():
+        for line in LINES:
+            yield json.dumps(line).encode() + b"\n"
+
+    return httpx.Response(200, content=body())
+
+
+def _recording_client(cassette):
+    inner = httpx.MockTransport(_ollama)
+    return httpx.AsyncClient(
+        base_url="http://ollama", transport=cassette.recording_transport(inner)
+    )
+
+
+async def _read_lines(client, prompt, limit=None):
+    records = []
+    async with client.stream(
+        "POST", "/api/generate", json={"prompt": prompt}
+    ) as response:
+        async for line in response.aiter_lines():
+            records.append(json.loads(line))
+            if len(records) == limit:
+                break
+    return records
+
+
+def test_record_then_replay(tmp_path):
+    path = tmp_path / "c.jsonl.gz"
+
+    async def record():
+        async with _recording_client(Cassette(path)) as client:
+            return await _read_lines(client, "hi")
+
+    recorded = asyncio.run(record())
+    assert recorded == LINES
+
+    async def replay():
+        transport = Cassette(path).replay_transport(speed=0)
+        async with httpx.AsyncClient(
+            base_url="http://ollama", transport=transport
+        ) as client:
+            return await _read_lines(client, "hi")
+
+    assert asyncio.run(replay()) == LINES
+
+
+def test_sync_replay_and_miss(tmp_path):
+    path = tmp_path / "c.jsonl.gz"
+
+    async def record():
+        async with _recording_client(Cassette(path)) as client:
+            await _read_lines(client, "hi")
+
+    asyncio.run(record())
+    with httpx.Client(
+        base_url="http://ollama", transport=Cassette(path).sync_replay_transport(0)
+    ) as client:
+        response = client.post("/api/generate", json={"prompt": "hi"})
+        assert [json.loads(x) for x in response.text.splitlines()] == LINES
+        with pytest.raises(CassetteMiss):
+            client.post("/api/generate", json={"prompt": "other"})
+
+
+def test_match_on_path_replays_any_body(tmp_path):
+    path = tmp_path / "c.jsonl.gz"
+
+    async def record():
+        async with _recording_client(Cassette(path)) as client:
+            await _read_lines(client, "hi")
+
+    asyncio.run(record())
+    cassette = Cassette(path, match_on=("method", "path"))
+    with httpx.Client(
+        base_url="http://ollama", transport=cassette.sync_replay_transport(0)
+    ) as client:
+        assert client.post("/api/generate", json={"prompt": "x"}).status_code == 200
+
+
+def test_stopping_at_final_record_is_recorded(tmp_path):
+    cassette = Cassette(tmp_path / "c.jsonl.gz")
+
+    async def main():
+        async with _recording_client(cassette) as client:
+            await _read_lines(client, "hi", limit=len(LINES))
+
+    asyncio.run(main())
+    assert len(cassette) == 1 and cassette.incomplete == 0
+
+
+def test_truncated_stream_is_not_recorded(tmp_path):
+    path = tmp_path / "c.jsonl.gz"
+    cassette = Cassette(path)
+
+    async def main():
+        async with _recording_client(cassette) as client:
+            await _read_lines(client, "hi", limit=1)
+
+    asyncio.run(main())
+    assert len(cassette) == 0
+    assert cassette.incomplete == 1
+    assert len(Cassette(path)) == 0
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+import httpx
+import pytest
+
+import lib.tuning
+from lib import cli
+from lib.cassette import Cassette
+from lib.client import AsyncOllamaClient
+
+
+def _ollama(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    text = body["prompt"].upper()
+    if not body["stream"]:
+        return httpx.Response(200, json={"response": text, "done": True})
+    lines = [{"response": text, "done": False}] if text != "EMPTY" else []
+    lines.append({"done": True, "eval_count": len(lines)})
+    content = b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+    return httpx.Response(200, content=content)
+
+
+def _record(path, prompts, stream=False):
+    """Record the exchanges the CLI will replay (it matches on the body)."""
+
+    async def main():
+        cassette = Cassette(path, match_on=("method", "path", "body"))
+        transport = cassette.recording_transport(httpx.MockTransport(_ollama))
+        async with AsyncOllamaClient("http://rec", transport=transport) as client:
+            for prompt in prompts:
+                if stream:
+                    await client.stream_text("m", prompt)
+                else:
+                    await client.generate("m", prompt)
+
+    asyncio.run(main())
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def _no_tuned_profiles(monkeypatch):
+    monkeypatch.setattr(lib.tuning, "load_profiles", lambda *a, **k: {})
+
+
+def test_import_stays_lazy():
+    code = (
+        "import sys, lib.cli; "
+        "print(sorted(m for m in ('httpx', 'numpy', 'lib.client') if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert proc.stdout.strip() == "[]"
+
+
+def test_parser_dispatch():
+    parser = cli._build_parser()
+    args = parser.parse_args(["generate", "m", "hi", "--replay", "c.jsonl.gz"])
+    assert args.func is cli._cmd_generate
+    assert (args.model, args.prompt, args.replay) == ("m", "hi", "c.jsonl.gz")
+    args = parser.parse_args(["batch", "jobs.jsonl", "--replay", "c.jsonl.gz"])
+    assert args.func is cli._cmd_batch
+    assert args.ordered and args.concurrency is None
+    with pytest.raises(SystemExit):
+        parser.parse_args(["generate"])
+
+
+def test_generate_from_replay(tmp_path, capsys):
+    cassette = _record(tmp_path / "c.jsonl.gz", ["hi"])
+    assert cli.main(["generate", "m", "hi", "--replay", cassette]) == 0
+    assert capsys.readouterr().out == "HI\n"
+
+
+def test_stream_stats_without_a_first_token(tmp_path, capsys):
+    cassette = _record(tmp_path / "c.jsonl.gz", ["empty"], stream=True)
+    assert cli.main(["stream", "m", "empty", "--stats", "--replay", cassette]) == 0
+    assert "ttft=n/a" in capsys.readouterr().err
+
+
+def test_batch_from_replay(tmp_path):
+    cassette = _record(tmp_path / "c.jsonl.gz", ["a", "b", "c"])
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text("".join(json.dumps({"prompt": p}) + "\n" for p in "abc"))
+    out = tmp_path / "out.jsonl"
+    argv = ["batch", str(jobs), "--model", "m", "--out", str(out), "--replay"]
+    assert cli.main([*argv, cassette, "--concurrency", "2"]) == 0
+    results = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert [r["result"]["response"] for r in results] == ["A", "B", "C"]
+
+
+@pytest.mark.parametrize("extra", [["--stream"], ["--stage", "m:f"], ["--window", "8"]])
+def test_prefix_plan_rejects_options_it_ignores(extra, capsys):
+    with pytest.raises(SystemExit) as info:
+        cli.main(["batch", "jobs.jsonl", "--prefix-plan", *extra])
+    assert info.value.code == 2
+    assert extra[0] in capsys.readouterr().err
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from lib.fanout import StreamTee
+
+
+async def _source(n, fail_after=None):
+    for i in range(n):
+        if i == fail_after:
+            raise RuntimeError("source failed")
+        await asyncio.sleep(0)
+        yield i
+
+
+async def _read(consumer):
+    return [chunk async for chunk in consumer]
+
+
+async def _read_n(consumer, n):
+    return [await consumer.__anext__() for _ in range(n)]
+
+
+def test_every_consumer_sees_every_chunk():
+    async def main():
+        async with StreamTee(_source(50)) as tee:
+            a, b = tee.attach(), tee.attach(maxsize=2)
+            return await asyncio.gather(_read(a), _read(b))
+
+    a, b = asyncio.run(main())
+    assert a == b == list(range(50))
+
+
+def test_block_policy_holds_the_pump():
+    async def main():
+        async with StreamTee(_source(20)) as tee:
+            slow = tee.attach(maxsize=4)
+            await asyncio.sleep(0.01)
+            stalled_at = tee.head
+            return stalled_at, await _read(slow), tee.head
+
+    stalled_at, chunks, head = asyncio.run(main())
+    assert stalled_at == 4
+    assert chunks == list(range(20))
+    assert head == 20
+
+
+def test_drop_policy_skips_oldest_without_slowing_others():
+    async def main():
+        async with StreamTee(_source(20)) as tee:
+            fast = tee.attach()
+            meter = tee.attach(policy="drop", maxsize=4)
+            chunks = await _read(fast)
+            return chunks, await _read(meter), meter.dropped
+
+    fast, meter, dropped = asyncio.run(main())
+    assert fast == list(range(20))
+    assert meter == [16, 17, 18, 19]
+    assert dropped == 16
+
+
+def test_spill_policy_keeps_order_and_bounds_the_log():
+    async def main():
+        async with StreamTee(_source(20), history=0) as tee:
+            log = tee.attach(policy="spill", maxsize=4)
+            await tee.wait()
+            in_memory = len(tee._log)
+            return in_memory, log.spilled, await _read(log), log.lag
+
+    in_memory, spilled, chunks, lag = asyncio.run(main())
+    assert in_memory == 4
+    assert spilled == 16
+    assert chunks == list(range(20))
+    assert lag == 0
+
+
+def test_replay_and_history():
+    async def main():
+        async with StreamTee(_source(10), history=3) as tee:
+            await tee.wait()
+            late = tee.attach(replay=True)
+            new = tee.attach()
+            return await _read(late), await _read(new)
+
+    late, new = asyncio.run(main())
+    assert late == [7, 8, 9]
+    assert new == []
+
+    async def full():
+        async with StreamTee(_source(10)) as tee:
+            await tee.wait()
+            return await _read(tee.attach(replay=True))
+
+    assert asyncio.run(full()) == list(range(10))
+
+
+def test_closed_consumer_does_not_block():
+    async def main():
+        async with StreamTee(_source(20)) as tee:
+            stuck = tee.attach(maxsize=2)
+            reader = tee.attach()
+            chunks = await _read_n(reader, 1)
+            stuck.close()
+            return chunks + await _read(reader)
+
+    assert asyncio.run(main()) == list(range(20))
+
+
+def test_source_error_reaches_every_consumer():
+    async def main():
+        async with StreamTee(_source(10, fail_after=3)) as tee:
+            a, b = tee.attach(), tee.attach(policy="spill", maxsize=1)
+            return await asyncio.gather(_read(a), _read(b), return_exceptions=True)
+
+    results = asyncio.run(main())
+    for result in results:
+        assert isinstance(result, RuntimeError)
+
+
+def test_unknown_policy():
+    async def main():
+        async with StreamTee(_source(1)) as tee:
+            with pytest.raises(ValueError):
+                tee.attach(policy="queue")
+
+    asyncio.run(main())
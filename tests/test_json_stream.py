@@ -0,0 +1,107 @@
+import json
+import random
+
+import pytest
+
+from lib.json_stream import (
+    JSONStreamError,
+    JSONStreamParser,
+    SchemaViolation,
+    validate,
+)
+
+DOC = {
+    "title": 'He said "hi" \\ then ☃ left\n',
+    "count": -12.5e3,
+    "ok": True,
+    "none": None,
+    "items": [
+        {"name": "a", "tags": ["x", "y"]},
+        {"name": "b]}", "tags": []},
+        [],
+        {},
+    ],
+    "nested": {"deep": {"deeper": [1, 2, [3, {"k": "v"}]]}},
+}
+
+SCHEMA = {
+    "type": "object",
+    "required": ["title", "items"],
+    "properties": {
+        "title": {"type": "string"},
+        "count": {"type": "number"},
+        "ok": {"type": "boolean"},
+        "items": {"type": "array", "maxItems": 4},
+    },
+}
+
+
+def _split(text: str, rng: random.Random) -> list[str]:
+    cuts = sorted(rng.randint(0, len(text)) for _ in range(rng.randint(0, 60)))
+    edges = [0, *cuts, len(text)]
+    return [text[a:b] for a, b in zip(edges, edges[1:])]
+
+
+def _parse(chunks, schema=None, depth=1):
+    parser = JSONStreamParser(schema, depth=depth)
+    events = []
+    for chunk in chunks:
+        events += parser.feed(chunk)
+    events += parser.close()
+    return parser, events
+
+
+def _expected(value, depth, path=()):
+    """(path, value) pairs in the order the parser closes them."""
+    out = []
+    if len(path) < depth and isinstance(value, (dict, list)):
+        children = value.items() if isinstance(value, dict) else enumerate(value)
+        for key, child in children:
+            out += _expected(child, depth, (*path, key))
+    out.append((path, value))
+    return out
+
+
+@pytest.mark.parametrize("depth", [0, 1, 2, 3])
+@pytest.mark.parametrize("seed", range(25))
+@pytest.mark.parametrize("indent", [None, 2])
+def test_random_chunking(seed, depth, indent):
+    text = json.dumps(DOC, indent=indent, ensure_ascii=seed % 2 == 0)
+    parser, events = _parse(_split(text, random.Random(seed)), SCHEMA, depth)
+    assert parser.done and parser.value == DOC
+    assert events == _expected(DOC, depth)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_bare_scalars(seed):
+    for text in ["42", "-0.5e-3", "true", "null", '"s"']:
+        parser, events = _parse(_split(text, random.Random(seed)))
+        assert events == [((), json.loads(text))]
+
+
+def test_schema_violation_at_first_bad_field():
+    parser = JSONStreamParser(SCHEMA)
+    parser.feed('{"title": "t", ')
+    with pytest.raises(SchemaViolation) as info:
+        parser.feed('"count": "many", "items": [')
+    assert info.value.path == ("count",)
+
+
+def test_required_and_max_items():
+    with pytest.raises(SchemaViolation):
+        _parse(['{"title": "t"}'], SCHEMA)
+    with pytest.raises(SchemaViolation):
+        _parse(['{"title": "t", "items": [1, 2, 3, 4, 5]}'], SCHEMA)
+
+
+def test_invalid_and_truncated_json():
+    with pytest.raises(JSONStreamError):
+        _parse(['{"a": 1,, "b": 2}'])
+    with pytest.raises(JSONStreamError):
+        _parse(['{"a": [1, 2'])
+
+
+def test_validate():
+    validate(DOC, SCHEMA)
+    with pytest.raises(SchemaViolation):
+        validate({"title": 1, "items": []}, SCHEMA)
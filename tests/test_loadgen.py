@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import time
+
+import pytest
+
+from lib.loadgen import (
+    LogHistogram,
+    constant_arrivals,
+    poisson_arrivals,
+    run_load,
+)
+
+
+def test_histogram_percentiles_within_bucket_error():
+    np = pytest.importorskip("numpy")
+    values = np.random.default_rng(7).lognormal(mean=-2.0, sigma=1.0, size=20_000)
+    h = LogHistogram(precision=0.01)
+    for v in values:
+        h.record(float(v))
+    for p in (1, 50, 90, 99, 99.9):
+        exact = np.percentile(values, p, method="inverted_cdf")  # nearest rank
+        assert exact <= h.percentile(p) <= exact * 1.01 + 1e-12, p
+    assert h.count == len(values)
+    assert h.mean == pytest.approx(values.mean())
+    assert h.percentile(100) == h.max == values.max()
+
+
+def test_histogram_merge_and_empty():
+    a, b, both = LogHistogram(), LogHistogram(), LogHistogram()
+    for i in range(1, 200):
+        (a if i % 3 else b).record(i / 1000)
+        both.record(i / 1000)
+    a.merge(b)
+    assert a.summary() == both.summary()
+    empty = LogHistogram()
+    assert empty.percentile(50) is None and empty.mean is None
+
+
+def test_arrival_schedules():
+    assert list(itertools.islice(constant_arrivals(4), 3)) == [0.25, 0.5, 0.75]
+    gaps = list(itertools.islice(poisson_arrivals(50, seed=1), 20_000))
+    assert gaps == list(itertools.islice(poisson_arrivals(50, seed=1), 20_000))
+    assert gaps[-1] / len(gaps) == pytest.approx(1 / 50, rel=0.03)
+
+
+def test_response_time_counts_queueing_behind_a_slow_server():
+    # One server slot at 50 ms per request, offered 40 rps: each request
+    # queues 25 ms longer than the one before.
+    async def main():
+        slot = asyncio.Lock()
+
+        async def send():
+            async with slot:
+                await asyncio.sleep(0.05)
+
+        return await run_load(send, rps=40, duration=0.25, arrivals="constant")
+
+    report = asyncio.run(main())
+    total = report.total()
+    assert (total.sent, total.ok, total.errors) == (9, 9, 0)
+    # The ninth is due at 225 ms; the server, busy from 25 ms on, finishes
+    # it at 25 + 9 x 50 = 475 ms. A closed loop would have reported 50 ms.
+    assert total.response.max == pytest.approx(0.25, abs=0.03)
+    assert total.service.max == pytest.approx(0.25, abs=0.03)  # queued in send
+    assert total.response.percentile(0) < 0.07
+    assert [w.sent for w in report.windows] == [9]
+
+
+def test_latency_is_measured_from_the_intended_start():
+    # The sender blocks the event loop, so the generator itself falls behind
+    # its schedule: service time stays at ~50 ms, response time does not.
+    async def main():
+        async def send():
+            time.sleep(0.05)
+            return 0.01  # TTFT, from the actual start
+
+        return await run_load(
+            send, rps=100, duration=0.1, arrivals="constant", window=0.05
+        )
+
+    report = asyncio.run(main())
+    total = report.total()
+    assert total.sent == 9
+    assert total.service.max < 0.08
+    assert total.max_start_lag > 0.25
+    assert total.response.max > total.service.max + total.max_start_lag - 0.02
+    # TTFT is shifted by the start lag as well.
+    assert total.ttft.max > 0.25
+    assert [w.sent for w in report.windows] == [4, 5]
+
+
+def test_errors_and_drops_are_counted():
+    async def main():
+        gate = asyncio.Event()
+        calls = 0
+
+        async def send():
+            nonlocal calls
+            calls += 1
+            if calls % 2:
+                raise RuntimeError("boom")
+            await gate.wait()
+
+        async def release():
+            await asyncio.sleep(0.15)
+            gate.set()
+
+        asyncio.ensure_future(release())
+        return await run_load(
+            send, rps=100, duration=0.1, arrivals="constant", max_in_flight=3
+        )
+
+    total = asyncio.run(main()).total()
+    assert total.sent + total.dropped == 9
+    assert total.dropped > 0
+    assert total.errors + total.ok == total.sent
+    assert total.errors >= 3
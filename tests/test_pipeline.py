@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+
+from lib.pipeline import ProcessStage
+
+
+def slow_square(x):
+    """Module-level, so spawned workers can import it."""
+    time.sleep(0.01 * (3 - x % 3))  # later items often finish first
+    return x * x, os.getpid()
+
+
+def tag(result):
+    value, pid = result
+    return {"value": value, "pid": pid}
+
+
+async def _run(ordered, n=24, max_pending=3):
+    outstanding = []  # items handed out minus results taken, at each pull
+
+    async with ProcessStage(
+        slow_square, tag, workers=2, max_pending=max_pending
+    ) as stage:
+        pool = stage._pool
+        received = 0
+
+        def items():
+            for i in range(n):
+                outstanding.append(i - received)
+                yield i
+
+        results = []
+        async for result in stage.map(items(), ordered=ordered):
+            received += 1
+            results.append(result)
+        workers = list(pool._processes.values())
+    return results, max(outstanding), workers, stage
+
+
+def test_ordered_map_in_worker_processes():
+    results, outstanding, workers, stage = asyncio.run(_run(ordered=True))
+    assert [r["value"] for r in results] == [i * i for i in range(24)]
+    assert {r["pid"] for r in results} <= {p.pid for p in workers}
+    assert os.getpid() not in {r["pid"] for r in results}
+    assert outstanding <= 3  # max_pending
+    assert stage._pool is None
+    assert not any(p.is_alive() for p in workers)  # shut down on exit
+
+
+def test_unordered_map_yields_everything_within_the_bound():
+    results, outstanding, workers, _ = asyncio.run(_run(ordered=False))
+    values = [r["value"] for r in results]
+    assert sorted(values) == [i * i for i in range(24)]
+    assert outstanding <= 3
+    assert not any(p.is_alive() for p in workers)
+
+
+def test_registered_handler_by_name():
+    async def main():
+        async with ProcessStage("extract_json", workers=1) as stage:
+            return await stage.submit('Result: {"score": 4}')
+
+    assert asyncio.run(main()) == {"score": 4}
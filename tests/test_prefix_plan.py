@@ -0,0 +1,92 @@
+import asyncio
+import os
+
+from lib.prefix_plan import _cache_text, _cut, plan_batch, prefix_report, run_planned
+
+PREAMBLE = "You are a careful grader. Score the answer from 1 to 5.\n"
+
+
+def _jobs():
+    jobs = []
+    for i in range(6):
+        jobs.append({"model": "a", "prompt": f"{PREAMBLE}answer {i}"})
+        jobs.append({"model": "b", "prompt": f"unrelated question {i}"})
+    jobs.append({"model": "a", "prompt": "short", "system": "be terse"})
+    return jobs
+
+
+class CacheClient:
+    """Fake Ollama: one KV cache per lane, one token per prompt character."""
+
+    def __init__(self):
+        self.calls = []
+        self._last = {}  # lane task → previous cache text
+
+    async def generate(self, model, prompt, **fields):
+        system = fields.get("system")
+        text = f"{system}\n{prompt}" if system else prompt
+        lane = asyncio.current_task()
+        shared = len(os.path.commonprefix((self._last.get(lane, ""), text)))
+        self._last[lane] = text
+        self.calls.append((model, prompt))
+        await asyncio.sleep(0)
+        evaluated = len(text) - shared
+        return {"prompt_eval_count": evaluated, "prompt_eval_duration": evaluated * 1e6}
+
+
+def test_groups_by_model_and_orders_by_shared_prefix():
+    jobs = _jobs()
+    plan = plan_batch(jobs, slots=2)
+    assert set(plan.lanes_by_model) == {"a", "b"}
+    lanes = plan.lanes_by_model["a"]
+    assert len(lanes) == 2
+    covered = sorted(i for lane in lanes for i in lane.indexes)
+    assert covered == [i for i, job in enumerate(jobs) if job["model"] == "a"]
+    for lane in lanes:
+        assert lane.shared_chars[0] == 0  # each lane starts cold
+        texts = [_cache_text(jobs[i]) for i in lane.indexes]
+        assert texts == sorted(texts)
+    # Inside a lane, graded answers share the whole preamble with their neighbour.
+    preamble_lane = max(lanes, key=lambda lane: sum(lane.shared_chars))
+    assert max(preamble_lane.shared_chars) >= len(PREAMBLE)
+    assert 0 < plan.shared_fraction < 1
+
+
+def test_slots_cap_lanes_and_cuts_prefer_weak_boundaries():
+    plan = plan_batch([{"model": "m", "prompt": "x"}] * 2, slots=8)
+    assert len(plan.lanes_by_model["m"]) == 2
+    # Two families of prompts; the cut moves off the midpoint to where
+    # sharing drops to zero.
+    lcps = [0, 9, 9, 0, 9, 9, 9, 9]
+    assert _cut(lcps, 2) == [(0, 3), (3, 8)]
+    assert _cut([0, 1, 2], 1) == [(0, 3)]
+
+
+def test_run_planned_reports_the_savings():
+    jobs = _jobs()
+    plan = plan_batch(jobs, slots=1)
+    client = CacheClient()
+    results, report = asyncio.run(run_planned(client, plan))
+
+    # One model at a time, results back in job order.
+    models = [model for model, _ in client.calls]
+    assert models == sorted(models, key=["a", "b"].index)
+    assert [r is not None for r in results] == [True] * len(jobs)
+
+    total = sum(len(_cache_text(job)) for job in jobs)
+    assert report.jobs == len(jobs)
+    assert (
+        report.cold_estimate_tokens == total
+    )  # cold lane starts calibrate 1 token/char
+    assert report.evaluated_tokens == sum(r["prompt_eval_count"] for r in results)
+    assert report.saved_tokens == total - report.evaluated_tokens
+    assert report.saved_fraction == plan.shared_fraction
+    assert abs(report.prompt_eval_seconds - report.evaluated_tokens / 1000) < 1e-9
+    assert f"{len(jobs)} jobs" in str(report)
+
+
+def test_report_without_counts():
+    plan = plan_batch([{"model": "m", "prompt": "hi"}])
+    report = prefix_report(plan, [None])
+    assert (report.evaluated_tokens, report.cold_estimate_tokens) == (0, 0)
+    assert report.saved_fraction == 0.0
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from lib.client import AsyncOllamaClient
+from lib.openai_compat import AsyncChatClient, Provider
+from lib.profiling import Profiler
+
+
+def _ndjson(request: httpx.Request) -> httpx.Response:
+    lines = [{"response": "a", "done": False}, {"response": "b", "done": False}]
+    lines.append({"done": True, "eval_count": 2})
+    body = b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+    return httpx.Response(200, content=body)
+
+
+def _sse(request: httpx.Request) -> httpx.Response:
+    events = [{"choices": [{"delta": {"content": t}}]} for t in ("a", "b")]
+    body = b"".join(b"data: " + json.dumps(e).encode() + b"\n\n" for e in events)
+    return httpx.Response(200, content=body + b"data: [DONE]\n\n")
+
+
+def _chat_client(profiler):
+    provider = Provider("http://fake/v1", None, "m")
+    transport = httpx.MockTransport(_sse)
+    return AsyncChatClient(provider, transport=transport, profiler=profiler)
+
+
+def test_ollama_stream_records_phases():
+    profiler = Profiler(slow_callback=None)
+
+    async def main():
+        transport = httpx.MockTransport(_ndjson)
+        async with AsyncOllamaClient(
+            "http://fake", transport=transport, profiler=profiler
+        ) as client:
+            async with client.stream("m", "hi") as tokens:
+                return [t async for t in tokens]
+
+    assert asyncio.run(main()) == ["a", "b"]
+    for name in ("queue", "server", "ttft", "decode", "sink", "total"):
+        assert profiler.phases[name].count == 1, name
+
+
+def test_chat_client_stream_and_complete_record_phases():
+    profiler = Profiler(slow_callback=None)
+
+    async def main():
+        async with _chat_client(profiler) as client:
+            async with client.stream(None, [{"role": "user", "content": "hi"}]) as s:
+                return [t async for t in s]
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert profiler.phases["ttft"].count == 1
+    assert profiler.phases["total"].count == 1
+
+    def handler(request):
+        return httpx.Response(200, json={"choices": []})
+
+    async def complete():
+        transport = httpx.MockTransport(handler)
+        provider = Provider("http://fake/v1", None, "m")
+        async with AsyncChatClient(
+            provider, transport=transport, profiler=profiler
+        ) as client:
+            await client.complete(None, [{"role": "user", "content": "hi"}])
+
+    asyncio.run(complete())
+    assert profiler.phases["total"].count == 2
+    assert profiler.phases["ttft"].count == 1  # no tokens in a completion
+
+
+def test_slow_callbacks_counted_and_debug_restored():
+    async def main():
+        loop = asyncio.get_running_loop()
+        before = (loop.get_debug(), loop.slow_callback_duration)
+        profiler = Profiler(slow_callback=0.02)
+        async with profiler:
+            assert loop.get_debug()
+            loop.call_soon(time.sleep, 0.05)
+            await asyncio.sleep(0.06)
+        return profiler, before, (loop.get_debug(), loop.slow_callback_duration)
+
+    profiler, before, after = asyncio.run(main())
+    assert sum(profiler.slow_callbacks.values()) >= 1
+    assert any("sleep" in what for what in profiler.slow_callbacks)
+    assert after == before
+
+
+def test_nested_profilers_restore_in_order():
+    async def main():
+        loop = asyncio.get_running_loop()
+        before = (loop.get_debug(), loop.slow_callback_duration)
+        outer, inner = Profiler(slow_callback=0.05), Profiler(slow_callback=0.02)
+        async with outer:
+            async with inner:
+                assert loop.slow_callback_duration == 0.02
+            assert loop.slow_callback_duration == 0.05
+            assert loop.get_debug()
+        return before, (loop.get_debug(), loop.slow_callback_duration)
+
+    before, after = asyncio.run(main())
+    assert after == before
+
+
+def test_slow_request_capture_is_saved(tmp_path):
+    profiler = Profiler(
+        slow_callback=None,
+        capture_over=0.0,
+        sample_rate=1.0,
+        out_dir=str(tmp_path),
+        stack_interval=0.001,
+    )
+
+    async def main():
+        async with _chat_client(profiler) as client:
+            async with client.stream(None, [{"role": "user", "content": "hi"}]) as s:
+                async for _ in s:
+                    time.sleep(0.02)  # a slow consumer shows up in the stacks
+
+    asyncio.run(main())
+    assert len(profiler.captures) == 1
+    assert os.path.dirname(profiler.captures[0]) == str(tmp_path)
+    assert os.path.exists(profiler.captures[0])
+    assert profiler.stacks
+    assert profiler.phases["sink"].count == 1
@@ -0,0 +1,123 @@
+import asyncio
+import math
+
+import numpy as np
+import pytest
+
+from lib.retrieval import HybridIndex, context_prompt, tokenize
+
+DOCS = [
+    "num_ctx sets the context window of an Ollama model",
+    "The context window limits how much text a model can read",
+    "gpt-4o-mini is a small OpenAI model",
+    "Bananas are yellow and rich in potassium",
+]
+
+
+async def _embed(texts):
+    """Toy embedder: one dimension per topic word family."""
+    rows = []
+    for text in texts:
+        text = text.lower()
+        rows.append(
+            [
+                ("context" in text) + ("window" in text) + ("read" in text),
+                ("openai" in text) + ("gpt" in text),
+                ("banana" in text) + ("fruit" in text),
+            ]
+        )
+    return np.array(rows, dtype=np.float32)
+
+
+def _index(embed=_embed):
+    index = HybridIndex(embed=embed)
+    asyncio.run(index.add(DOCS, [{"source": f"d{i}"} for i in range(len(DOCS))]))
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    assert tokenize("Use gpt-4o-mini, not lib.client!") == [
+        "use",
+        "gpt-4o-mini",
+        "gpt",
+        "4o",
+        "mini",
+        "not",
+        "lib.client",
+        "lib",
+        "client",
+    ]
+
+
+def test_bm25_ranks_and_scores():
+    index = _index(embed=None)
+    hits = asyncio.run(index.search("num_ctx", k=3))
+    assert [h.doc_id for h in hits] == [0]  # only documents that match
+    assert hits[0].lexical_rank == 1 and hits[0].dense_rank is None
+
+    # Hand-computed BM25 of "potassium" in the one document that has it.
+    n, k1, b = len(DOCS), index.k1, index.b
+    lengths = [len(tokenize(d)) for d in DOCS]
+    idf = math.log(1 + (n - 1 + 0.5) / (1 + 0.5))
+    norm = k1 * (1 - b + b * lengths[3] / (sum(lengths) / n))
+    expected = idf * (k1 + 1) / (1 + norm)
+    assert index.lexical_scores("potassium")[3] == pytest.approx(expected, rel=1e-6)
+
+    # A rarer term outweighs a common one.
+    hits = asyncio.run(index.search("model potassium", k=4, mode="lexical"))
+    assert hits[0].doc_id == 3
+
+
+def test_rrf_fuses_both_rankings():
+    index = _index()
+    hits = asyncio.run(index.search("what limits the context?", k=4))
+    # Docs 0 and 1 tie on the vector; "limits" puts 1 first lexically.
+    top = hits[0]
+    assert top.doc_id == 1
+    assert (top.lexical_rank, top.dense_rank) == (1, 2)
+    assert top.score == pytest.approx(1 / 61 + 1 / 62)
+    assert {h.doc_id for h in hits[:2]} == {0, 1}
+    # Dense alone finds the paraphrase that shares no query term.
+    dense = asyncio.run(index.search("fruit", k=1, mode="dense"))
+    assert dense[0].doc_id == 3 and dense[0].lexical_rank is None
+    assert asyncio.run(index.search("fruit", k=1, mode="lexical")) == []
+    with pytest.raises(ValueError):
+        index.search_embedded("x", mode="fuzzy")
+
+
+def test_save_load_round_trip_and_add(tmp_path):
+    index = _index()
+    index.save(str(tmp_path))
+    loaded = HybridIndex.load(str(tmp_path), embed=_embed)
+    assert len(loaded) == len(DOCS)
+
+    async def both(query):
+        return [
+            [(h.doc_id, h.score, h.meta) for h in await i.search(query, k=4)]
+            for i in (index, loaded)
+        ]
+
+    for query in ("context window", "gpt-4o-mini", "banana"):
+        original, reloaded = asyncio.run(both(query))
+        assert original == reloaded
+
+    ids = asyncio.run(loaded.add(["Apples are a fruit too"], [{"source": "new"}]))
+    assert list(ids) == [4]
+    hits = asyncio.run(loaded.search("apples fruit", k=2))
+    assert hits[0].doc_id == 4 and hits[0].meta == {"source": "new"}
+    assert "[1] (new) Apples" in context_prompt("Which fruit?", hits)
+
+
+def test_failed_save_keeps_the_previous_index(tmp_path, monkeypatch):
+    index = _index()
+    index.save(str(tmp_path))
+    asyncio.run(index.add(["one more document"]))
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(np, "savez", crash)
+    with pytest.raises(OSError):
+        index.save(str(tmp_path))
+    monkeypatch.undo()
+    assert len(HybridIndex.load(str(tmp_path))) == len(DOCS)
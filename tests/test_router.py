@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from lib.openai_compat import AsyncChatClient, Provider
+from lib.router import (
+    Backend,
+    BackendStats,
+    CheapestWithinSLO,
+    LocalFirst,
+    NoBackendAvailable,
+    Router,
+)
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _client(status=200, calls=None):
+    def handler(request):
+        if calls is not None:
+            calls.append(request.url.host)
+        if status != 200:
+            return httpx.Response(status, json={"error": "nope"})
+        if json.loads(request.content).get("stream"):
+            body = b'data: {"choices": [{"delta": {"content": "ok"}}]}\n\n'
+            return httpx.Response(200, content=body + b"data: [DONE]\n\n")
+        usage = {"completion_tokens": 1}
+        return httpx.Response(200, json={"choices": [], "usage": usage})
+
+    provider = Provider(f"http://b{status}/v1", None, "m")
+    return AsyncChatClient(provider, transport=httpx.MockTransport(handler))
+
+
+def _stats(ttft=None, latency=None):
+    stats = BackendStats()
+    now = time.monotonic()
+    for _ in range(5):
+        stats.observe(now, latency or 0.0, ttft=ttft)
+    stats.update(now)
+    return stats
+
+
+def test_fails_over_on_overload_and_cools_down():
+    async def main():
+        busy = Backend("busy", _client(429), price_in=0.0)
+        ok = Backend("ok", _client(), price_in=1.0)
+        async with Router([busy, ok], cooldown=60.0) as router:
+            body = await router.complete(MESSAGES)
+            ranked = [b.name for b in router.pick(MESSAGES)]
+            async with router.stream(MESSAGES) as tokens:
+                text = [t async for t in tokens]
+            return body, ranked, tokens.backend, text, router.stats()
+
+    body, ranked, streamed_by, text, stats = asyncio.run(main())
+    assert body["backend"] == "ok"
+    assert ranked == ["ok", "busy"]  # busy is in cooldown
+    assert streamed_by == "ok" and text == ["ok"]
+    assert stats["busy"]["overload_rate"] == 1.0
+    assert stats["busy"]["cooldown"] > 50
+
+
+def test_server_error_fails_over_without_cooldown():
+    async def main():
+        broken = Backend("broken", _client(500))
+        ok = Backend("ok", _client(), price_in=1.0)
+        async with Router([broken, ok]) as router:
+            body = await router.complete(MESSAGES)
+            return body["backend"], broken.cooldown_until
+
+    assert asyncio.run(main()) == ("ok", 0.0)
+
+
+def test_client_error_does_not_fail_over():
+    calls = []
+
+    async def main():
+        bad = Backend("bad", _client(400, calls))
+        ok = Backend("ok", _client(calls=calls), price_in=1.0)
+        async with Router([bad, ok]) as router:
+            await router.complete(MESSAGES)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main())
+    assert calls == ["b400"]
+
+
+def test_all_backends_down_raises_no_backend_available():
+    async def main():
+        a, b = Backend("a", _client(503)), Backend("b", _client(503))
+        async with Router([a, b]) as router:
+            with pytest.raises(NoBackendAvailable, match="a, b") as info:
+                await router.complete(MESSAGES)
+            assert isinstance(info.value.__cause__, httpx.HTTPStatusError)
+            with pytest.raises(NoBackendAvailable):
+                async with router.stream(MESSAGES):
+                    pass
+
+    asyncio.run(main())
+
+
+def test_max_attempts_is_validated():
+    backend = Backend("a", object(), capacity=1)
+    with pytest.raises(ValueError):
+        Router([backend], max_attempts=0)
+    with pytest.raises(ValueError):
+        Router([])
+
+
+def test_ttft_and_latency_windows_are_separate():
+    stats = BackendStats()
+    now = time.monotonic()
+    stats.observe(now, 4.0, ttft=0.5)  # a long stream with a quick first token
+    stats.observe(now, 3.0)  # a complete call
+    stats.update(now)
+    assert stats.ttft_p95 == 0.5
+    assert stats.latency_p95 == 4.0
+    assert stats.p95("ttft") == 0.5
+
+
+def test_slo_applies_to_the_matching_window():
+    # Streams fast to first token, but long requests overall.
+    streamer = Backend("streamer", object(), capacity=1, price_in=0.0)
+    streamer.stats = _stats(ttft=0.2, latency=5.0)
+    quick = Backend("quick", object(), capacity=1, price_in=1.0)
+    quick.stats = _stats(ttft=1.0, latency=1.0)
+    policy = CheapestWithinSLO(1.5)
+    now = time.monotonic()
+
+    by_ttft = policy([streamer, quick], now, 100, "ttft")
+    by_latency = policy([streamer, quick], now, 100, "latency")
+    assert [b.name for b in by_ttft] == ["streamer", "quick"]
+    assert [b.name for b in by_latency] == ["quick", "streamer"]
+
+
+def test_local_first_spills_when_saturated():
+    local = Backend("local", object(), capacity=2, local=True)
+    cheap = Backend("cheap", object(), capacity=1, price_in=0.1)
+    dear = Backend("dear", object(), capacity=1, price_in=5.0)
+    policy = LocalFirst(max_queue=1)
+    now = time.monotonic()
+
+    assert [b.name for b in policy([dear, cheap, local], now, 10)][0] == "local"
+    local.stats.in_flight = 3
+    ranked = [b.name for b in policy([dear, cheap, local], now, 10)]
+    assert ranked == ["cheap", "dear", "local"]
+
+
+def test_stream_left_before_first_token_records_no_ttft():
+    async def main():
+        backend = Backend("ok", _client())
+        async with Router([backend]) as router:
+            async with router.stream(MESSAGES):
+                pass  # the caller gives up without reading
+            backend.stats.update(time.monotonic() + 1)
+            return backend.stats
+
+    stats = asyncio.run(main())
+    assert stats.ttft_p95 is None
+    assert stats.latency_p95 is not None
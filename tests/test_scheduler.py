@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from lib.client import AsyncOllamaClient
+from lib.loadgen import FakeOllamaTransport
+from lib.scheduler import Preempted, Priority, RequestScheduler
+
+
+async def _hold(scheduler, order, tenant, priority=Priority.BATCH, cost=1.0):
+    async with scheduler.slot(tenant, priority, cost=cost):
+        order.append(tenant)
+        await asyncio.sleep(0)
+
+
+def test_interactive_dispatched_before_batch():
+    async def main():
+        scheduler = RequestScheduler(1, preempt=False)
+        order = []
+        blocker = await scheduler.acquire("x", Priority.BATCH)
+        tasks = [
+            asyncio.ensure_future(_hold(scheduler, order, "batch")) for _ in range(3)
+        ]
+        tasks.append(
+            asyncio.ensure_future(_hold(scheduler, order, "chat", Priority.INTERACTIVE))
+        )
+        await asyncio.sleep(0)
+        scheduler.release(blocker)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main())[0] == "chat"
+
+
+def test_tenants_share_slots_fairly():
+    async def main():
+        scheduler = RequestScheduler(1, preempt=False)
+        order = []
+        blocker = await scheduler.acquire("x", Priority.BATCH)
+        flood = [
+            asyncio.ensure_future(_hold(scheduler, order, "flood")) for _ in range(10)
+        ]
+        await asyncio.sleep(0)
+        late = [
+            asyncio.ensure_future(_hold(scheduler, order, "late")) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        scheduler.release(blocker)
+        await asyncio.gather(*flood, *late)
+        return order
+
+    order = asyncio.run(main())
+    # The late tenant does not wait behind the whole flood.
+    assert order.index("late") <= 1
+    assert max(i for i, t in enumerate(order) if t == "late") <= 3
+
+
+def test_tenant_weights():
+    async def main():
+        scheduler = RequestScheduler(1, tenant_weights={"heavy": 3.0}, preempt=False)
+        order = []
+        blocker = await scheduler.acquire("x", Priority.BATCH)
+        tasks = [
+            asyncio.ensure_future(_hold(scheduler, order, tenant))
+            for _ in range(6)
+            for tenant in ("heavy", "light")
+        ]
+        await asyncio.sleep(0)
+        scheduler.release(blocker)
+        await asyncio.gather(*tasks)
+        return order
+
+    first = asyncio.run(main())[:8]
+    assert first.count("heavy") == 6
+
+
+def test_cancelled_waiter_does_not_push_back_its_tenant():
+    async def main():
+        scheduler = RequestScheduler(1, preempt=False)
+        order = []
+        blocker = await scheduler.acquire("x", Priority.BATCH)
+        doomed = asyncio.ensure_future(_hold(scheduler, order, "a", cost=100.0))
+        await asyncio.sleep(0)
+        doomed.cancel()
+        await asyncio.gather(doomed, return_exceptions=True)
+        a = asyncio.ensure_future(_hold(scheduler, order, "a"))
+        await asyncio.sleep(0)
+        b = asyncio.ensure_future(_hold(scheduler, order, "b"))
+        await asyncio.sleep(0)
+        scheduler.release(blocker)
+        await asyncio.gather(a, b)
+        return order, scheduler
+
+    order, scheduler = asyncio.run(main())
+    assert order == ["a", "b"]
+    assert not scheduler._queued_finish
+
+
+def test_interactive_preempts_batch_stream():
+    async def main():
+        fake = FakeOllamaTransport(1, ttft=0.01, tokens=200, tokens_per_s=200.0)
+        scheduler = RequestScheduler(1)
+        async with AsyncOllamaClient(
+            "http://fake", scheduler=scheduler, transport=fake
+        ) as client:
+
+            async def batch():
+                async with client.stream(
+                    "m", "long job", tenant="batch", priority=Priority.BATCH
+                ) as tokens:
+                    async for _ in tokens:
+                        pass
+
+            job = asyncio.ensure_future(batch())
+            await asyncio.sleep(0.05)
+            reply = await client.generate("m", "hi", tenant="chat")
+            with pytest.raises(Preempted):
+                await job
+            return reply
+
+    assert asyncio.run(main())["done"]
+
+
+def test_preempted_generate_is_requeued():
+    async def main():
+        fake = FakeOllamaTransport(1, ttft=0.01, tokens=10, tokens_per_s=100.0)
+        async with AsyncOllamaClient(
+            "http://fake", scheduler=RequestScheduler(1), transport=fake
+        ) as client:
+            job = asyncio.ensure_future(
+                client.generate("m", "batch", priority=Priority.BATCH)
+            )
+            await asyncio.sleep(0.02)
+            chat = await client.generate("m", "hi")
+            return chat, await job
+
+    chat, batch = asyncio.run(main())
+    assert chat["done"] and batch["done"]
+
+
+def test_only_stream_ttft_feeds_the_pressure_throttle():
+    async def main():
+        scheduler = RequestScheduler(2, interactive_ttft_slo=0.02)
+        # First token quickly, but a long generation overall.
+        fake = FakeOllamaTransport(2, ttft=0.001, tokens=10, tokens_per_s=200.0)
+        async with AsyncOllamaClient(
+            "http://fake", scheduler=scheduler, transport=fake
+        ) as client:
+            await client.generate("m", "hi")
+            after_generate = scheduler.stats()["interactive_ttft_ewma"]
+            fake.ttft = 0.2
+            async with client.stream("m", "hi") as tokens:
+                async for _ in tokens:
+                    pass
+            return after_generate, scheduler.under_pressure
+
+    after_generate, pressure = asyncio.run(main())
+    assert after_generate == 0.0
+    assert pressure
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import numpy as np
+
+from lib.semantic_cache import OllamaEmbedder, SemanticCache
+
+VOCAB = ["model", "creator", "identify", "state", "company", "weather", "paris"]
+
+
+async def embed(texts):
+    """Bag-of-words vectors: prompts sharing words are similar."""
+    return np.array(
+        [[t.lower().count(w) for w in VOCAB] for t in texts], dtype=np.float32
+    )
+
+
+def _ask(cache, prompt, model="m", fields=None, route="faq"):
+    async def main():
+        return await cache.lookup(route, model, prompt, fields or {})
+
+    return asyncio.run(main())
+
+
+def _put(cache, prompt, value, model="m", fields=None, route="faq"):
+    _, vector = _ask(cache, prompt, model, fields, route)
+    cache.store(route, model, prompt, fields or {}, vector, value)
+
+
+def test_near_duplicate_hits_within_namespace():
+    cache = SemanticCache(embed, threshold=0.6)
+    cache.enable("faq")
+    _put(cache, "identify your model and creator", {"response": "llama by meta"})
+    hit, _ = _ask(cache, "state your model and creator")
+    assert hit["response"] == "llama by meta" and hit["cached"]
+    assert _ask(cache, "weather in paris")[0] is None
+    assert _ask(cache, "identify your model and creator", model="other")[0] is None
+    assert _ask(cache, "identify your model and creator", fields={"x": 1})[0] is None
+    metrics = cache.metrics()["faq"]
+    assert metrics["hits"] == 1 and metrics["misses"] == 4
+
+
+def test_records_are_copied_in_and_out():
+    cache = SemanticCache(embed)
+    cache.enable("faq")
+    value = {"response": "a", "message": {"content": "a"}}
+    _put(cache, "model creator", value)
+    value["message"]["content"] = "changed by caller"
+    hit, _ = _ask(cache, "model creator")
+    hit["message"]["content"] = "changed again"
+    assert _ask(cache, "model creator")[0]["message"]["content"] == "a"
+
+
+def test_expired_rows_are_freed_on_insert():
+    cache = SemanticCache(embed, capacity=2, ttl=0.05)
+    cache.enable("faq")
+    _put(cache, "model", {"response": "1"})
+    _put(cache, "creator", {"response": "2"})
+    time.sleep(0.06)
+    assert _ask(cache, "model")[0] is None
+    _put(cache, "weather", {"response": "3"})
+    assert len(cache) == 1
+    assert cache.metrics()["faq"]["evictions"] == 0
+    assert cache._values.count(None) == 1
+
+
+def test_lru_eviction_when_full():
+    cache = SemanticCache(embed, capacity=2)
+    cache.enable("faq")
+    _put(cache, "model", {"response": "1"})
+    _put(cache, "creator", {"response": "2"})
+    _ask(cache, "model")  # touch: "creator" is now least recently used
+    _put(cache, "weather", {"response": "3"})
+    assert _ask(cache, "model")[0] is not None
+    assert _ask(cache, "creator")[0] is None
+    assert cache.metrics()["faq"]["evictions"] == 1
+
+
+def test_near_margin():
+    cache = SemanticCache(embed, threshold=0.99, near_margin=0.35)
+    cache.enable("faq")
+    _put(cache, "identify model creator", {"response": "x"})
+    assert _ask(cache, "state model creator")[0] is None  # cosine 2/3
+    assert cache.metrics()["faq"]["near_misses"] == 1
+    cache.near_margin = 0.1
+    _ask(cache, "state model creator")
+    assert cache.metrics()["faq"]["near_misses"] == 1
+
+
+def test_aclose_closes_owned_embedder_client():
+    class Client:
+        closed = False
+
+        async def aclose(self):
+            self.closed = True
+
+    passed_in = Client()
+    embedder = OllamaEmbedder(client=passed_in)
+    asyncio.run(SemanticCache(embedder).aclose())
+    assert not passed_in.closed
+
+    embedder = OllamaEmbedder()
+    owned = embedder._client = Client()
+    embedder._owns_client = True
+    asyncio.run(SemanticCache(embedder).aclose())
+    assert owned.closed and embedder._client is None
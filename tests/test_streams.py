@@ -0,0 +1,91 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from lib.streams import NDJSONDecoder, SSEDecoder, StreamError
+
+WORDS = ["Hello", " wörld", "!", " ☃", ' "quoted"', "\n", " end"]
+
+
+def _split(data: bytes, rng: random.Random) -> list[bytes]:
+    """Cut `data` at random points, including 1-byte and empty pieces."""
+    cuts = sorted(rng.randint(0, len(data)) for _ in range(rng.randint(0, 40)))
+    edges = [0, *cuts, len(data)]
+    return [data[a:b] for a, b in zip(edges, edges[1:])]
+
+
+def _decode(decoder, chunks) -> str:
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def main():
+        return "".join([text async for text in decoder.iter_text(source())])
+
+    return asyncio.run(main())
+
+
+def _ndjson() -> bytes:
+    lines = [{"response": w, "done": False} for w in WORDS]
+    lines.append({"response": "", "done": True, "eval_count": len(WORDS)})
+    return b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+
+
+def _sse(crlf: bool = False) -> bytes:
+    events = [{"model": "m", "choices": [{"delta": {"content": w}}]} for w in WORDS]
+    events.append({"choices": [{"delta": {}, "finish_reason": "stop"}]})
+    events.append({"choices": [], "usage": {"completion_tokens": len(WORDS)}})
+    body = b": keep-alive\n\n" + b"".join(
+        b"data: " + json.dumps(e).encode() + b"\n\n" for e in events
+    )
+    body += b"data: [DONE]\n\n"
+    return body.replace(b"\n", b"\r\n") if crlf else body
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_ndjson_random_chunking(seed):
+    decoder = NDJSONDecoder()
+    text = _decode(decoder, _split(_ndjson(), random.Random(seed)))
+    assert text == "".join(WORDS)
+    assert decoder.final["eval_count"] == len(WORDS)
+
+
+def test_ndjson_chat_records_and_missing_trailing_newline():
+    body = (
+        b'{"message": {"content": "a"}, "done": false}\n\n'
+        b'{"message": {"content": "b"}, "done": true}'
+    )
+    decoder = NDJSONDecoder()
+    assert _decode(decoder, [body]) == "ab"
+    assert decoder.final["done"]
+
+
+def test_ndjson_error_record():
+    with pytest.raises(StreamError, match="out of memory"):
+        _decode(NDJSONDecoder(), [b'{"error": "out of memory"}\n'])
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("crlf", [False, True])
+def test_sse_random_chunking(seed, crlf):
+    decoder = SSEDecoder()
+    text = _decode(decoder, _split(_sse(crlf), random.Random(seed)))
+    assert text == "".join(WORDS)
+    assert decoder.final == {
+        "model": "m",
+        "finish_reason": "stop",
+        "usage": {"completion_tokens": len(WORDS)},
+    }
+
+
+def test_sse_multiline_data_and_no_space():
+    body = b'data:{"choices": [{"delta":\ndata: {"content": "hi"}}]}\n\n'
+    assert _decode(SSEDecoder(), [body]) == "hi"
+
+
+def test_sse_error_event():
+    body = b'data: {"error": {"message": "rate limited"}}\n\n'
+    with pytest.raises(StreamError, match="rate limited"):
+        _decode(SSEDecoder(), [body])
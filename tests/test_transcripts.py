@@ -0,0 +1,159 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from lib.transcripts import TranscriptStore, request_key
+
+
+def _record(i, response="ok"):
+    return {"model": "m", "prompt": f"p{i}", "response": response}
+
+
+async def _run(directory, n, start=0, **kwargs):
+    store = TranscriptStore(directory, block_records=16, **kwargs)
+    keys = [await store.append(_record(start + i)) for i in range(n)]
+    await store.aclose()
+    return keys
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("seg-"))
+
+
+def test_append_get_and_lookup(tmp_path):
+    async def main():
+        store = TranscriptStore(str(tmp_path), block_records=4)
+        keys = [await store.append(_record(i)) for i in range(10)]
+        pending = store.get(keys[-1])  # still in the partial block
+        await store.flush()
+        found = [store.get(k)["prompt"] for k in keys]
+        hit = store.lookup("m", "p3")
+        await store.aclose()
+        return keys, pending, found, hit
+
+    keys, pending, found, hit = asyncio.run(main())
+    assert keys[0] == request_key("m", "p0")
+    assert pending["prompt"] == "p9"
+    assert found == [f"p{i}" for i in range(10)]
+    assert hit["response"] == "ok"
+
+
+def test_reopen_finds_earlier_records(tmp_path):
+    keys = asyncio.run(_run(str(tmp_path), 50))
+    store = TranscriptStore(str(tmp_path))
+    try:
+        assert [store.get(k)["prompt"] for k in keys] == [f"p{i}" for i in range(50)]
+        assert store.get(request_key("m", "missing")) is None
+    finally:
+        store.close()
+
+
+def test_reopen_seals_earlier_segments_for_compaction(tmp_path):
+    directory = str(tmp_path)
+    keys = asyncio.run(_run(directory, 100))
+    keys += asyncio.run(_run(directory, 100, start=100))
+    time.sleep(0.01)
+
+    async def compact():
+        store = TranscriptStore(directory, max_age=0.001)
+        await store.acompact()
+        found = [store.get(k) for k in keys]
+        await store.aclose()
+        return found
+
+    assert asyncio.run(compact()) == [None] * 200
+    assert _segments(directory) == []  # expired, and the empty active removed
+
+
+def test_compaction_keeps_newest_record_per_key(tmp_path):
+    directory = str(tmp_path)
+
+    async def main():
+        store = TranscriptStore(directory, block_records=8, compact_after=100)
+        for i in range(20):
+            await store.append(_record(i, "old"))
+        await store.append(_record(3, "new"))
+        await store.aclose()
+
+        store = TranscriptStore(directory, compact_after=100)
+        await store.acompact()
+        sealed = list(store._manifest["sealed"])
+        found = [store.lookup("m", f"p{i}")["response"] for i in range(20)]
+        await store.aclose()
+        return sealed, found
+
+    sealed, found = asyncio.run(main())
+    assert sealed == []
+    assert found == ["old"] * 3 + ["new"] + ["old"] * 16
+
+    store = TranscriptStore(directory)  # the compacted generation reopens
+    try:
+        assert store.lookup("m", "p3")["response"] == "new"
+        assert len(store) == 20
+    finally:
+        store.close()
+
+
+def test_reopen_compacts_once_enough_runs_are_sealed(tmp_path):
+    directory = str(tmp_path)
+    for run in range(3):
+        asyncio.run(_run(directory, 5, start=run * 5))
+    store = TranscriptStore(directory, compact_after=3)
+    try:
+        store._compactor.join()
+        assert store._manifest["sealed"] == []
+        assert store.lookup("m", "p12")["prompt"] == "p12"
+    finally:
+        store.close()
+
+
+def test_zstd_codec_needs_zstandard(monkeypatch, tmp_path):
+    import lib.transcripts
+
+    monkeypatch.setattr(lib.transcripts, "zstandard", None)
+    with pytest.raises(RuntimeError):
+        TranscriptStore(str(tmp_path), codec="zstd")
+
+
+def test_second_store_on_one_directory_fails_fast(tmp_path):
+    directory = str(tmp_path)
+
+    async def main():
+        first = TranscriptStore(directory, block_records=4)
+        keys = [await first.append(_record(i)) for i in range(8)]
+        await first.flush()
+        with pytest.raises(RuntimeError, match="another TranscriptStore"):
+            TranscriptStore(directory, compact_after=1)
+        found = [first.get(k)["prompt"] for k in keys]  # segment left alone
+        await first.aclose()
+        return keys, found
+
+    keys, found = asyncio.run(main())
+    assert found == [f"p{i}" for i in range(8)]
+    second = TranscriptStore(directory)  # the lock goes with close()
+    try:
+        assert second.get(keys[0])["prompt"] == "p0"
+    finally:
+        second.close()
+
+
+def test_seal_switches_segments_under_the_lock(tmp_path):
+    # `get` holds the lock while it flushes the active segment's file; a seal
+    # must not close that file underneath it.
+    async def main():
+        store = TranscriptStore(str(tmp_path), block_records=1)
+        key = await store.append(_record(0))
+        with store._lock:
+            sealing = store._writer.submit(store._seal)
+            time.sleep(0.05)
+            still_open = not store._active_file.closed
+        sealing.result()
+        found = store.get(key)
+        await store.aclose()
+        return still_open, found
+
+    still_open, found = asyncio.run(main())
+    assert still_open
+    assert found["prompt"] == "p0"
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import httpx
+
+from lib.client import AsyncOllamaClient
+from lib.loadgen import FakeOllamaTransport
+from lib.scheduler import RequestScheduler
+from lib.tuning import (
+    SweepPoint,
+    choose,
+    host_key,
+    load_profiles,
+    pareto_front,
+    save_profile,
+    sweep,
+    tuned_concurrency,
+)
+
+
+def _point(tps, p95, concurrency=1, options=None, errors=0):
+    return SweepPoint(options or {}, concurrency, 8, errors, tps, tps, p95, p95, 0.1)
+
+
+def test_host_key():
+    assert host_key("localhost:11434") == "http://localhost:11434"
+    assert host_key("http://localhost:11434/") == "http://localhost:11434"
+    assert host_key("https://gpu.example") == "https://gpu.example:443"
+
+
+def test_pareto_front_and_choose():
+    points = [
+        _point(100, 1.0),
+        _point(150, 1.4),
+        _point(90, 2.0),  # dominated
+        _point(300, 3.0),
+        _point(500, 0.5, errors=1),  # failed points never count
+    ]
+    front = pareto_front(points)
+    assert [p.throughput_tps for p in front] == [100, 150, 300]
+    assert choose(front, "latency").throughput_tps == 100
+    assert choose(front, "throughput").throughput_tps == 300
+    assert choose(front, "balanced").throughput_tps == 150
+
+
+def test_profiles_are_keyed_by_server(tmp_path):
+    path = str(tmp_path / "profiles.json")
+    chosen = _point(150, 1.4, concurrency=3, options={"num_ctx": 4096})
+    save_profile("llama3.2", chosen, base_url="http://localhost:11434", path=path)
+    save_profile(
+        "qwen", _point(90, 1.0, concurrency=2), base_url="localhost:11434", path=path
+    )
+    profiles = load_profiles(path)
+    assert list(profiles) == ["http://localhost:11434"]
+    local = profiles["http://localhost:11434"]
+    assert local["llama3.2"]["options"] == {"num_ctx": 4096}
+    assert tuned_concurrency(local, "llama3.2") == 3
+    assert tuned_concurrency(local) == 2
+    assert tuned_concurrency({}, "llama3.2") is None
+
+
+def test_model_keyed_profiles_are_ignored(tmp_path):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps({"llama3.2": {"options": {"num_ctx": 1}}}))
+    assert load_profiles(str(path)) == {}
+
+
+def test_client_applies_only_its_servers_profile():
+    profiles = {
+        "http://gpu-box:11434": {
+            "llama3.2": {
+                "options": {"num_ctx": 8192, "num_batch": 512},
+                "concurrency": 6,
+            }
+        }
+    }
+    seen = []
+
+    def handler(request):
+        seen.append(json.loads(request.content).get("options"))
+        return httpx.Response(200, json={"response": "", "done": True})
+
+    async def main():
+        transport = httpx.MockTransport(handler)
+        remote = AsyncOllamaClient(
+            "http://gpu-box:11434", transport=transport, profiles=profiles
+        )
+        local = AsyncOllamaClient(
+            "http://localhost:11434", transport=transport, profiles=profiles
+        )
+        async with remote, local:
+            await remote.generate("llama3.2", "hi", options={"num_ctx": 2048})
+            await local.generate("llama3.2", "hi")
+        return remote, local
+
+    remote, local = asyncio.run(main())
+    assert seen == [{"num_ctx": 2048, "num_batch": 512}, None]
+    assert remote.scheduler.max_concurrency == 6
+    assert local.scheduler.max_concurrency == 4
+
+
+def test_sweep_against_fake_node():
+    async def main():
+        fake = FakeOllamaTransport(2, ttft=0.005, tokens=8, tokens_per_s=400.0)
+        async with AsyncOllamaClient(
+            "http://fake", scheduler=RequestScheduler(4), transport=fake
+        ) as client:
+            return await sweep(
+                client,
+                "m",
+                "hi",
+                grid={"num_ctx": [2048]},
+                concurrency=(1, 2),
+                requests=4,
+            )
+
+    points = asyncio.run(main())
+    assert [(p.options, p.concurrency) for p in points] == [
+        ({"num_ctx": 2048}, 1),
+        ({"num_ctx": 2048}, 2),
+    ]
+    assert all(p.errors == 0 and p.throughput_tps > 0 for p in points)
+    assert points[1].throughput_tps > points[0].throughput_tps
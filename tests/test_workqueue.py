@@ -0,0 +1,124 @@
+import asyncio
+import io
+import json
+import sqlite3
+import time
+
+from lib.client import AsyncOllamaClient
+from lib.loadgen import FakeOllamaTransport
+from lib.scheduler import RequestScheduler
+from lib.workqueue import WorkQueue, work
+
+LEASE = 0.2
+
+
+def _queue(tmp_path, jobs=4, shard_size=2, **kwargs):
+    queue = WorkQueue(str(tmp_path / "q.sqlite"), lease_seconds=LEASE, **kwargs)
+    jobs = [{"model": "m", "prompt": f"p{i}"} for i in range(jobs)]
+    queue.enqueue(jobs, shard_size=shard_size)
+    return queue
+
+
+def _watcher(queue, **kwargs):
+    """Another worker process: its own WorkQueue on the same file."""
+    return WorkQueue(queue.path, lease_seconds=LEASE, **kwargs)
+
+
+def test_shards_are_leased_once_in_order(tmp_path):
+    queue = _queue(tmp_path)
+    first, second = queue.lease("a"), _watcher(queue).lease("b")
+    assert (first.id, second.id) == (1, 2)
+    assert [i for i, _ in first.jobs] == [0, 1]
+    assert queue.lease("c") is None
+
+
+def test_dead_worker_lease_is_taken_over(tmp_path):
+    queue = _queue(tmp_path, jobs=2)
+    shard = queue.lease("dead")
+    other = _watcher(queue)
+    assert other.lease("b") is None  # first sighting starts the clock
+    time.sleep(LEASE * 1.5)
+    retry = other.lease("b")
+    assert retry.id == shard.id and retry.attempt == 2
+    assert not queue.complete(shard.id, "dead", [[0, "late"]])
+    assert not queue.heartbeat(shard.id, "dead")
+    assert other.complete(retry.id, "b", [[0, "ok"], [1, "ok"]])
+    assert list(queue.results()) == [(0, "ok"), (1, "ok")]
+
+
+def test_heartbeats_keep_a_lease(tmp_path):
+    queue = _queue(tmp_path, jobs=2)
+    shard = queue.lease("a")
+    other = _watcher(queue)
+    for _ in range(6):
+        assert other.lease("b") is None
+        assert queue.heartbeat(shard.id, "a")
+        time.sleep(LEASE / 3)
+    assert other.lease("b") is None
+
+
+def test_wall_clock_skew_does_not_matter(tmp_path, monkeypatch):
+    queue = _queue(tmp_path, jobs=2)
+    queue.lease("a")
+    other = _watcher(queue)
+    other.lease("b")
+    # A watcher whose wall clock runs an hour ahead still sees a live lease.
+    real = time.time
+    monkeypatch.setattr(time, "time", lambda: real() + 3600)
+    queue.heartbeat(1, "a")
+    assert other.lease("b") is None
+
+
+def test_lease_fails_after_max_attempts(tmp_path):
+    queue = _queue(tmp_path, jobs=2, max_attempts=2)
+    other = _watcher(queue, max_attempts=2)
+    queue.lease("a")
+    other.lease("b")
+    time.sleep(LEASE * 1.5)
+    assert other.lease("b").attempt == 2
+    other.lease("c")
+    time.sleep(LEASE * 1.5)
+    assert other.lease("c") is None
+    assert queue.status() == {"failed": 1}
+    assert queue.finished()
+
+
+def test_release_and_merge(tmp_path):
+    queue = _queue(tmp_path, jobs=4)
+    a = queue.lease("a")
+    queue.release(a.id, "a", "boom")
+    assert queue.lease("b").id == a.id
+    out = io.StringIO()
+    queue.complete(a.id, "b", [[0, "x"], [1, "y"]])
+    assert queue.merge(out) == 2
+    assert [json.loads(line)["index"] for line in out.getvalue().splitlines()] == [0, 1]
+
+
+def test_old_schema_is_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE shards (id INTEGER PRIMARY KEY, jobs TEXT NOT NULL, "
+        "status TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_until REAL, "
+        "attempts INTEGER NOT NULL DEFAULT 0, results TEXT, error TEXT)"
+    )
+    db.execute("INSERT INTO shards (jobs) VALUES ('[[0, {}]]')")
+    db.commit()
+    db.close()
+    assert WorkQueue(path).lease("a").id == 1
+
+
+def test_work_drains_the_queue(tmp_path):
+    queue = _queue(tmp_path, jobs=6, shard_size=4)
+
+    async def main():
+        fake = FakeOllamaTransport(2, ttft=0.001, tokens=2, tokens_per_s=1000.0)
+        async with AsyncOllamaClient(
+            "http://fake", scheduler=RequestScheduler(2), transport=fake
+        ) as client:
+            return await work(queue, client, worker="w")
+
+    assert asyncio.run(main()) == 2
+    results = list(queue.results())
+    assert [i for i, _ in results] == list(range(6))
+    assert all(r["done"] for _, r in results)